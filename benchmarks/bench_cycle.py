@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+DDNS 更新周期基准测试
+
+在本地启动 DNSPod API、IP 回显服务和 SMTP 收件服务的替身，反复执行 DDNS 更新周期，
+输出周期耗时分位数、每周期 API 调用次数和内存占用。
+
+用法:
+    python -m benchmarks.bench_cycle --cycles 200
+    python -m benchmarks.bench_cycle --json > baseline.json
+    python -m benchmarks.bench_cycle --baseline baseline.json    # 与基线比较，退化超过阈值时返回非零
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import tempfile
+import tracemalloc
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fakes import FakeNetwork, FakeIPService, FakeDnspodAPI, FakeSMTPServer, write_env
+from core.config import ConfigManager
+from ddns import DDNS
+
+
+def percentile(values, p):
+    """最近秩法计算分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_benchmark(cycles=100, zones=2, records_per_zone=2, services=3, service_latency=0.02,
+                  service_jitter=0.01, failure_rate=0.1, api_latency=0.01, smtp_latency=0.0,
+                  ip_change_every=10, fetch_mode='race', seed=1):
+    """
+    执行基准测试
+
+    Args:
+        cycles: 周期数
+        zones: 域名数量
+        records_per_zone: 每个域名下的 A 记录数量
+        services: IP 回显服务数量
+        service_latency: IP 服务的固定延迟(秒)
+        service_jitter: IP 服务的随机延迟上限(秒)
+        failure_rate: IP 服务返回错误的概率
+        api_latency: DNSPod API 的固定延迟(秒)
+        smtp_latency: SMTP 每条命令的延迟(秒)
+        ip_change_every: 每隔多少个周期更换一次公网IP，0 表示不更换
+        fetch_mode: IP 获取模式
+        seed: 随机数种子
+
+    Returns:
+        dict: 测试结果
+    """
+    network = FakeNetwork()
+    api = FakeDnspodAPI(latency=api_latency)
+    smtp = FakeSMTPServer(latency=smtp_latency)
+    ip_services = [FakeIPService(network, latency=service_latency, jitter=service_jitter,
+                                 failure_rate=failure_rate, seed=seed + i) for i in range(services)]
+
+    records = []
+    for z in range(zones):
+        domain = f"zone{z}.example.com"
+        for r in range(records_per_zone):
+            record_id = api.add_record(domain, f"host{r}")
+            records.append(f"{domain},host{r},A,默认,{record_id}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env_path = os.path.join(workdir, '.env')
+        write_env(env_path, {
+            'TENCENT_SECRET_ID': 'bench-id',
+            'TENCENT_SECRET_KEY': 'bench-key',
+            'DNSPOD_ENDPOINT': api.endpoint,
+            'RECORDS': ';'.join(records),
+            'IP_FETCH_MODE': fetch_mode,
+            'STATE_FILE': os.path.join(workdir, 'state.json'),
+            'PROVIDER_HEALTH_FILE': os.path.join(workdir, 'providers.json'),
+            'VERIFY_WAIT_TIME': 0,
+            'VERIFICATION_INTERVAL': 10 ** 9,
+            'POLL_JITTER': 0,
+            'SMTP_HOST': '127.0.0.1',
+            'SMTP_PORT': smtp.port,
+            'SMTP_USER': 'bench',
+            'SMTP_PASSWORD': 'bench',
+            'SMTP_SENDER_EMAIL': 'ddns@example.com',
+            'SMTP_RECEIVER_EMAIL': 'ops@example.com',
+            'SMTP_USE_TLS': 'false',
+            'NOTIFICATION_DIGEST_WINDOW': 0,
+        })
+
+        # 配置会写入环境变量，结束后恢复，避免影响同一进程中的其他代码
+        saved_environ = dict(os.environ)
+        ddns = DDNS(ConfigManager(env_path))
+        ddns.ip_fetcher.ip_services = [s.as_service() for s in ip_services]
+
+        latencies = []
+        api_calls = []
+        changed_cycles = 0
+        tracemalloc.start()
+        warmup_memory = None
+        try:
+            for i in range(cycles):
+                if ip_change_every and i and i % ip_change_every == 0:
+                    network.rotate()
+                    changed_cycles += 1
+                api.reset_calls()
+                start = time.perf_counter()
+                ddns.run_cycle()
+                ddns.process_verifications()
+                latencies.append(time.perf_counter() - start)
+                api_calls.append(dict(api.calls))
+                if i == min(cycles - 1, max(cycles // 10, 1)):
+                    warmup_memory = tracemalloc.get_traced_memory()[0]
+
+            ddns.notification_manager.flush(timeout=10)
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            if ddns.notification_manager:
+                ddns.notification_manager.stop()
+            for server in [api, smtp] + ip_services:
+                server.close()
+            os.environ.clear()
+            os.environ.update(saved_environ)
+
+        mismatched = [r for r in records
+                      if api.get_value(r.split(',')[0], r.split(',')[-1]) != network.ips[4]]
+
+    actions = sorted({action for calls in api_calls for action in calls})
+    return {
+        'cycles': cycles,
+        'records': len(records),
+        'ip_changes': changed_cycles,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 2),
+            'p90': round(percentile(latencies, 90) * 1000, 2),
+            'p99': round(percentile(latencies, 99) * 1000, 2),
+            'max': round(max(latencies) * 1000, 2),
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2),
+        },
+        'api_calls_per_cycle': round(sum(sum(c.values()) for c in api_calls) / cycles, 3),
+        'api_calls_by_action': {a: sum(c.get(a, 0) for c in api_calls) for a in actions},
+        'api_connections': api.connections,
+        'ip_service_requests': sum(s.requests for s in ip_services),
+        'ip_service_failures': sum(s.failures for s in ip_services),
+        'emails': len(smtp.messages),
+        'smtp_connections': smtp.connections,
+        'memory_kb': {
+            'traced_peak': round(peak_memory / 1024, 1),
+            'traced_growth': round((current_memory - (warmup_memory or current_memory)) / 1024, 1),
+            'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        'records_out_of_sync': len(mismatched),
+    }
+
+
+def print_report(result):
+    latency = result['latency_ms']
+    memory = result['memory_kb']
+    print(f"周期数: {result['cycles']}  记录数: {result['records']}  IP变化次数: {result['ip_changes']}")
+    print(f"周期耗时(ms): p50={latency['p50']}  p90={latency['p90']}  p99={latency['p99']}  "
+          f"max={latency['max']}  mean={latency['mean']}")
+    calls = ", ".join(f"{action}={count}" for action, count in result['api_calls_by_action'].items())
+    print(f"API调用: 每周期 {result['api_calls_per_cycle']} 次 ({calls})，新建连接 {result['api_connections']} 次")
+    print(f"IP服务: 请求 {result['ip_service_requests']} 次，失败 {result['ip_service_failures']} 次")
+    print(f"邮件: {result['emails']} 封，SMTP连接 {result['smtp_connections']} 次")
+    print(f"内存(KB): tracemalloc峰值 {memory['traced_peak']}，预热后增长 {memory['traced_growth']}，"
+          f"最大RSS {memory['max_rss']}")
+    if result['records_out_of_sync']:
+        print(f"警告: {result['records_out_of_sync']} 条记录与最终公网IP不一致")
+
+
+def compare(result, baseline, threshold):
+    """
+    与基线比较，返回退化项列表
+
+    耗时和内存按比例比较，API 调用次数只要增加即视为退化
+    """
+    regressions = []
+    for key in ('p50', 'p90', 'p99'):
+        old, new = baseline['latency_ms'][key], result['latency_ms'][key]
+        if old and new > old * (1 + threshold):
+            regressions.append(f"周期耗时 {key}: {old} -> {new} ms")
+    if result['api_calls_per_cycle'] > baseline['api_calls_per_cycle']:
+        regressions.append(f"每周期API调用: {baseline['api_calls_per_cycle']} -> {result['api_calls_per_cycle']}")
+    old, new = baseline['memory_kb']['traced_peak'], result['memory_kb']['traced_peak']
+    if old and new > old * (1 + threshold):
+        regressions.append(f"内存峰值: {old} -> {new} KB")
+    if result['records_out_of_sync']:
+        regressions.append(f"{result['records_out_of_sync']} 条记录未同步")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DDNS 更新周期基准测试")
+    parser.add_argument('--cycles', type=int, default=100)
+    parser.add_argument('--zones', type=int, default=2)
+    parser.add_argument('--records-per-zone', type=int, default=2)
+    parser.add_argument('--services', type=int, default=3, help="IP 回显服务数量")
+    parser.add_argument('--service-latency', type=float, default=0.02, help="IP 服务延迟(秒)")
+    parser.add_argument('--service-jitter', type=float, default=0.01, help="IP 服务随机延迟上限(秒)")
+    parser.add_argument('--failure-rate', type=float, default=0.1, help="IP 服务失败概率")
+    parser.add_argument('--api-latency', type=float, default=0.01, help="DNSPod API 延迟(秒)")
+    parser.add_argument('--smtp-latency', type=float, default=0.0, help="SMTP 每条命令的延迟(秒)")
+    parser.add_argument('--ip-change-every', type=int, default=10, help="每隔多少周期更换公网IP，0 为不更换")
+    parser.add_argument('--fetch-mode', default='race', choices=['sequential', 'race', 'quorum'])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="以 JSON 输出结果")
+    parser.add_argument('--baseline', help="基线结果文件（--json 的输出）")
+    parser.add_argument('--threshold', type=float, default=0.2, help="耗时和内存允许的退化比例")
+    parser.add_argument('--verbose', action='store_true', help="输出 DDNS 日志")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.ERROR)
+    result = run_benchmark(
+        cycles=args.cycles, zones=args.zones, records_per_zone=args.records_per_zone,
+        services=args.services, service_latency=args.service_latency, service_jitter=args.service_jitter,
+        failure_rate=args.failure_rate, api_latency=args.api_latency, smtp_latency=args.smtp_latency,
+        ip_change_every=args.ip_change_every, fetch_mode=args.fetch_mode, seed=args.seed,
+    )
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions:
+            print("性能退化:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            return 1
+        print("与基线相比未发现退化", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+DNSPod 客户端冷启动基准测试
+
+分别以腾讯云 SDK 和内置轻量客户端（DNSPOD_CLIENT=sdk / lite）启动新的 Python 进程，
+完成导入并对本地 DNSPod API 替身发起一次 DescribeRecordList，比较启动耗时和常驻内存。
+
+用法:
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+# 添加项目根目录到Python路径
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.fakes import FakeDnspodAPI
+
+# 在子进程中执行：导入、创建客户端并查询一次记录列表，输出各阶段耗时和最大 RSS
+CHILD_SCRIPT = """
+import sys, json, time, resource
+start = time.perf_counter()
+from core.config import ConfigManager
+from core.dns_api import DNSUpdater
+imported = time.perf_counter()
+config_manager = ConfigManager()
+config_manager.config = {'secret_id': 'bench-id', 'secret_key': 'bench-key',
+                         'dnspod_endpoint': sys.argv[1], 'dnspod_client': sys.argv[2]}
+assert DNSUpdater(config_manager).get_zone_records('example.com') is not None
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_call_ms': (done - imported) * 1000,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'sdk_loaded': any(name.startswith('tencentcloud') for name in sys.modules),
+}))
+"""
+
+
+def measure(kind, endpoint, runs):
+    """以指定客户端实现启动 runs 个子进程，返回各项指标的中位数"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', CHILD_SCRIPT, endpoint, kind], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True, timeout=60).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        sample['process_ms'] = (time.perf_counter() - start) * 1000
+        samples.append(sample)
+    return {
+        'process_ms': round(statistics.median(s['process_ms'] for s in samples), 1),
+        'import_ms': round(statistics.median(s['import_ms'] for s in samples), 1),
+        'first_call_ms': round(statistics.median(s['first_call_ms'] for s in samples), 1),
+        'max_rss_kb': int(statistics.median(s['max_rss_kb'] for s in samples)),
+        'sdk_loaded': samples[0]['sdk_loaded'],
+    }
+
+
+def run_benchmark(runs=5):
+    api = FakeDnspodAPI()
+    api.add_record('example.com', 'home')
+    try:
+        return {kind: measure(kind, api.endpoint, runs) for kind in ('sdk', 'lite')}
+    finally:
+        api.close()
+
+
+def print_report(result):
+    print(f"{'客户端':<8}{'进程总耗时(ms)':>16}{'导入(ms)':>12}{'首次请求(ms)':>16}{'最大RSS(KB)':>14}")
+    for kind, r in result.items():
+        print(f"{kind:<10}{r['process_ms']:>16}{r['import_ms']:>12}{r['first_call_ms']:>16}{r['max_rss_kb']:>14}")
+    sdk, lite = result['sdk'], result['lite']
+    print(f"lite 相比 sdk: 进程总耗时 {lite['process_ms'] - sdk['process_ms']:+.1f} ms，"
+          f"最大RSS {lite['max_rss_kb'] - sdk['max_rss_kb']:+d} KB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DNSPod 客户端冷启动基准测试")
+    parser.add_argument('--runs', type=int, default=5, help="每种客户端启动的进程数，结果取中位数")
+    parser.add_argument('--json', action='store_true', help="以 JSON 输出结果")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.runs)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,485 @@
+"""
+基准测试和单元测试使用的本地替身服务：DNSPod API、IP 回显服务、STUN 服务、路由器和 SMTP 收件服务
+
+全部监听在本机回环地址的随机端口上，在后台线程中运行，不访问外部网络。
+"""
+
+import json
+import time
+import uuid
+import socket
+import random
+import struct
+import ipaddress
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def write_env(path, settings):
+    """将配置项逐行写入 .env 文件，供指向替身服务的 DDNS 实例加载"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for key, value in settings.items():
+            f.write(f"{key}={value}\n")
+
+
+class _BackgroundServer:
+    """在后台线程中运行的 socketserver 基类"""
+
+    def _serve(self, server):
+        self.server = server
+        self.server.daemon_threads = True
+        self.port = server.server_address[1]
+        self.thread = threading.Thread(target=server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join(timeout=5)
+
+
+class FakeNetwork:
+    """当前"公网IP"，可随时更换以模拟拨号或前缀变化"""
+
+    def __init__(self, ipv4='203.0.113.10', ipv6='2001:db8::10'):
+        self.ips = {4: ipv4, 6: ipv6}
+        self._counter = 10
+
+    def rotate(self, family=4):
+        """切换到一个新的地址"""
+        self._counter += 1
+        if family == 6:
+            self.ips[6] = f"2001:db8::{self._counter:x}"
+        else:
+            self.ips[4] = f"203.0.113.{self._counter % 250 + 1}"
+        return self.ips[family]
+
+
+class FakeIPService(_BackgroundServer):
+    """
+    IP 回显服务，以纯文本返回当前公网IP
+
+    Args:
+        network: FakeNetwork 实例
+        family: 返回的地址族
+        latency: 每次请求的固定延迟(秒)
+        jitter: 额外的随机延迟上限(秒)
+        failure_rate: 返回 HTTP 503 的概率
+        seed: 随机数种子，保证结果可复现
+    """
+
+    def __init__(self, network, family=4, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.network = network
+        self.family = family
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests += 1
+                    delay = fake.latency + fake.random.uniform(0, fake.jitter)
+                    failed = fake.random.random() < fake.failure_rate
+                    if failed:
+                        fake.failures += 1
+                time.sleep(delay)
+                if failed:
+                    self.send_error(503)
+                    return
+                body = fake.network.ips[fake.family].encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._serve(ThreadingHTTPServer(('127.0.0.1', 0), Handler))
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/"
+
+    def as_service(self):
+        """返回可直接放入 IPFetcher 服务列表的配置"""
+        return {'url': self.url, 'parser': lambda r: r.text.strip()}
+
+
+class FakeStunServer(_BackgroundServer):
+    """
+    STUN 服务，对 Binding 请求返回 XOR-MAPPED-ADDRESS
+
+    Args:
+        network: FakeNetwork 实例，映射地址取自当前公网IP
+        family: 监听的地址族，6 时监听 ::1
+        port_offset: 映射端口相对请求源端口的偏移，不同服务器使用不同偏移可模拟对称型NAT
+        drop: 丢弃最先收到的多少个请求，模拟 UDP 丢包
+        mapped_ip: 固定返回的映射地址，用于模拟多出口
+    """
+
+    def __init__(self, network, family=4, port_offset=0, drop=0, mapped_ip=None):
+        self.network = network
+        self.family = family
+        self.port_offset = port_offset
+        self.drop = drop
+        self.mapped_ip = mapped_ip
+        self.requests = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                data, sock = self.request
+                with fake._lock:
+                    fake.requests += 1
+                    if fake.requests <= fake.drop:
+                        return
+                if len(data) < 20 or struct.unpack('!H', data[:2])[0] != 0x0001:
+                    return
+                transaction_id = data[8:20]
+                address = ipaddress.ip_address(fake.mapped_ip or fake.network.ips[fake.family])
+                port = (self.client_address[1] + fake.port_offset) % 65536
+                cookie = data[4:8]
+                mask = cookie + transaction_id if address.version == 6 else cookie
+                value = struct.pack('!xBH', 2 if address.version == 6 else 1, port ^ 0x2112) + \
+                    bytes(a ^ b for a, b in zip(address.packed, mask))
+                attribute = struct.pack('!HH', 0x0020, len(value)) + value
+                sock.sendto(struct.pack('!HH', 0x0101, len(attribute)) + data[4:20] + attribute,
+                            self.client_address)
+
+        server_class = socketserver.ThreadingUDPServer
+        if family == 6:
+            server_class = type('UDPServer6', (server_class,), {'address_family': socket.AF_INET6})
+        self._serve(server_class(('::1' if family == 6 else '127.0.0.1', 0), Handler))
+
+    @property
+    def address(self):
+        return f"[::1]:{self.port}" if self.family == 6 else f"127.0.0.1:{self.port}"
+
+
+class FakeGateway:
+    """
+    路由器替身，同时提供 NAT-PMP / PCP（同一 UDP 端口）、SSDP 应答和 UPnP IGD 控制接口
+
+    SSDP 监听在回环地址的随机端口上，以单播应答，客户端需要把 ssdp_addr 指向它。
+
+    Args:
+        wan_ip: 各协议返回的 WAN 口地址
+        protocols: 启用的协议，未启用的协议不应答
+        service_type: 设备描述中的 WAN 连接服务类型
+    """
+
+    def __init__(self, wan_ip='8.8.4.4', protocols=('upnp', 'natpmp', 'pcp'),
+                 service_type='urn:schemas-upnp-org:service:WANIPConnection:1'):
+        self.wan_ip = wan_ip
+        self.protocols = set(protocols)
+        self.service_type = service_type
+        self.requests = {'natpmp': 0, 'pcp': 0, 'pcp_delete': 0, 'ssdp': 0, 'description': 0, 'soap': 0}
+        self._lock = threading.Lock()
+        fake = self
+
+        def count(kind):
+            with fake._lock:
+                fake.requests[kind] += 1
+
+        class PortMappingHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                data, sock = self.request
+                if len(data) >= 2 and data[:2] == b'\x00\x00' and 'natpmp' in fake.protocols:
+                    count('natpmp')
+                    reply = struct.pack('!BBHI4s', 0, 128, 0, int(time.time()), socket.inet_aton(fake.wan_ip))
+                elif len(data) >= 60 and data[0] == 2 and data[1] == 1 and 'pcp' in fake.protocols:
+                    lifetime = struct.unpack('!I', data[4:8])[0]
+                    count('pcp' if lifetime else 'pcp_delete')
+                    nonce, protocol, internal_port = data[24:36], data[36], struct.unpack('!H', data[40:42])[0]
+                    reply = struct.pack('!BBxBII12x', 2, 0x81, 0, lifetime, int(time.time())) + \
+                        struct.pack('!12sBxxxHH16s', nonce, protocol, internal_port, internal_port,
+                                    ipaddress.IPv6Address(f'::ffff:{fake.wan_ip}').packed)
+                elif 'natpmp' in fake.protocols:
+                    # 仅支持 NAT-PMP 的网关对未知版本返回“不支持的版本”
+                    reply = struct.pack('!BBH', 0, 128 + data[1] if len(data) > 1 else 128, 1)
+                else:
+                    return
+                sock.sendto(reply, self.client_address)
+
+        class SSDPHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                data, sock = self.request
+                if 'upnp' not in fake.protocols or not data.startswith(b'M-SEARCH'):
+                    return
+                count('ssdp')
+                reply = (f"HTTP/1.1 200 OK\r\nCACHE-CONTROL: max-age=120\r\n"
+                         f"ST: urn:schemas-upnp-org:device:InternetGatewayDevice:1\r\n"
+                         f"LOCATION: http://127.0.0.1:{fake.http.port}/rootDesc.xml\r\n\r\n")
+                sock.sendto(reply.encode(), self.client_address)
+
+        class HTTPHandler(BaseHTTPRequestHandler):
+            def reply(self, body):
+                body = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/xml')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                count('description')
+                self.reply(
+                    '<?xml version="1.0"?><root xmlns="urn:schemas-upnp-org:device-1-0"><device>'
+                    '<deviceType>urn:schemas-upnp-org:device:InternetGatewayDevice:1</deviceType>'
+                    '<deviceList><device><deviceList><device><serviceList><service>'
+                    f'<serviceType>{fake.service_type}</serviceType>'
+                    '<controlURL>/ctl/IPConn</controlURL></service></serviceList>'
+                    '</device></deviceList></device></deviceList></device></root>')
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                count('soap')
+                self.reply(
+                    '<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">'
+                    f'<s:Body><u:GetExternalIPAddressResponse xmlns:u="{fake.service_type}">'
+                    f'<NewExternalIPAddress>{fake.wan_ip}</NewExternalIPAddress>'
+                    '</u:GetExternalIPAddressResponse></s:Body></s:Envelope>')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.http = _BackgroundServer()
+        self.http._serve(ThreadingHTTPServer(('127.0.0.1', 0), HTTPHandler))
+        self.port_mapping = _BackgroundServer()
+        self.port_mapping._serve(socketserver.ThreadingUDPServer(('127.0.0.1', 0), PortMappingHandler))
+        self.ssdp = _BackgroundServer()
+        self.ssdp._serve(socketserver.ThreadingUDPServer(('127.0.0.1', 0), SSDPHandler))
+
+    def client_options(self):
+        """返回指向该替身的 GatewayClient 参数"""
+        return {'address': '127.0.0.1', 'port': self.port_mapping.port, 'ssdp_addr': ('127.0.0.1', self.ssdp.port)}
+
+    def close(self):
+        for server in (self.http, self.port_mapping, self.ssdp):
+            server.close()
+
+
+class FakeDnspodAPI(_BackgroundServer):
+    """
+    兼容 DNSPod API 3.0 的本地服务，实现 DescribeRecordList、CreateRecord、ModifyRecord、
+    ModifyDynamicDNS 和 ModifyRecordBatch（立即生效）
+
+    不校验签名。记录保存在内存中，按 Action 统计调用次数。
+
+    Args:
+        latency: 每次请求的固定延迟(秒)
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.zones = {}        # domain -> {record_id: record}
+        self.calls = {}        # action -> 次数
+        self.connections = 0
+        self.injected_errors = []   # 依次返回的错误码，用于模拟限频和临时故障
+        self.disabled_actions = set()   # 模拟未开通或无权限的接口，返回 InvalidAction
+        self.lost_responses = []    # 照常执行但返回 InternalError 的 Action，模拟服务端已处理而响应丢失
+        self.last_request = None    # 最近一次请求的 (请求头, 请求体)，用于核对签名
+        self._jobs = 0
+        self._next_id = 1000
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'   # 支持长连接，便于观察连接复用
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                fake.last_request = (dict(self.headers), body)
+                params = json.loads(body or b'{}')
+                action = self.headers.get('X-TC-Action', '')
+                time.sleep(fake.latency)
+                body = json.dumps({'Response': fake.handle(action, params)}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._serve(ThreadingHTTPServer(('127.0.0.1', 0), Handler))
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def add_record(self, domain, subdomain, record_type='A', value='198.51.100.1', line='默认'):
+        """添加一条记录，返回记录ID"""
+        with self._lock:
+            return self._insert_record(domain, subdomain, record_type, value, line)
+
+    def _insert_record(self, domain, subdomain, record_type, value, line):
+        self._next_id += 1
+        record_id = self._next_id
+        self.zones.setdefault(domain, {})[record_id] = {
+            'RecordId': record_id, 'Name': subdomain, 'Type': record_type, 'Value': value,
+            'Line': line, 'LineId': '0', 'TTL': 600, 'Status': 'ENABLE', 'Weight': None,
+            'MX': 0, 'MonitorStatus': '', 'Remark': '', 'DefaultNS': False,
+            'UpdatedOn': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        return record_id
+
+    def remove_record(self, domain, record_id):
+        with self._lock:
+            del self.zones[domain][int(record_id)]
+
+    def get_value(self, domain, record_id):
+        return self.zones[domain][int(record_id)]['Value']
+
+    def inject_errors(self, *codes):
+        """让接下来的请求依次返回指定的错误码"""
+        with self._lock:
+            self.injected_errors.extend(codes)
+
+    def lose_responses(self, *actions):
+        """让接下来的这些 Action 照常执行，但依次返回 InternalError"""
+        with self._lock:
+            self.lost_responses.extend(actions)
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = {}
+
+    @staticmethod
+    def _error(code, message):
+        return {'Error': {'Code': code, 'Message': message}, 'RequestId': str(uuid.uuid4())}
+
+    def handle(self, action, params):
+        with self._lock:
+            self.calls[action] = self.calls.get(action, 0) + 1
+            if self.injected_errors:
+                code = self.injected_errors.pop(0)
+                return self._error(code, f'模拟错误: {code}')
+            if action in self.disabled_actions:
+                return self._error('InvalidAction', f'接口不存在: {action}')
+            response = self._apply(action, params)
+            if action in self.lost_responses and 'Error' not in response:
+                self.lost_responses.remove(action)
+                return self._error('InternalError', '模拟错误: 已处理但响应丢失')
+            return response
+
+    def _apply(self, action, params):
+        if action == 'ModifyRecordBatch':
+            # 批量修改不指定域名，按记录ID在全部域名中查找
+            all_records = {rid: r for zone in self.zones.values() for rid, r in zone.items()}
+            ids = params.get('RecordIdList') or []
+            if params.get('Change') != 'value' or any(rid not in all_records for rid in ids):
+                return self._error('InvalidParameter', '参数错误')
+            for rid in ids:
+                all_records[rid]['Value'] = params['ChangeTo']
+            self._jobs += 1
+            return {'JobId': self._jobs, 'DetailList': [], 'RequestId': str(uuid.uuid4())}
+
+        zone = self.zones.get(params.get('Domain'))
+        if zone is None:
+            return self._error('InvalidParameter.DomainNotExist', '域名不存在')
+
+        if action == 'DescribeRecordList':
+            records = [r for r in zone.values()
+                       if (not params.get('RecordType') or r['Type'] == params['RecordType'])
+                       and (not params.get('Subdomain') or r['Name'] == params['Subdomain'])]
+            if not records:
+                return self._error('ResourceNotFound.NoDataOfRecord', '记录列表为空')
+            offset = params.get('Offset', 0)
+            page = records[offset:offset + params.get('Limit', 100)]
+            return {
+                'RecordCountInfo': {'SubdomainCount': len(records), 'ListCount': len(page),
+                                    'TotalCount': len(records)},
+                'RecordList': page,
+                'RequestId': str(uuid.uuid4()),
+            }
+
+        if action == 'CreateRecord':
+            record_id = self._insert_record(params['Domain'], params.get('SubDomain', '@'), params['RecordType'],
+                                            params['Value'], params['RecordLine'])
+            return {'RecordId': record_id, 'RequestId': str(uuid.uuid4())}
+
+        if action in ('ModifyRecord', 'ModifyDynamicDNS'):
+            record = zone.get(int(params.get('RecordId', 0)))
+            if record is None:
+                return self._error('InvalidParameter.RecordIdInvalid', '记录ID错误')
+            record['Value'] = params['Value']
+            record['UpdatedOn'] = time.strftime('%Y-%m-%d %H:%M:%S')
+            return {'RecordId': record['RecordId'], 'RequestId': str(uuid.uuid4())}
+
+        return self._error('UnsupportedOperation', f'不支持的操作: {action}')
+
+
+class FakeSMTPServer(_BackgroundServer):
+    """
+    只接收不投递的 SMTP 服务，支持 EHLO、AUTH、MAIL、RCPT、DATA、NOOP、QUIT
+
+    Args:
+        latency: 每条命令应答前的延迟(秒)
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                time.sleep(fake.latency)
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def handle(self):
+                with fake._lock:
+                    fake.connections += 1
+                self.reply("220 fake-smtp ready")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode(errors='replace').strip()
+                    verb = command.split(' ', 1)[0].upper()
+                    if verb == 'EHLO':
+                        self.wfile.write(b"250-fake-smtp\r\n250 AUTH PLAIN LOGIN\r\n")
+                    elif verb == 'HELO':
+                        self.reply("250 fake-smtp")
+                    elif verb == 'AUTH':
+                        self.reply("235 Authentication successful")
+                    elif verb == 'DATA':
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        lines = []
+                        while True:
+                            data = self.rfile.readline()
+                            if not data or data in (b".\r\n", b".\n"):
+                                break
+                            lines.append(data)
+                        with fake._lock:
+                            fake.messages.append(b''.join(lines))
+                        self.reply("250 OK")
+                    elif verb == 'QUIT':
+                        self.reply("221 Bye")
+                        return
+                    elif verb in ('MAIL', 'RCPT', 'NOOP', 'RSET'):
+                        self.reply("250 OK")
+                    else:
+                        self.reply("502 Command not implemented")
+
+        self._serve(socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler))
@@ -0,0 +1,413 @@
+import hmac
+import json
+import time
+import hashlib
+import logging
+import ipaddress
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from core import metrics
+
+# 上报请求的时间戳与服务端时间允许的最大偏差(秒)，超出视为重放
+MAX_CLOCK_SKEW = 300
+
+# 上报请求体的大小上限
+MAX_BODY_SIZE = 64 * 1024
+
+
+def sign_report(secret, timestamp, body, agent=''):
+    """
+    计算上报请求的签名，HMAC-SHA256(secret, 时间戳 + 换行 + 节点名 + 换行 + 请求体)
+
+    Args:
+        secret: 共享密钥或节点密钥
+        timestamp: 时间戳字符串
+        body: 请求体（bytes）
+        agent: 节点名称，签名后无法被替换为其他节点
+    """
+    message = timestamp.encode('utf-8') + b"\n" + (agent or '').encode('utf-8') + b"\n" + body
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+class ReportError(ValueError):
+    """上报内容格式错误"""
+
+
+class ReportForbidden(Exception):
+    """节点上报了未授权的记录"""
+
+
+def send_report(url, secret, reports, agent=None, timeout=10):
+    """
+    向汇聚服务上报IP
+
+    Args:
+        url: 汇聚服务地址，例如 http://ddns.internal:8080
+        secret: 共享密钥，汇聚服务配置了 AGGREGATOR_AGENTS 时为本节点的密钥
+        reports: [{'name': 完整域名, 'type': 记录类型, 'ip': 地址}] 列表
+        agent: 节点名称，参与签名
+        timeout: 超时时间(秒)
+
+    Returns:
+        dict: 服务端返回的处理结果，失败时返回 None
+    """
+    body = json.dumps({'reports': reports}).encode('utf-8')
+    timestamp = str(int(time.time()))
+    headers = {
+        'Content-Type': 'application/json',
+        'X-DDNS-Timestamp': timestamp,
+        'X-DDNS-Signature': sign_report(secret, timestamp, body, agent),
+    }
+    if agent:
+        headers['X-DDNS-Agent'] = agent
+    try:
+        response = requests.post(url.rstrip('/') + '/report', data=body, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    except (requests.RequestException, ValueError) as e:
+        logging.error(f"向汇聚服务上报IP失败: {e}")
+        return None
+
+
+class Aggregator:
+    """
+    汇聚服务：接收各节点上报的IP，在内存中保存每条记录的目标值，
+    定期把发生变化的记录按域名合并为批量、限流的 DNSPod 修改
+    """
+
+    def __init__(self, config_manager, dns_updater, secret, flush_interval=5, verification_interval=3600,
+                 on_failure=None, agents=None, state_cache=None):
+        """
+        初始化汇聚服务
+
+        Args:
+            config_manager: 配置管理器，只接受配置中已有记录的上报
+            dns_updater: DNSUpdater 实例
+            secret: 上报签名的共享密钥，配置了 agents 时不使用
+            flush_interval: 两次提交修改之间的间隔(秒)，期间同一记录的多次上报只保留最新值
+            verification_interval: 重新核对全部记录的间隔(秒)，用于发现被手动修改的记录
+            on_failure: 记录修改失败时的回调 (记录配置, IP)
+            agents: 节点名 -> {'secret', 'records'}，设置后每个节点使用自己的密钥，只能上报 records 中的域名
+            state_cache: StateCache 实例，保存提交时查找到的记录ID
+        """
+        self.config_manager = config_manager
+        self.dns_updater = dns_updater
+        self.secret = secret
+        self.agents = agents or {}
+        self.state_cache = state_cache
+        self.flush_interval = flush_interval
+        self.verification_interval = verification_interval
+        self.on_failure = on_failure
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self.desired = {}   # 记录键 -> {'ip', 'agent', 'reported_at'}
+        self.applied = {}   # 记录键 -> 已确认写入 DNSPod 的值
+        self.dirty = set()  # 等待提交的记录键
+        self.last_full_check = time.monotonic()
+        self._indexed_records = None
+        self._index = {}
+        # 防重放：每个节点最近一次接受的时间戳，以及时间窗口内已接受的签名
+        self.last_timestamps = {}
+        self.seen_signatures = {}
+        self._server = None
+        self._threads = []
+
+    @staticmethod
+    def report_key(name, record_type):
+        return f"{name.lower().rstrip('.')}|{record_type.upper()}"
+
+    def get_record(self, key):
+        """按上报的域名和类型查找配置中的记录，配置重新加载后重建索引"""
+        records = self.config_manager.get_records()
+        if records is not self._indexed_records:
+            self._index = {self.report_key(self.config_manager.get_record_name(r), r['record_type']): r
+                           for r in records}
+            self._indexed_records = records
+        return self._index.get(key)
+
+    def verify_signature(self, timestamp, signature, body, agent=None):
+        """
+        校验上报签名和时间戳，并拒绝重放的请求
+
+        同一节点的时间戳不能早于已接受的时间戳，时间窗口内已接受过的签名不再接受；
+        时间戳精确到秒，同一秒内内容不同的上报签名不同，仍然可以接受
+        """
+        try:
+            timestamp_value = int(timestamp)
+        except (TypeError, ValueError):
+            return False
+        now = time.time()
+        if abs(now - timestamp_value) > MAX_CLOCK_SKEW or not signature:
+            return False
+        if self.agents:
+            entry = self.agents.get(agent)
+            if entry is None:
+                return False
+            secret = entry['secret']
+        else:
+            secret = self.secret
+        if not hmac.compare_digest(sign_report(secret, timestamp, body, agent), signature):
+            return False
+
+        with self._lock:
+            if timestamp_value < self.last_timestamps.get(agent, 0) or signature in self.seen_signatures:
+                logging.warning(f"拒绝重放的上报: 节点 {agent or '未知'}，时间戳 {timestamp}")
+                return False
+            self.last_timestamps[agent] = timestamp_value
+            self.seen_signatures[signature] = timestamp_value
+            # 超出时间窗口的签名会被时间戳校验拒绝，不再需要保存
+            for seen, seen_at in list(self.seen_signatures.items()):
+                if seen_at < now - MAX_CLOCK_SKEW:
+                    del self.seen_signatures[seen]
+        return True
+
+    @staticmethod
+    def parse_reports(reports):
+        """
+        校验并解析一批上报
+
+        Returns:
+            list: [(域名, 记录类型, 地址)]
+
+        Raises:
+            ReportError: 格式错误，整批拒绝
+        """
+        if not isinstance(reports, list):
+            raise ReportError("reports 应为列表")
+        parsed = []
+        for report in reports:
+            if not isinstance(report, dict):
+                raise ReportError(f"上报项应为对象: {report!r}")
+            name, ip, record_type = report.get('name'), report.get('ip'), report.get('type')
+            if not isinstance(name, str) or not name.strip():
+                raise ReportError(f"name 无效: {name!r}")
+            if not isinstance(ip, str):
+                raise ReportError(f"ip 无效: {ip!r}")
+            try:
+                address = ipaddress.ip_address(ip)
+            except ValueError:
+                raise ReportError(f"ip 无效: {ip!r}")
+            if record_type is None:
+                record_type = 'AAAA' if address.version == 6 else 'A'
+            if not isinstance(record_type, str) or record_type.upper() not in ('A', 'AAAA'):
+                raise ReportError(f"type 无效: {record_type!r}")
+            if (record_type.upper() == 'AAAA') != (address.version == 6):
+                raise ReportError(f"{name} 的记录类型 {record_type} 与地址 {ip} 不一致")
+            parsed.append((name, record_type, str(address)))
+        return parsed
+
+    def submit(self, reports, agent=None):
+        """
+        处理一批上报
+
+        Args:
+            reports: [{'name', 'type'(可选，按地址推断), 'ip'}] 列表
+            agent: 上报节点名称
+
+        Returns:
+            dict: accepted 为记录值有变化、等待提交的数量，unchanged 为与当前值一致的数量，unknown 为未配置的域名
+
+        Raises:
+            ReportError: 格式错误
+            ReportForbidden: 节点上报了未授权的域名
+        """
+        # 先校验整批上报，格式错误或包含未授权的域名时整批拒绝
+        parsed = self.parse_reports(reports)
+        allowed = self.agents.get(agent, {}).get('records') if self.agents else None
+        if allowed is not None:
+            forbidden = [name for name, _, _ in parsed if name.lower().rstrip('.') not in allowed]
+            if forbidden:
+                raise ReportForbidden(f"节点 {agent} 无权上报: {', '.join(forbidden)}")
+
+        result = {'accepted': 0, 'unchanged': 0, 'unknown': []}
+        now = time.time()
+        for name, record_type, ip in parsed:
+            key = self.report_key(name, record_type)
+            if self.get_record(key) is None:
+                result['unknown'].append(name)
+                metrics.AGGREGATOR_REPORTS.inc(result='unknown')
+                continue
+            with self._lock:
+                previous = self.desired.get(key)
+                self.desired[key] = {'ip': ip, 'agent': agent, 'reported_at': now}
+                if self.applied.get(key) == ip and key not in self.dirty:
+                    status = 'unchanged'
+                else:
+                    if previous and previous['ip'] != ip:
+                        logging.info(f"{name} ({record_type}) 上报值变化: {previous['ip']} -> {ip} (节点: {agent or '未知'})")
+                    self.dirty.add(key)
+                    status = 'accepted'
+            result[status] += 1
+            metrics.AGGREGATOR_REPORTS.inc(result=status)
+        return result
+
+    def flush(self):
+        """
+        提交等待中的修改，每个域名只查询一次记录列表，仅修改与目标值不一致的记录
+
+        Returns:
+            int: 提交修改的记录数
+        """
+        with self._lock:
+            if time.monotonic() - self.last_full_check >= self.verification_interval:
+                # 定期重新核对全部已上报的记录
+                self.last_full_check = time.monotonic()
+                self.applied.clear()
+                self.dirty |= set(self.desired)
+            pending = {key: self.desired[key]['ip'] for key in self.dirty}
+            self.dirty.clear()
+        if not pending:
+            return 0
+
+        zones = {}
+        for key, ip in pending.items():
+            record = self.get_record(key)
+            if record is not None:
+                zones.setdefault(record['domain'], []).append((key, record, ip))
+
+        submitted = 0
+        for domain, items in zones.items():
+            zone_records = self.dns_updater.get_zone_records(domain)
+            if zone_records is None:
+                self._retry(key for key, _, _ in items)
+                continue
+
+            changes = []
+            keys = {}
+            for key, record, ip in items:
+                if not record['record_id']:
+                    record['record_id'] = self.dns_updater.find_record_id(record, zone_records) or ''
+                    if not record['record_id']:
+                        logging.error(f"未找到记录: {self.config_manager.get_record_name(record)} ({record['record_type']})")
+                        continue
+                    if self.state_cache is not None:
+                        self.state_cache.set_record_id(record, record['record_id'])
+                current = zone_records.get(str(record['record_id']))
+                if current and current['value'] == ip:
+                    self._mark_applied(key, ip)
+                    continue
+                changes.append((record, ip))
+                keys[id(record)] = key
+
+            for record, ip, updated in self.dns_updater.update_zone_records(domain, changes):
+                name = self.config_manager.get_record_name(record)
+                metrics.RECORD_UPDATES.inc(record_type=record['record_type'], result='success' if updated else 'failure')
+                if updated:
+                    logging.info(f"已提交修改: {name} -> {ip}")
+                    self._mark_applied(keys[id(record)], ip)
+                    submitted += 1
+                else:
+                    logging.error(f"修改记录失败: {name} -> {ip}，下次提交时重试")
+                    self._retry([keys[id(record)]])
+                    if self.on_failure:
+                        self.on_failure(record, ip)
+        return submitted
+
+    def _mark_applied(self, key, ip):
+        with self._lock:
+            self.applied[key] = ip
+
+    def _retry(self, keys):
+        with self._lock:
+            self.dirty.update(keys)
+
+    def _flush_loop(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"汇聚服务提交修改时发生错误: {e}", exc_info=True)
+
+    def start(self, host='0.0.0.0', port=8080):
+        """启动上报接口和后台提交线程"""
+        handler = type('AggregatorHandler', (_ReportHandler,), {'aggregator': self})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._stopped.clear()
+        self._threads = [
+            threading.Thread(target=self._server.serve_forever, name='aggregator-http', daemon=True),
+            threading.Thread(target=self._flush_loop, name='aggregator-flush', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        logging.info(f"汇聚服务已启动: http://{host}:{self.port}/report，每 {self.flush_interval} 秒提交一次修改")
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+
+class _ReportHandler(BaseHTTPRequestHandler):
+    aggregator = None
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.split('?')[0] != '/report':
+            self._reply(404, {'error': 'not found'})
+            return
+        length = self.headers.get('Content-Length')
+        if length is None:
+            self._reply(411, {'error': 'length required'})
+            return
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # 负数长度会使 rfile.read 一直读到连接关闭，绕过请求体大小限制
+            metrics.AGGREGATOR_REPORTS.inc(result='invalid')
+            self._reply(400, {'error': 'invalid content length'})
+            return
+        if length > MAX_BODY_SIZE:
+            self._reply(413, {'error': 'body too large'})
+            return
+        body = self.rfile.read(length)
+        agent = self.headers.get('X-DDNS-Agent', '')
+        if not self.aggregator.verify_signature(self.headers.get('X-DDNS-Timestamp'),
+                                                self.headers.get('X-DDNS-Signature'), body, agent):
+            metrics.AGGREGATOR_REPORTS.inc(result='unauthorized')
+            logging.warning(f"拒绝未通过签名校验的上报: {self.address_string()}")
+            self._reply(401, {'error': 'invalid signature'})
+            return
+        try:
+            payload = json.loads(body)
+            if not isinstance(payload, dict) or 'reports' not in payload:
+                raise ReportError("缺少 reports")
+            result = self.aggregator.submit(payload['reports'], agent=agent or self.address_string())
+        except ReportForbidden as e:
+            metrics.AGGREGATOR_REPORTS.inc(result='forbidden')
+            logging.warning(str(e))
+            self._reply(403, {'error': str(e)})
+            return
+        except ValueError as e:
+            # json.JSONDecodeError 和 ReportError 都是 ValueError
+            metrics.AGGREGATOR_REPORTS.inc(result='invalid')
+            self._reply(400, {'error': f'invalid report: {e}'})
+            return
+        self._reply(200, result)
+
+    def log_message(self, format, *args):
+        logging.debug(f"上报请求: {self.address_string()} {format % args}")
@@ -1,24 +1,133 @@
 import os
+import re
+import socket
 import logging
-from dotenv import load_dotenv
+import importlib.util
+from dotenv import dotenv_values
 
 class ConfigManager:
     """配置管理类，负责加载和验证配置"""
 
-    def __init__(self):
-        """初始化配置管理器"""
+    def __init__(self, env_path=None):
+        """
+        初始化配置管理器
+
+        Args:
+            env_path: .env 文件路径，默认为项目目录下的 .env
+        """
         self.config = None
+        self.env_path = env_path or os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+        self._env_signature = None      # 上次加载时 .env 文件的 (inode, 修改时间, 大小)
+        self._loaded = False            # 是否已按当前文件状态加载过（无论成功与否）
+        self._load_ok = False           # 上次加载是否成功
+        self._env_originals = {}        # 被 .env 覆盖的环境变量及其原始值，用于在 .env 删除该项时恢复
     
     def get_full_domain(self):
         """根据配置构建并返回完整域名。"""
         if self.config is None:
             return "[配置未加载]"
+        records = self.config.get('records') or []
+        if len(records) > 1:
+            names = [self.get_record_name(r) for r in records[:3]]
+            suffix = f" 等{len(records)}条记录" if len(records) > 3 else ""
+            return ", ".join(names) + suffix
         domain = self.config.get('domain', "")
         subdomain = self.config.get('subdomain', "")
         if subdomain and subdomain != '@':
             return f"{subdomain}.{domain}"
         return domain
 
+    @staticmethod
+    def get_record_name(record):
+        """返回单条记录的完整域名"""
+        subdomain = record.get('subdomain', "")
+        if subdomain and subdomain != '@':
+            return f"{subdomain}.{record['domain']}"
+        return record['domain']
+
+    @staticmethod
+    def get_record_family(record):
+        """返回记录对应的地址族，AAAA 记录为 6，其余为 4"""
+        return 6 if record['record_type'].upper() == 'AAAA' else 4
+
+    @staticmethod
+    def parse_records(value):
+        """
+        解析多记录配置
+
+        格式为每条记录一项，使用分号或换行分隔，字段之间使用逗号分隔：
+        域名,子域名,记录类型,线路[,记录ID]
+
+        记录ID可省略或写为 auto，此时启动后按域名、子域名、记录类型和线路自动查找
+
+        Args:
+            value: RECORDS 环境变量的值
+
+        Returns:
+            list: 记录字典列表，格式错误时返回 None
+        """
+        records = []
+        for item in re.split(r'[;\n]', value):
+            item = item.strip()
+            if not item:
+                continue
+            fields = [f.strip() for f in item.split(',')]
+            if len(fields) == 4:
+                fields.append('')
+            if len(fields) != 5 or not all(fields[:4]):
+                logging.error(f"RECORDS 配置格式错误: {item}（应为 域名,子域名,记录类型,线路[,记录ID]）")
+                return None
+            domain, subdomain, record_type, record_line, record_id = fields
+            records.append(ConfigManager.make_record(domain, subdomain, record_type, record_line, record_id))
+        return records
+
+    @staticmethod
+    def parse_aggregator_agents(value):
+        """
+        解析汇聚服务的上报节点配置
+
+        格式为每个节点一项，使用分号或换行分隔，字段之间使用逗号分隔：
+        节点名,密钥[,允许上报的完整域名...]
+
+        未列出域名的节点可以上报全部记录
+
+        Args:
+            value: AGGREGATOR_AGENTS 环境变量的值
+
+        Returns:
+            dict: 节点名 -> {'secret', 'records'}，records 为允许的域名集合或 None；格式错误时返回 None
+        """
+        agents = {}
+        for item in re.split(r'[;\n]', value or ''):
+            item = item.strip()
+            if not item:
+                continue
+            fields = [f.strip() for f in item.split(',')]
+            if len(fields) < 2 or not all(fields[:2]):
+                logging.error(f"AGGREGATOR_AGENTS 配置格式错误: {item}（应为 节点名,密钥[,域名...]）")
+                return None
+            names = {name.lower().rstrip('.') for name in fields[2:] if name}
+            agents[fields[0]] = {'secret': fields[1], 'records': names or None}
+        return agents
+
+    @staticmethod
+    def make_record(domain, subdomain, record_type, record_line, record_id=None):
+        """
+        生成记录配置字典
+
+        记录ID为空或 auto 时 record_id 为空字符串，auto_id 为 True，由 DDNS 在同步前自动查找
+        """
+        record_id = (record_id or '').strip()
+        auto_id = record_id.lower() in ('', 'auto')
+        return {
+            'domain': domain,
+            'subdomain': subdomain,
+            'record_type': record_type,
+            'record_line': record_line,
+            'record_id': '' if auto_id else record_id,
+            'auto_id': auto_id,
+        }
+
     def load_temp_smtp_config(self):
         """加载临时SMTP配置，用于在主配置加载失败时发送错误邮件"""
         error_email_interval = int(os.getenv('ERROR_EMAIL_INTERVAL', 3600))
@@ -43,22 +152,127 @@ class ConfigManager:
             return temp_config
         return None
 
+    def _get_env_signature(self):
+        """返回 .env 文件的 (inode, 修改时间, 大小)，文件不存在时返回 None"""
+        try:
+            st = os.stat(self.env_path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _apply_env_file(self):
+        """将 .env 中的配置写入环境变量，.env 中已删除的项恢复为原始值"""
+        values = dotenv_values(self.env_path) if os.path.exists(self.env_path) else {}
+        values = {key: value for key, value in values.items() if value is not None}
+        for key in list(self._env_originals):
+            if key not in values:
+                original = self._env_originals.pop(key)
+                if original is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = original
+        for key, value in values.items():
+            if key not in self._env_originals:
+                self._env_originals[key] = os.environ.get(key)
+            os.environ[key] = value
+
+    def reload_if_changed(self):
+        """
+        仅在 .env 文件变化（inode、修改时间或大小不同）时重新加载配置
+
+        Returns:
+            tuple: (config, changed_keys)，config 为当前有效配置，加载失败时为 None；
+                   changed_keys 为与上次成功加载相比发生变化的配置项集合，未重新加载时为空集合
+        """
+        signature = self._get_env_signature()
+        if self._loaded and signature == self._env_signature:
+            return (self.config if self._load_ok else None), set()
+
+        if self._loaded:
+            logging.info(f"检测到配置文件变化，重新加载配置: {self.env_path}")
+        previous = self.config or {}
+        config = self.load_config()
+        if not config:
+            return None, set()
+        changed = {key for key in set(previous) | set(config) if previous.get(key) != config.get(key)}
+        if previous and changed:
+            logging.info(f"配置项已变化: {', '.join(sorted(changed))}")
+        return config, changed
+
     def load_config(self):
-        """动态加载配置"""
-        # 使用相对路径加载 .env 文件
-        env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-        logging.debug(f"尝试加载配置文件: {env_path}")
-        load_dotenv(env_path, override=True)
+        """加载配置"""
+        logging.debug(f"尝试加载配置文件: {self.env_path}")
+        # 先记录文件状态再读取，读取期间发生的修改会在下次检查时被发现
+        self._env_signature = self._get_env_signature()
+        self._loaded = True
+        self._load_ok = False
+        self._apply_env_file()
         
         config = {
             'secret_id': os.getenv('TENCENT_SECRET_ID'),
             'secret_key': os.getenv('TENCENT_SECRET_KEY'),
+            # DNSPod API 接入点，一般无需修改
+            'dnspod_endpoint': os.getenv('DNSPOD_ENDPOINT', 'dnspod.tencentcloudapi.com'),
+            # DNSPod 客户端实现: sdk(腾讯云 SDK) / lite(内置 TC3 签名客户端，不导入 SDK)
+            'dnspod_client': os.getenv('DNSPOD_CLIENT', 'sdk').lower(),
+            # DNSPod API 本地限流（每秒请求数和突发数）及限频/临时故障时的最大重试次数
+            'dnspod_rate_limit': float(os.getenv('DNSPOD_RATE_LIMIT', 5)),
+            'dnspod_rate_burst': int(os.getenv('DNSPOD_RATE_BURST', 10)),
+            'dnspod_max_retries': int(os.getenv('DNSPOD_MAX_RETRIES', 3)),
+            # 同一域名下多条记录需要改为同一个值时，使用 ModifyRecordBatch 批量修改
+            'dnspod_batch_update': os.getenv('DNSPOD_BATCH_UPDATE', 'true').lower() == 'true',
+            # 自动查找记录ID时，记录不存在则使用 CreateRecord 创建
+            'auto_create_records': os.getenv('AUTO_CREATE_RECORDS', 'false').lower() == 'true',
             'domain': os.getenv('DOMAIN'),
             'record_type': os.getenv('RECORD_TYPE'),
             'record_line': os.getenv('RECORD_LINE'),
             'subdomain': os.getenv('SUBDOMAIN'),
+            # 记录ID可留空或设为 auto，启动后自动查找
             'record_id': os.getenv('RECORD_ID'),
+            # 单记录模式下同时维护同名 AAAA 记录的记录ID（可选，设为 auto 时自动查找）
+            'ipv6_record_id': os.getenv('IPV6_RECORD_ID'),
             'update_interval': int(os.getenv('UPDATE_INTERVAL', 3600)),
+            # 自适应轮询：IP变化后短时间内加快轮询，故障时指数退避，并加入随机抖动
+            'fast_check_interval': int(os.getenv('FAST_CHECK_INTERVAL', 15)),
+            'fast_check_window': int(os.getenv('FAST_CHECK_WINDOW', 300)),
+            'max_backoff_interval': int(os.getenv('MAX_BACKOFF_INTERVAL', 900)),
+            'poll_jitter': float(os.getenv('POLL_JITTER', 0.1)),
+            # 抖动抑制：公网IP变化后需保持稳定的时间(秒)，0 为不抑制
+            'ip_stable_window': int(os.getenv('IP_STABLE_WINDOW', 0)),
+            # 网络变化监听（Linux rtnetlink），变化时立即触发更新
+            'netlink_watch': os.getenv('NETLINK_WATCH', 'false').lower() == 'true',
+            'netlink_interface': os.getenv('NETLINK_INTERFACE'),
+            # 修改后验证：首次验证及重试的间隔，以及最大验证次数
+            'verify_wait_time': int(os.getenv('VERIFY_WAIT_TIME', 10)),
+            'verify_max_attempts': int(os.getenv('VERIFY_MAX_ATTEMPTS', 3)),
+            # DNS生效探测：验证成功后直接查询权威服务器和公共解析器，统计新记录的生效耗时
+            'propagation_probe': os.getenv('PROPAGATION_PROBE', 'false').lower() == 'true',
+            'probe_resolvers': [r.strip() for r in os.getenv('PROBE_RESOLVERS', '119.29.29.29,223.5.5.5,8.8.8.8').split(',') if r.strip()],
+            'probe_max_wait': int(os.getenv('PROBE_MAX_WAIT', 300)),
+            # Prometheus 指标接口，端口为 0 时不启用
+            'metrics_port': int(os.getenv('METRICS_PORT', 0)),
+            'metrics_addr': os.getenv('METRICS_ADDR', '127.0.0.1'),
+            # 本地状态缓存文件，以及忽略缓存进行完整核对的间隔
+            'state_file': os.getenv('STATE_FILE', os.path.join(os.path.dirname(os.path.dirname(__file__)), '.ddns_state.json')),
+            'verification_interval': int(os.getenv('VERIFICATION_INTERVAL', 3600)),
+            # IP获取模式: sequential(依次尝试) / race(并发取最快) / quorum(并发等待多数一致)
+            'ip_fetch_mode': os.getenv('IP_FETCH_MODE', 'sequential').lower(),
+            'ip_quorum': int(os.getenv('IP_QUORUM', 2)),
+            # IP服务健康评分的持久化文件
+            'provider_health_file': os.getenv('PROVIDER_HEALTH_FILE', os.path.join(os.path.dirname(os.path.dirname(__file__)), '.ddns_providers.json')),
+            # 本地网卡IP来源，公网地址直接在网卡上时可免去HTTP查询
+            'ip_interface': os.getenv('IP_INTERFACE'),
+            # STUN服务器，通过UDP一个往返获取公网IP，不设置则不启用
+            'stun_servers': [s.strip() for s in os.getenv('STUN_SERVERS', '').split(',') if s.strip()],
+            # 路由器来源：按顺序向网关查询WAN口地址的协议（upnp / natpmp / pcp），不设置则不启用
+            'gateway_protocols': [p.strip().lower() for p in os.getenv('GATEWAY_PROTOCOLS', '').split(',') if p.strip()],
+            'gateway_addr': os.getenv('GATEWAY_ADDR') or None,
+            # 主备模式：共享卷上的租约文件，不设置则不启用
+            'ha_lease_file': os.getenv('HA_LEASE_FILE') or None,
+            'ha_lease_ttl': int(os.getenv('HA_LEASE_TTL', 30)),
+            'ha_node_id': os.getenv('HA_NODE_ID') or f"{socket.gethostname()}-{os.getpid()}",
+            # 多记录配置，设置后忽略上面的单记录配置
+            'records_spec': os.getenv('RECORDS'),
             # SMTP配置
             'smtp_host': os.getenv('SMTP_HOST'),
             'smtp_port': int(os.getenv('SMTP_PORT', 587)),
@@ -69,11 +283,40 @@ class ConfigManager:
             'smtp_sender_name': os.getenv('SMTP_SENDER_NAME', os.getenv('SMTP_SENDER_EMAIL')),
             'smtp_receiver_email': os.getenv('SMTP_RECEIVER_EMAIL'),
             'smtp_use_tls': os.getenv('SMTP_USE_TLS', 'true').lower() == 'true',
-            'error_email_interval': int(os.getenv('ERROR_EMAIL_INTERVAL', 3600))
+            'error_email_interval': int(os.getenv('ERROR_EMAIL_INTERVAL', 3600)),
+            # 后台通知队列：邮件发送不阻塞DNS更新，突发通知合并为汇总邮件
+            'notification_async': os.getenv('NOTIFICATION_ASYNC', 'true').lower() == 'true',
+            'notification_queue_size': int(os.getenv('NOTIFICATION_QUEUE_SIZE', 100)),
+            'notification_digest_window': int(os.getenv('NOTIFICATION_DIGEST_WINDOW', 10)),
+            'notification_max_retries': int(os.getenv('NOTIFICATION_MAX_RETRIES', 3)),
+            # 运行时: sync(单线程顺序执行) / async(asyncio 并发执行各域名的同步和验证)，修改后需重启生效
+            'ddns_engine': os.getenv('DDNS_ENGINE', 'sync').lower(),
+            'async_task_timeout': float(os.getenv('ASYNC_TASK_TIMEOUT', 60)),
+            'async_max_workers': int(os.getenv('ASYNC_MAX_WORKERS', 8)),
+            # 运行模式: standalone(本机获取IP并更新) / server(汇聚服务，接收各节点上报后统一更新) / agent(只向汇聚服务上报IP)
+            'ddns_mode': os.getenv('DDNS_MODE', 'standalone').lower(),
+            'aggregator_addr': os.getenv('AGGREGATOR_ADDR', '0.0.0.0'),
+            'aggregator_port': int(os.getenv('AGGREGATOR_PORT', 8080)),
+            'aggregator_url': os.getenv('AGGREGATOR_URL'),
+            'aggregator_secret': os.getenv('AGGREGATOR_SECRET'),
+            'aggregator_agents_spec': os.getenv('AGGREGATOR_AGENTS', ''),
+            'aggregator_agent': os.getenv('AGGREGATOR_AGENT') or socket.gethostname(),
+            'aggregator_flush_interval': float(os.getenv('AGGREGATOR_FLUSH_INTERVAL', 5)),
         }
         
         # 检查必要参数并详细列出缺失的环境变量
-        required_keys = ['secret_id', 'secret_key', 'domain', 'record_type', 'record_line', 'subdomain', 'record_id']
+        if config['ddns_mode'] not in ('standalone', 'server', 'agent'):
+            logging.error(f"DDNS_MODE 配置无效: {config['ddns_mode']}（可选 standalone、server、agent）")
+            return None
+        if config['ddns_mode'] == 'agent':
+            # 上报节点不调用 DNSPod API，不需要腾讯云凭证
+            required_keys = ['aggregator_url', 'aggregator_secret']
+        else:
+            required_keys = ['secret_id', 'secret_key']
+        if config['ddns_mode'] == 'server' and not config['aggregator_agents_spec']:
+            required_keys.append('aggregator_secret')
+        if not config['records_spec']:
+            required_keys.extend(['domain', 'record_type', 'record_line', 'subdomain'])
         # SMTP相关的检查，如果配置了接收邮箱，则其他SMTP参数也应配置
         if config.get('smtp_receiver_email'):
             required_keys.extend(['smtp_host', 'smtp_port', 'smtp_user', 'smtp_password', 'smtp_sender_email'])
@@ -83,10 +326,70 @@ class ConfigManager:
         if missing_keys:
             logging.error(f"缺少以下必要的环境变量: {', '.join(missing_keys)}")
             return None
+
+        if config['ip_fetch_mode'] not in ('sequential', 'race', 'quorum'):
+            logging.error(f"IP_FETCH_MODE 配置无效: {config['ip_fetch_mode']}（可选 sequential、race、quorum）")
+            return None
+
+        unknown_protocols = [p for p in config['gateway_protocols'] if p not in ('upnp', 'natpmp', 'pcp')]
+        if unknown_protocols:
+            logging.error(f"GATEWAY_PROTOCOLS 配置无效: {', '.join(unknown_protocols)}（可选 upnp、natpmp、pcp）")
+            return None
+
+        if config['ha_lease_file']:
+            if config['ha_lease_ttl'] < 3:
+                logging.error(f"HA_LEASE_TTL 配置无效: {config['ha_lease_ttl']}（至少 3 秒）")
+                return None
+            if importlib.util.find_spec('fcntl') is None:
+                logging.error("HA_LEASE_FILE 需要 fcntl 文件锁，当前平台不支持")
+                return None
+
+        if config['ddns_engine'] not in ('sync', 'async'):
+            logging.error(f"DDNS_ENGINE 配置无效: {config['ddns_engine']}（可选 sync、async）")
+            return None
+
+        if config['dnspod_client'] not in ('sdk', 'lite'):
+            logging.error(f"DNSPOD_CLIENT 配置无效: {config['dnspod_client']}（可选 sdk、lite）")
+            return None
+
+        config['aggregator_agents'] = self.parse_aggregator_agents(config['aggregator_agents_spec'])
+        if config['aggregator_agents'] is None:
+            return None
+
+        if config['records_spec']:
+            records = self.parse_records(config['records_spec'])
+            if not records:
+                logging.error("RECORDS 配置为空或格式错误")
+                return None
+        else:
+            records = [self.make_record(config['domain'], config['subdomain'], config['record_type'],
+                                        config['record_line'], config['record_id'])]
+            if config['ipv6_record_id']:
+                records.append(self.make_record(config['domain'], config['subdomain'], 'AAAA',
+                                                config['record_line'], config['ipv6_record_id']))
+        config['records'] = records
         
         self.config = config
+        self._load_ok = True
         return config
     
     def get_config(self):
         """获取当前配置"""
         return self.config
+
+    def get_records(self):
+        """获取需要维护的全部记录"""
+        if self.config is None:
+            return []
+        return self.config.get('records', [])
+
+    def get_required_families(self):
+        """返回当前记录需要的地址族集合"""
+        return {self.get_record_family(r) for r in self.get_records()}
+
+    def get_records_by_zone(self):
+        """按域名（zone）分组返回记录，保持配置中的顺序"""
+        zones = {}
+        for record in self.get_records():
+            zones.setdefault(record['domain'], []).append(record)
+        return zones
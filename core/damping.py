@@ -0,0 +1,80 @@
+import logging
+
+from core import metrics
+
+
+class FlapDamper:
+    """
+    公网IP抖动抑制：新地址需要连续保持 window 秒才会被采用
+
+    线路在两个地址之间来回切换时，窗口内的 A→B→A 变化不会产生任何修改，
+    持续稳定的新地址在窗口结束后的第一个周期被采用。启动后首次获取的地址直接采用。
+    """
+
+    def __init__(self, window=0):
+        """
+        初始化抖动抑制
+
+        Args:
+            window: 新地址需要保持稳定的时间(秒)，为 0 时不抑制
+        """
+        self.window = window
+        self.stable = {}      # 地址族 -> 已采用的地址
+        self.candidates = {}  # 地址族 -> (新地址, 首次出现的时间)
+        self.suppressed = 0
+
+    def _suppress(self, family, ip):
+        self.suppressed += 1
+        metrics.IP_CHANGES_SUPPRESSED.inc(family=family)
+        logging.info(f"公网IPv{family} {ip} 未能保持 {self.window} 秒稳定，已忽略该变化")
+
+    def filter(self, public_ips, now):
+        """
+        过滤本周期获取到的公网IP
+
+        Args:
+            public_ips: 地址族 -> 本周期获取到的地址，获取失败的地址族为 None
+            now: 当前时间戳
+
+        Returns:
+            dict: 地址族 -> 应该写入记录的地址，新地址尚未稳定时仍为上一个已采用的地址
+        """
+        result = {}
+        for family, ip in public_ips.items():
+            if not ip:
+                # 获取失败不影响候选地址的计时
+                result[family] = ip
+                continue
+            stable = self.stable.get(family)
+            if not self.window or stable is None or ip == stable:
+                candidate = self.candidates.pop(family, None)
+                if candidate and candidate[0] != ip:
+                    # 窗口内回到了原地址，丢弃尚未采用的候选地址
+                    self._suppress(family, candidate[0])
+                self.stable[family] = ip
+                result[family] = ip
+                continue
+
+            candidate = self.candidates.get(family)
+            if candidate is None or candidate[0] != ip:
+                if candidate is not None:
+                    self._suppress(family, candidate[0])
+                candidate = self.candidates[family] = (ip, now)
+                logging.info(f"公网IPv{family} 变为 {ip}，需保持 {self.window} 秒后再更新记录")
+
+            if now - candidate[1] >= self.window:
+                del self.candidates[family]
+                self.stable[family] = ip
+                logging.info(f"公网IPv{family} {ip} 已保持稳定，开始更新记录")
+                result[family] = ip
+            else:
+                result[family] = stable
+        return result
+
+    def pending_delay(self, now):
+        """
+        距最早的候选地址可以被采用还需等待的时间(秒)，没有候选地址时返回 None
+        """
+        if not self.candidates:
+            return None
+        return max(0.0, min(since + self.window for _, since in self.candidates.values()) - now)
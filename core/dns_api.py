@@ -1,84 +1,487 @@
 import json
 import time
+import random
 import logging
-from tencentcloud.common import credential
-from tencentcloud.common.profile.client_profile import ClientProfile
-from tencentcloud.common.profile.http_profile import HttpProfile
-from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
-from tencentcloud.dnspod.v20210323 import dnspod_client, models
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from core import metrics
+from core.rate_limit import TokenBucket
+from core.tc3_client import DnspodAPIError, LiteDnspodClient
+
+# DNSPod API 接入点
+DNSPOD_ENDPOINT = "dnspod.tencentcloudapi.com"
+
+# 客户端实现：sdk 使用腾讯云 SDK，lite 使用内置的 TC3 签名客户端（不导入 SDK，启动更快、内存更少）
+CLIENT_KINDS = ('sdk', 'lite')
+
+# 可以重试的错误码前缀：限频和服务端、网络的临时故障，其余错误（参数、权限等）重试也不会成功
+RETRYABLE_ERROR_PREFIXES = (
+    "RequestLimitExceeded",
+    "FailedOperation.FrequencyLimit",
+    "InternalError",
+    "ClientNetworkError",
+    "ServerNetworkError",
+)
+
+
+# 请求在服务端处理之前即被拒绝的错误码前缀：限频。非幂等的接口（CreateRecord）只对这些错误直接重试
+REJECTED_ERROR_PREFIXES = (
+    "RequestLimitExceeded",
+    "FailedOperation.FrequencyLimit",
+)
+
+
+# 接口不可用的错误码前缀：接口不存在、账号未开通或子账号无权限，遇到后本进程内不再调用该接口
+UNAVAILABLE_ERROR_PREFIXES = (
+    "InvalidAction",
+    "UnsupportedOperation",
+    "UnauthorizedOperation",
+    "AuthFailure.UnauthorizedOperation",
+    "OperationDenied",
+)
+
+
+def _match_error(code, prefixes):
+    return bool(code) and any(code == prefix or code.startswith(prefix + ".") for prefix in prefixes)
+
+
+def is_retryable_error(code):
+    """错误码是否属于限频或临时故障"""
+    return _match_error(code, RETRYABLE_ERROR_PREFIXES)
+
+
+def is_rejected_error(code):
+    """错误码是否表示请求未被处理，重试不会产生重复操作"""
+    return _match_error(code, REJECTED_ERROR_PREFIXES)
+
+
+def is_unavailable_error(code):
+    """错误码是否表示接口对当前账号不可用"""
+    return _match_error(code, UNAVAILABLE_ERROR_PREFIXES)
+
+
+class _SdkClient:
+    """腾讯云 SDK 客户端的适配层，提供与 LiteDnspodClient 相同的 call 接口"""
+
+    def __init__(self, secret_id, secret_key, scheme, host):
+        # SDK 只在选用时导入，使用轻量客户端时不产生导入开销
+        from tencentcloud.common import credential
+        from tencentcloud.common.profile.client_profile import ClientProfile
+        from tencentcloud.common.profile.http_profile import HttpProfile
+        from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
+        from tencentcloud.dnspod.v20210323 import dnspod_client, models
+
+        cred = credential.Credential(secret_id, secret_key)
+        httpProfile = HttpProfile()
+        if scheme:
+            httpProfile.scheme = httpProfile.protocol = scheme
+        httpProfile.endpoint = host
+        httpProfile.keepAlive = True
+        clientProfile = ClientProfile()
+        clientProfile.httpProfile = httpProfile
+        self.client = dnspod_client.DnspodClient(cred, "", clientProfile)
+        self.conn = self.client.request.conn
+        self._models = models
+        self._exception = TencentCloudSDKException
+
+    def call(self, action, params):
+        req = getattr(self._models, f"{action}Request")()
+        req.from_json_string(json.dumps(params))
+        try:
+            return getattr(self.client, action)(req)
+        except self._exception as err:
+            raise DnspodAPIError(err.get_code(), err.get_message(), err.get_request_id()) from err
+
+
+def sdk_available():
+    """腾讯云 SDK 是否已安装"""
+    try:
+        import tencentcloud.dnspod.v20210323  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class _DnspodClientCache:
+    """DNSPod 客户端缓存，按接入点复用客户端和底层 HTTPS 连接池，凭证或客户端实现变化时才重建"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # endpoint -> {'credential_key', 'kind', 'client', 'session'}
+        # 已关闭连接池的累计统计，保证重建客户端后计数不丢失
+        self._closed_connections = 0
+        self._closed_requests = 0
+
+    def _create_session(self, request_host, proxies=None, verify=None, timeout=60):
+        """
+        创建带连接池的 Session 及经过限流和指标统计的发送函数
+
+        Returns:
+            tuple: (Session, 发送函数 (method, url, body, headers) -> Response)
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        def pooled_request(method, url, body=None, headers=None):
+            headers.setdefault("Host", request_host)
+            # 所有 API 调用（包括重试）都经过这里，统一限流，并按 Action 统计次数和耗时
+            action = headers.get("X-TC-Action", "unknown")
+            waited = _rate_limiter.acquire()
+            if waited:
+                metrics.DNSPOD_THROTTLE_SECONDS.observe(waited)
+            start = time.monotonic()
+            status = 'error'
+            try:
+                response = session.request(method=method,
+                                           url=url,
+                                           data=body,
+                                           headers=headers,
+                                           proxies=proxies,
+                                           verify=verify,
+                                           timeout=timeout)
+                status = str(response.status_code)
+                return response
+            finally:
+                metrics.DNSPOD_REQUEST_SECONDS.observe(time.monotonic() - start, action=action)
+                metrics.DNSPOD_REQUESTS.inc(action=action, status=status)
+
+        return session, pooled_request
+
+    def get_client(self, secret_id, secret_key, endpoint=DNSPOD_ENDPOINT, kind='sdk'):
+        """获取指定接入点的客户端，凭证或客户端实现与缓存不一致时重建"""
+        credential_key = (secret_id, secret_key)
+        with self._lock:
+            entry = self._entries.get(endpoint)
+            if entry and entry['credential_key'] == credential_key and entry['kind'] == kind:
+                return entry['client']
+
+            if entry:
+                logging.info("腾讯云凭证或客户端实现已变化，重建DNSPod客户端")
+                self._close_entry(entry)
+
+            # 接入点可带 http:// 或 https:// 前缀，用于代理或本地测试环境
+            scheme, _, host = endpoint.rpartition('://')
+            if kind == 'sdk':
+                client = _SdkClient(secret_id, secret_key, scheme, host)
+                conn = client.conn
+                session, conn.request = self._create_session(conn.request_host, conn.proxy,
+                                                             conn.certification, conn.timeout)
+            else:
+                session, request = self._create_session(host)
+                client = LiteDnspodClient(secret_id, secret_key, endpoint, request=request)
+
+            self._entries[endpoint] = {
+                'credential_key': credential_key,
+                'kind': kind,
+                'client': client,
+                'session': session,
+            }
+            return client
+
+    def _pool_counts(self, session):
+        """统计 Session 中所有连接池的新建连接数和请求数"""
+        connections = requests_count = 0
+        # http/https 共用同一个适配器，需去重后再统计
+        for adapter in {id(a): a for a in session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    connections += pool.num_connections
+                    requests_count += pool.num_requests
+        return connections, requests_count
+
+    def _close_entry(self, entry):
+        connections, requests_count = self._pool_counts(entry['session'])
+        self._closed_connections += connections
+        self._closed_requests += requests_count
+        entry['session'].close()
+
+    def get_stats(self):
+        """
+        获取连接统计
+
+        Returns:
+            dict: handshakes 为新建连接（TLS握手）次数，reused 为复用已有连接的请求次数
+        """
+        with self._lock:
+            connections = self._closed_connections
+            requests_count = self._closed_requests
+            for entry in self._entries.values():
+                c, r = self._pool_counts(entry['session'])
+                connections += c
+                requests_count += r
+        return {
+            'requests': requests_count,
+            'handshakes': connections,
+            'reused': max(requests_count - connections, 0),
+        }
+
+
+# 进程内共享的客户端缓存
+_client_cache = _DnspodClientCache()
+
+# 进程内共享的限流器，所有 DNSPod API 请求共用同一个令牌桶
+_rate_limiter = TokenBucket()
+
+
+def configure_rate_limit(rate, burst):
+    """
+    设置 DNSPod API 请求速率
+
+    Args:
+        rate: 每秒平均请求数，小于等于 0 时不限流
+        burst: 允许的突发请求数
+    """
+    _rate_limiter.configure(rate, max(int(burst), 1))
+
+
+def get_connection_stats():
+    """获取DNSPod API连接复用统计"""
+    return _client_cache.get_stats()
+
 
 class DNSUpdater:
     """DNS 更新管理类，负责处理腾讯云 DNS 相关操作"""
 
-    def __init__(self, config_manager):
+    # DescribeRecordList 单页最大记录数
+    PAGE_LIMIT = 3000
+
+    # 支持 ModifyDynamicDNS 的记录类型
+    DYNAMIC_DNS_TYPES = ('A', 'AAAA')
+
+    def __init__(self, config_manager, max_retries=3, retry_delay=1, max_retry_delay=30,
+                 batch_update=True, batch_min_records=2):
         """
         初始化 DNS 更新器
         
         Args:
             config_manager: 配置管理器实例
+            max_retries: 限频或临时故障时的最大重试次数
+            retry_delay: 首次重试的等待时间(秒)，之后按指数增长
+            max_retry_delay: 单次重试等待时间的上限(秒)
+            batch_update: 是否使用 ModifyRecordBatch 批量修改同一域名下的多条记录
+            batch_min_records: 目标值相同的记录达到多少条时使用批量修改
         """
         self.config_manager = config_manager
-    
-    def get_current_dns_record(self):
-        """从腾讯云API获取当前DNS记录值"""
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.batch_update = batch_update
+        self.batch_min_records = batch_min_records
+        self.dynamic_dns = True     # ModifyDynamicDNS 不可用时置为 False，改用 ModifyRecord
+        self._sdk_missing_logged = False
+
+    def get_client(self):
+        """获取当前凭证和客户端实现对应的共享客户端"""
+        config = self.config_manager.get_config()
+        kind = config.get('dnspod_client') or 'sdk'
+        if kind == 'sdk' and not sdk_available():
+            if not self._sdk_missing_logged:
+                logging.warning("未安装腾讯云 SDK，改用内置的轻量客户端")
+                self._sdk_missing_logged = True
+            kind = 'lite'
+        return _client_cache.get_client(config['secret_id'], config['secret_key'],
+                                        config.get('dnspod_endpoint') or DNSPOD_ENDPOINT, kind)
+
+    def get_connection_stats(self):
+        """获取DNSPod API连接复用统计"""
+        return get_connection_stats()
+
+    def _call(self, action, params, retryable=is_retryable_error):
+        """
+        调用 DNSPod API，限频和临时故障按指数退避重试，其他错误直接抛出
+        
+        Args:
+            action: API 名称，例如 DescribeRecordList
+            params: 请求参数字典
+            retryable: 判断错误码是否可以重试的函数
+        """
+        client = self.get_client()
+        for attempt in range(self.max_retries + 1):
+            try:
+                return client.call(action, params)
+            except DnspodAPIError as err:
+                code = err.get_code()
+                if not retryable(code) or attempt >= self.max_retries:
+                    raise
+                self._backoff(action, code, attempt)
+
+    def _backoff(self, action, code, attempt):
+        """重试前等待，带随机抖动的指数退避，避免多个实例同时重试"""
+        delay = min(self.retry_delay * (2 ** attempt), self.max_retry_delay)
+        delay = random.uniform(delay / 2, delay)
+        metrics.DNSPOD_RETRIES.inc(action=action, code=code)
+        logging.warning(f"DNSPod API {action} 返回 {code}，{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+        time.sleep(delay)
+
+    def _default_record(self):
+        """返回配置中的第一条记录（单记录模式下即为唯一记录）"""
+        records = self.config_manager.get_records()
+        return records[0] if records else None
+
+    @staticmethod
+    def _record_to_dict(record):
+        """将 API 返回的记录对象转换为字典"""
+        return {
+            'value': record.Value,
+            'record_id': record.RecordId,
+            'name': record.Name,
+            'type': record.Type,
+            'line': record.Line,
+            'ttl': record.TTL,
+            'status': 'ENABLE' if record.Status == 'ENABLE' else 'DISABLE'
+        }
+
+    def get_zone_records(self, domain, record_type=None, subdomain=None):
+        """
+        分页获取一个域名（zone）下的全部解析记录
+        
+        Args:
+            domain: 主域名
+            record_type: 可选，仅获取指定类型的记录
+            subdomain: 可选，仅获取指定子域名的记录
+            
+        Returns:
+            dict: 以字符串形式的 RecordId 为键的记录字典，失败时返回 None
+        """
         config = self.config_manager.get_config()
         if not config:
             return None
-            
+
         try:
-            # 实例化认证对象
-            cred = credential.Credential(config['secret_id'], config['secret_key'])
-            
-            # 配置HTTP选项
-            httpProfile = HttpProfile()
-            httpProfile.endpoint = "dnspod.tencentcloudapi.com"
+            records = {}
+            offset = 0
+            while True:
+                params = {
+                    "Domain": domain,
+                    "Offset": offset,
+                    "Limit": self.PAGE_LIMIT
+                }
+                if record_type:
+                    params["RecordType"] = record_type
+                if subdomain:
+                    params["Subdomain"] = subdomain
 
-            # 配置客户端
-            clientProfile = ClientProfile()
-            clientProfile.httpProfile = httpProfile
-            client = dnspod_client.DnspodClient(cred, "", clientProfile)
+                try:
+                    resp = self._call('DescribeRecordList', params)
+                except DnspodAPIError as err:
+                    # 域名下没有任何记录时 API 返回该错误码
+                    if err.get_code() == "ResourceNotFound.NoDataOfRecord":
+                        break
+                    raise
 
-            # 准备请求参数
-            req = models.DescribeRecordListRequest()
-            params = {
-                "Domain": config['domain'],
-                "Subdomain": config['subdomain'],
-                "RecordType": config['record_type']
-            }
-            req.from_json_string(json.dumps(params))
-            
-            # 发送请求
-            resp = client.DescribeRecordList(req)
-            
-            # 解析响应
-            if hasattr(resp, 'RecordList') and resp.RecordList:
-                for record in resp.RecordList:
-                    if str(record.RecordId) == str(config['record_id']):
-                        return {
-                            'value': record.Value,
-                            'record_id': record.RecordId,
-                            'type': record.Type,
-                            'line': record.Line,
-                            'ttl': record.TTL,
-                            'status': 'ENABLE' if record.Status == 'ENABLE' else 'DISABLE'
-                        }
-            domain_name = self.config_manager.get_full_domain()
-            logging.warning(f"未找到匹配的DNS记录: {domain_name} (ID: {config['record_id']})")
-            return None
-            
-        except TencentCloudSDKException as err:
-            logging.error(f"腾讯云SDK异常：{err}")
+                page = resp.RecordList or []
+                for record in page:
+                    records[str(record.RecordId)] = self._record_to_dict(record)
+
+                total = resp.RecordCountInfo.TotalCount if resp.RecordCountInfo else len(records)
+                offset += len(page)
+                if not page or offset >= total:
+                    break
+
+            logging.debug(f"获取域名 {domain} 的解析记录 {len(records)} 条")
+            return records
+
+        except DnspodAPIError as err:
+            logging.error(f"腾讯云API异常：{err}")
             return None
         except Exception as e:
-            logging.error(f"获取DNS记录时发生错误：{e}")
+            logging.error(f"获取域名 {domain} 的解析记录时发生错误：{e}")
             return None
+    
+    def get_current_dns_record(self, record=None):
+        """
+        从腾讯云API获取当前DNS记录值
+        
+        Args:
+            record: 记录配置，默认使用配置中的第一条记录
+        """
+        record = record or self._default_record()
+        if not record:
+            return None
+
+        # 按子域名和类型过滤后以 RecordId 直接取出，不再逐条比较
+        zone_records = self.get_zone_records(record['domain'], record_type=record['record_type'],
+                                             subdomain=record['subdomain'])
+        if zone_records is None:
+            return None
+        current = zone_records.get(str(record['record_id']))
+        if current is None:
+            domain_name = self.config_manager.get_record_name(record)
+            logging.warning(f"未找到匹配的DNS记录: {domain_name} (ID: {record['record_id']})")
+        return current
 
-    def update_dns_record(self, ip):
+    def find_record_id(self, record, zone_records):
+        """
+        在已获取的记录列表中按子域名、记录类型和线路查找记录ID
+        
+        Args:
+            record: 记录配置
+            zone_records: get_zone_records 的返回值
+            
+        Returns:
+            str: 记录ID，未找到时返回 None
+        """
+        matches = [record_id for record_id, item in zone_records.items()
+                   if item['name'] == record['subdomain'] and item['type'] == record['record_type']
+                   and item['line'] == record['record_line']]
+        if len(matches) > 1:
+            domain_name = self.config_manager.get_record_name(record)
+            logging.warning(f"{domain_name} 存在 {len(matches)} 条 {record['record_type']} 记录 "
+                            f"(线路: {record['record_line']})，使用记录ID {matches[0]}，如需其他记录请在配置中指定记录ID")
+        return matches[0] if matches else None
+
+    def create_record(self, record, value):
+        """
+        使用 CreateRecord 创建记录
+        
+        Args:
+            record: 记录配置
+            value: 记录值
+            
+        Returns:
+            str: 新记录的ID，失败时返回 None
+        """
+        params = {
+            "Domain": record['domain'],
+            "SubDomain": record['subdomain'],
+            "RecordType": record['record_type'],
+            "RecordLine": record['record_line'],
+            "Value": value
+        }
+        for attempt in range(self.max_retries + 1):
+            try:
+                # CreateRecord 不是幂等的，_call 只对请求未被处理的限频错误重试
+                resp = self._call('CreateRecord', params, retryable=is_rejected_error)
+                return str(resp.RecordId)
+            except DnspodAPIError as err:
+                code = err.get_code()
+                if not is_retryable_error(code) or attempt >= self.max_retries:
+                    logging.error(f"创建DNS记录失败：{err}")
+                    return None
+
+            # 服务端故障或网络错误时记录可能已经创建，重新查询记录列表确认后再重试
+            zone_records = self.get_zone_records(record['domain'], record['record_type'], record['subdomain'])
+            if zone_records is None:
+                logging.error(f"创建DNS记录返回 {code}，且无法查询记录列表确认是否已创建")
+                return None
+            record_id = self.find_record_id(record, zone_records)
+            if record_id:
+                logging.warning(f"创建DNS记录返回 {code}，但记录已经创建 (记录ID: {record_id})")
+                return record_id
+            self._backoff('CreateRecord', code, attempt)
+
+    def update_dns_record(self, ip, record=None):
         """
         更新DNS解析记录
         
         Args:
             ip: 新的 IP 地址
+            record: 记录配置，默认使用配置中的第一条记录
             
         Returns:
             bool: 是否更新成功
@@ -86,87 +489,122 @@ class DNSUpdater:
         config = self.config_manager.get_config()
         if not config:
             return False
+        record = record or self._default_record()
+        if not record:
+            return False
             
         try:
-            # 实例化认证对象
-            cred = credential.Credential(config['secret_id'], config['secret_key'])
-            
-            # 配置HTTP选项
-            httpProfile = HttpProfile()
-            httpProfile.endpoint = "dnspod.tencentcloudapi.com"
+            domain_name = self.config_manager.get_record_name(record)
+            logging.info(f"准备更新DNS记录：{domain_name} -> {ip}")
 
-            # 配置客户端
-            clientProfile = ClientProfile()
-            clientProfile.httpProfile = httpProfile
-            client = dnspod_client.DnspodClient(cred, "", clientProfile)
+            # A/AAAA 记录优先使用参数更少的 ModifyDynamicDNS，不可用时回退到 ModifyRecord
+            if self.dynamic_dns and record['record_type'] in self.DYNAMIC_DNS_TYPES:
+                params = {
+                    "Domain": record['domain'],
+                    "SubDomain": record['subdomain'],
+                    "RecordId": int(record['record_id']),
+                    "RecordLine": record['record_line'],
+                    "Value": ip
+                }
+                try:
+                    self._call('ModifyDynamicDNS', params)
+                    return True
+                except DnspodAPIError as err:
+                    if not is_unavailable_error(err.get_code()):
+                        raise
+                    self.dynamic_dns = False
+                    logging.warning(f"ModifyDynamicDNS 接口不可用 ({err.get_code()})，改用 ModifyRecord")
 
             # 修改记录
-            req = models.ModifyRecordRequest()
             params = {
-                "Domain": config['domain'],
-                "RecordType": config['record_type'],
-                "RecordLine": config['record_line'],
+                "Domain": record['domain'],
+                "RecordType": record['record_type'],
+                "RecordLine": record['record_line'],
                 "Value": ip,
-                "RecordId": int(config['record_id']),
-                "SubDomain": config['subdomain']
+                "RecordId": int(record['record_id']),
+                "SubDomain": record['subdomain']
             }
-            req.from_json_string(json.dumps(params))
-            domain_name = self.config_manager.get_full_domain()
-            logging.info(f"准备更新DNS记录：{domain_name} -> {ip}")
 
             # 发送请求
-            resp = client.ModifyRecord(req)
+            self._call('ModifyRecord', params)
             # 日志在DDNS主类中统一处理，这里不再重复输出
             return True
 
-        except TencentCloudSDKException as err:
-            logging.error(f"腾讯云SDK异常：{err}")
+        except DnspodAPIError as err:
+            logging.error(f"腾讯云API异常：{err}")
             return False
         except Exception as e:
             logging.error(f"更新DNS记录时发生错误：{e}")
             return False
 
-    def verify_dns_update(self, expected_ip, max_attempts=3, wait_time=10):
+    def _modify_record_batch(self, domain, records, value):
+        """
+        使用 ModifyRecordBatch 将多条记录修改为同一个值
+        
+        Returns:
+            bool: 是否提交成功，失败时由调用方逐条修改
+        """
+        params = {
+            "RecordIdList": [int(r['record_id']) for r in records],
+            "Change": "value",
+            "ChangeTo": value
+        }
+        try:
+            resp = self._call('ModifyRecordBatch', params)
+        except DnspodAPIError as err:
+            if is_unavailable_error(err.get_code()):
+                self.batch_update = False
+                logging.warning(f"ModifyRecordBatch 接口不可用 ({err.get_code()})，改为逐条修改")
+            else:
+                logging.warning(f"批量修改 {domain} 下 {len(records)} 条记录失败，改为逐条修改: {err}")
+            return False
+        # 批量修改为异步任务，是否生效由后续的验证确认
+        logging.info(f"已提交批量修改: {domain} 下 {len(records)} 条记录 -> {value} (任务ID: {resp.JobId})")
+        return True
+
+    def update_zone_records(self, domain, changes):
         """
-        验证DNS更新是否已经生效，直接通过API查询记录值
+        修改同一域名下的多条记录，目标值相同的记录合并为一次批量修改
         
         Args:
-            expected_ip: 期望的 IP 地址
-            max_attempts: 最大尝试次数
-            wait_time: 每次尝试之间的等待时间(秒)
+            domain: 主域名
+            changes: (记录配置, 新值) 列表
             
         Returns:
-            bool: 是否验证成功
+            list: 与 changes 顺序一致的 (记录配置, 新值, 是否成功) 列表
         """
-        domain_name = self.config_manager.get_full_domain()
-        
-        for attempt in range(max_attempts):
-            try:
-                # 直接从API获取当前记录值
-                current_record = self.get_current_dns_record()
-                
-                if not current_record:
-                    logging.warning(f"无法获取当前DNS记录值 (尝试 {attempt+1}/{max_attempts})")
-                else:
-                    current_ip = current_record.get('value')
-                    logging.info(f"API记录验证 (尝试 {attempt+1}/{max_attempts}): {domain_name} -> {current_ip}")
-                    
-                    # 检查记录值是否与预期一致
-                    if current_ip == expected_ip:
-                        # 成功日志在主类中输出，这里不再重复
-                        return True
-                    else:
-                        logging.warning(f"DNS记录验证不匹配: 期望 {expected_ip}, 实际 {current_ip}")
-                
-                if attempt < max_attempts - 1:
-                    # 删除过多的日志，只在调试级别记录
-                    logging.debug(f"等待 {wait_time} 秒后重新验证...") 
-                    time.sleep(wait_time)
-                    
-            except Exception as e:
-                logging.error(f"DNS记录验证过程发生错误: {e}")
-                if attempt < max_attempts - 1:
-                    time.sleep(wait_time)
+        groups = {}
+        for record, value in changes:
+            groups.setdefault(value, []).append(record)
+
+        succeeded = {}
+        for value, records in groups.items():
+            if self.batch_update and len(records) >= self.batch_min_records:
+                if self._modify_record_batch(domain, records, value):
+                    succeeded.update((str(r['record_id']), True) for r in records)
+                    continue
+            for record in records:
+                succeeded[str(record['record_id'])] = self.update_dns_record(value, record=record)
+
+        return [(record, value, succeeded[str(record['record_id'])]) for record, value in changes]
+
+    def check_zone_update(self, domain, expected):
+        """
+        查询一次记录列表，检查同一域名下多条记录是否已更新为期望值（不等待、不重试）
         
-        logging.error(f"DNS记录验证失败: 最大尝试次数 {max_attempts} 已用尽")
-        return False
+        Args:
+            domain: 主域名
+            expected: 以 RecordId 为键、期望值为值的字典
+            
+        Returns:
+            set: 已是期望值的 RecordId 集合，查询失败时返回 None
+        """
+        zone_records = self.get_zone_records(domain)
+        if zone_records is None:
+            return None
+        verified = set()
+        for record_id, value in expected.items():
+            current = zone_records.get(str(record_id))
+            if current and current['value'] == value:
+                verified.add(str(record_id))
+        return verified
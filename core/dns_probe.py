@@ -0,0 +1,340 @@
+import time
+import random
+import socket
+import struct
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# DNS 记录类型
+QTYPE_A = 1
+QTYPE_NS = 2
+QTYPE_AAAA = 28
+QTYPES = {'A': QTYPE_A, 'NS': QTYPE_NS, 'AAAA': QTYPE_AAAA}
+
+DNS_HEADER = struct.Struct('!HHHHHH')   # id, flags, qdcount, ancount, nscount, arcount
+FLAG_RD = 0x0100                        # 期望递归
+
+
+def build_query(name, qtype, query_id=None, recursion=True):
+    """
+    构造一个最小的 DNS 查询报文
+
+    Args:
+        name: 查询的域名
+        qtype: 记录类型编号
+        query_id: 报文ID，为空时随机生成
+        recursion: 是否设置 RD 标志，向权威服务器查询时可关闭
+
+    Returns:
+        tuple: (报文ID, 报文字节)
+    """
+    if query_id is None:
+        query_id = random.randint(0, 0xFFFF)
+    header = DNS_HEADER.pack(query_id, FLAG_RD if recursion else 0, 1, 0, 0, 0)
+    qname = b''.join(bytes([len(label)]) + label.encode('idna')
+                     for label in name.rstrip('.').split('.') if label) + b'\x00'
+    return query_id, header + qname + struct.pack('!HH', qtype, 1)
+
+
+def _read_name(data, offset):
+    """读取（可能被压缩的）域名，返回 (域名, 名称之后的偏移)"""
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            # 压缩指针
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            jumps += 1
+            if jumps > 20:
+                raise ValueError("DNS 名称压缩指针循环")
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset + length].decode('ascii', errors='replace'))
+        offset += length
+    return '.'.join(labels), (end if end is not None else offset)
+
+
+def parse_response(data):
+    """
+    解析 DNS 响应报文
+
+    Returns:
+        dict: {'id', 'rcode', 'answers': [(类型编号, 值)]}，A/AAAA 的值为地址字符串，NS 的值为域名
+    """
+    query_id, flags, qdcount, ancount, _, _ = DNS_HEADER.unpack_from(data, 0)
+    offset = DNS_HEADER.size
+    for _ in range(qdcount):
+        _, offset = _read_name(data, offset)
+        offset += 4
+    answers = []
+    for _ in range(ancount):
+        _, offset = _read_name(data, offset)
+        rtype, _, _, rdlength = struct.unpack_from('!HHIH', data, offset)
+        offset += 10
+        rdata = data[offset:offset + rdlength]
+        if rtype == QTYPE_A and rdlength == 4:
+            answers.append((rtype, socket.inet_ntop(socket.AF_INET, rdata)))
+        elif rtype == QTYPE_AAAA and rdlength == 16:
+            answers.append((rtype, socket.inet_ntop(socket.AF_INET6, rdata)))
+        elif rtype == QTYPE_NS:
+            answers.append((rtype, _read_name(data, offset)[0]))
+        offset += rdlength
+    return {'id': query_id, 'rcode': flags & 0x000F, 'answers': answers}
+
+
+def query(server, name, qtype, timeout=2, recursion=True):
+    """
+    向指定服务器发送一次查询
+
+    Args:
+        server: (地址, 端口)
+        name: 查询的域名
+        qtype: 记录类型编号
+        timeout: 超时时间(秒)
+        recursion: 是否设置 RD 标志
+
+    Returns:
+        dict: parse_response 的结果，超时或出错时返回 None
+    """
+    host, port = server
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    query_id, packet = build_query(name, qtype, recursion=recursion)
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.sendto(packet, (host, port))
+            deadline = time.monotonic() + timeout
+            while True:
+                data, _ = sock.recvfrom(4096)
+                response = parse_response(data)
+                # 忽略ID不匹配的报文（迟到的旧响应或伪造的响应）
+                if response['id'] == query_id:
+                    return response
+                sock.settimeout(max(deadline - time.monotonic(), 0.01))
+        except (OSError, ValueError, IndexError, struct.error):
+            return None
+
+
+class LatencyHistogram:
+    """简单的累积直方图，记录每台服务器的生效耗时"""
+
+    BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # 最后一个桶为 +Inf
+        self.total = 0
+        self.sum = 0.0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """记录一次耗时，None 表示在最长等待时间内未生效"""
+        with self._lock:
+            if seconds is None:
+                self.timeouts += 1
+                return
+            self.total += 1
+            self.sum += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[i] += 1
+                    return
+            self.counts[-1] += 1
+
+    def render(self, width=30):
+        """以文本形式输出直方图"""
+        with self._lock:
+            peak = max(self.counts + [1])
+            lines = []
+            lower = 0
+            for i, count in enumerate(self.counts):
+                upper = f"{self.buckets[i]}s" if i < len(self.buckets) else "+Inf"
+                bar = '#' * round(count / peak * width)
+                lines.append(f"{f'{lower}-{upper}':>12} | {bar:<{width}} {count}")
+                lower = f"{self.buckets[i]}s" if i < len(self.buckets) else lower
+            lines.append(f"{'未生效':>12} | {self.timeouts}")
+            return "\n".join(lines)
+
+
+class PropagationProbe:
+    """DNS 生效探测：并发查询权威服务器和公共解析器，记录新记录值在每台服务器上生效所需的时间"""
+
+    def __init__(self, resolvers=None, include_authoritative=True, interval=2,
+                 max_wait=300, timeout=2, port=53, max_background=4):
+        """
+        初始化生效探测器
+
+        Args:
+            resolvers: 公共解析器地址列表，元素为地址字符串或 (地址, 端口)
+            include_authoritative: 是否同时查询域名的权威服务器（NS）
+            interval: 同一服务器两次查询之间的间隔(秒)
+            max_wait: 单台服务器的最长等待时间(秒)
+            timeout: 单次查询的超时时间(秒)
+            port: 未指定端口时使用的端口
+            max_background: 同时进行的后台探测数量上限
+        """
+        self.port = port
+        self.set_resolvers(resolvers or [])
+        self.include_authoritative = include_authoritative
+        self.interval = interval
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.max_background = max_background
+        self.histogram = LatencyHistogram()
+        self.last_results = {}
+        self._executor = None
+        # (域名, 记录类型) -> 正在进行的后台探测 {'expected', 'cancelled'}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _server(self, server):
+        return server if isinstance(server, tuple) else (server, self.port)
+
+    def set_resolvers(self, resolvers):
+        """更新公共解析器列表"""
+        self.resolvers = [self._server(r) for r in resolvers]
+
+    def find_authoritative_servers(self, zone):
+        """
+        通过解析器查询域名的 NS 记录，并解析出权威服务器地址
+
+        Returns:
+            list: [(地址, 端口)]
+        """
+        for resolver in self.resolvers:
+            response = query(resolver, zone, QTYPE_NS, timeout=self.timeout)
+            if not response or response['rcode'] != 0:
+                continue
+            servers = []
+            for _, ns_name in (a for a in response['answers'] if a[0] == QTYPE_NS):
+                try:
+                    address = socket.getaddrinfo(ns_name, self.port, socket.AF_INET, socket.SOCK_DGRAM)[0][4][0]
+                    servers.append((address, self.port))
+                except OSError:
+                    logging.debug(f"无法解析权威服务器地址: {ns_name}")
+            if servers:
+                return servers
+        logging.warning(f"未能获取 {zone} 的权威服务器")
+        return []
+
+    def _wait_for_value(self, server, name, qtype, expected, start, recursion, cancelled=None):
+        """反复查询一台服务器直到返回期望值，返回耗时(秒)，超时或被取消时返回 None"""
+        cancelled = cancelled or threading.Event()
+        while not cancelled.is_set():
+            response = query(server, name, qtype, timeout=self.timeout, recursion=recursion)
+            elapsed = time.monotonic() - start
+            if response and any(value == expected for rtype, value in response['answers'] if rtype == qtype):
+                return elapsed
+            if elapsed + self.interval > self.max_wait:
+                return None
+            cancelled.wait(self.interval)
+        return None
+
+    def probe(self, name, record_type, expected, zone=None, servers=None, cancelled=None):
+        """
+        探测记录值在各服务器上的生效时间
+
+        Args:
+            name: 完整域名
+            record_type: 'A' 或 'AAAA'
+            expected: 期望的记录值
+            zone: 主域名，用于查找权威服务器
+            servers: 额外指定的服务器列表
+            cancelled: threading.Event，设置后尽快结束探测
+
+        Returns:
+            dict: 服务器 "地址:端口" -> 生效耗时(秒)，未生效为 None；被取消时返回 None
+        """
+        qtype = QTYPES[record_type.upper()]
+        targets = [(self._server(s), True) for s in (servers or [])]
+        if self.include_authoritative and zone:
+            targets += [(s, False) for s in self.find_authoritative_servers(zone)]
+        targets += [(s, True) for s in self.resolvers]
+        # 同一服务器只探测一次（例如解析器同时是权威服务器）
+        unique = {}
+        for server, recursion in targets:
+            unique.setdefault(server, recursion)
+        targets = list(unique.items())
+        if not targets:
+            return {}
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix='dns-probe') as executor:
+            futures = {
+                f"{server[0]}:{server[1]}": executor.submit(
+                    self._wait_for_value, server, name, qtype, expected, start, recursion, cancelled)
+                for server, recursion in targets
+            }
+            results = {key: future.result() for key, future in futures.items()}
+
+        if cancelled is not None and cancelled.is_set():
+            # 被取消的探测结果不完整，不计入直方图
+            return None
+        for seconds in results.values():
+            self.histogram.observe(seconds)
+        self.last_results[name] = results
+        return results
+
+    def probe_in_background(self, name, record_type, expected, zone=None):
+        """
+        在共享的后台线程池中探测并输出结果，不阻塞调用方
+
+        同一记录的探测仍在进行时，期望值相同则跳过本次探测；期望值不同（IP 再次变化）时
+        取消旧的探测，改为探测新值。
+
+        Returns:
+            Future: 探测任务，跳过时返回 None
+        """
+        key = (name, record_type.upper())
+        with self._lock:
+            current = self._inflight.get(key)
+            if current is not None and current['expected'] == expected:
+                logging.debug(f"{name} -> {expected} 的生效探测仍在进行，跳过")
+                return None
+            if current is not None:
+                logging.info(f"{name} 的记录值已变为 {expected}，取消对 {current['expected']} 的生效探测")
+                current['cancelled'].set()
+            task = {'expected': expected, 'cancelled': threading.Event()}
+            self._inflight[key] = task
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_background,
+                                                    thread_name_prefix='dns-probe-bg')
+            executor = self._executor
+
+        def run():
+            try:
+                if task['cancelled'].is_set():
+                    return
+                results = self.probe(name, record_type, expected, zone=zone, cancelled=task['cancelled'])
+                if results is None:
+                    return
+                summary = ", ".join(f"{server}={seconds:.1f}s" if seconds is not None else f"{server}=未生效"
+                                    for server, seconds in results.items())
+                logging.info(f"DNS生效探测 {name} -> {expected}: {summary}")
+                logging.info(f"DNS生效耗时直方图:\n{self.histogram.render()}")
+            except Exception as e:
+                logging.error(f"DNS生效探测发生错误: {e}", exc_info=True)
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+
+        return executor.submit(run)
+
+    def close(self):
+        """取消所有后台探测并关闭线程池，进行中的查询最多再等待一次查询超时"""
+        with self._lock:
+            for task in self._inflight.values():
+                task['cancelled'].set()
+            self._inflight.clear()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,207 @@
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncEngine:
+    """
+    基于 asyncio 的 DDNS 运行时
+
+    IP 获取、各域名的记录查询与修改、验证和通知在同一个事件循环中作为并发任务执行，
+    每个任务有独立的超时，周期耗时取决于最慢的依赖而不是全部依赖耗时之和。
+    阻塞的组件（requests、SDK、smtplib）在有界线程池中运行，DDNS 类保持同步接口不变。
+    """
+
+    def __init__(self, ddns, task_timeout=60, max_workers=8):
+        """
+        初始化运行时
+
+        Args:
+            ddns: DDNS 实例，提供同步的各个步骤
+            task_timeout: 单个任务（IP获取、单个域名的同步、单个验证项）的超时时间(秒)
+            max_workers: 同时执行阻塞调用的线程数
+        """
+        self.ddns = ddns
+        self.task_timeout = task_timeout
+        self.max_workers = max_workers
+        self._executor = None
+        # 线程仍在执行的域名同步和验证（按域名），超时后线程结束前不再提交同一域名的任务
+        self._running_zones = set()
+        self._running_verifications = set()
+        self._running_lock = threading.Lock()
+
+    async def _run(self, func, *args, timeout=None, running=None, key=None):
+        """
+        在线程池中执行阻塞函数
+
+        超时后周期不再等待其结果，但已经在线程中开始的调用会继续执行到结束，其副作用
+        （修改记录、写入状态缓存和验证队列）仍然生效。指定 running 和 key 时，key 从提交
+        起到线程结束（或尚未开始即被取消）为止保留在 running 中，供调度时跳过仍在执行的域名。
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ddns-task')
+        future = self._executor.submit(func, *args)
+        if running is not None:
+            with self._running_lock:
+                running.add(key)
+            future.add_done_callback(lambda _: self._finish_running(running, key))
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.task_timeout)
+
+    def _finish_running(self, running, key):
+        with self._running_lock:
+            running.discard(key)
+
+    def is_running(self, domain):
+        """域名的同步或验证是否仍在线程中执行（包括已超时的任务）"""
+        with self._running_lock:
+            return domain in self._running_zones or domain in self._running_verifications
+
+    async def _run_task(self, description, func, *args, running=None, key=None):
+        """执行一个并发任务，超时或异常时记录日志并返回 None"""
+        try:
+            return await self._run(func, *args, running=running, key=key)
+        except asyncio.TimeoutError:
+            logging.error(f"{description}超时（{self.task_timeout} 秒），本周期不再等待")
+        except Exception as e:
+            logging.error(f"{description}时发生错误：{e}", exc_info=True)
+        return None
+
+    async def sync_records(self):
+        """
+        获取公网IP并并发同步各域名的记录
+
+        Returns:
+            bool: 本周期是否成功
+        """
+        ddns = self.ddns
+        current_time = time.time()
+        fetched = await self._run_task("获取公网IP", ddns.fetch_public_ips, current_time)
+        if fetched is None or fetched[0] is None:
+            return False
+        public_ips, ip_changed = fetched
+
+        full_check, plan, all_zones_checked = await self._run(ddns.plan_sync, public_ips, current_time)
+        busy = [domain for domain, _ in plan if self.is_running(domain)]
+        if busy:
+            # 上一次超时的线程仍在查询或修改这些域名，再次提交会重复修改记录，留到下一周期
+            logging.warning(f"域名 {', '.join(busy)} 上一次的同步或验证仍在执行，本周期跳过")
+            plan = [(domain, pending) for domain, pending in plan if domain not in busy]
+            all_zones_checked = False
+        results = await asyncio.gather(*(
+            self._run_task(f"同步域名 {domain}", ddns.update_zone, domain, pending, public_ips, current_time,
+                           running=self._running_zones, key=domain)
+            for domain, pending in plan
+        ))
+        if not all(result is True for result in results):
+            all_zones_checked = False
+        return await self._run(ddns.finish_sync, full_check, all_zones_checked, bool(plan), ip_changed,
+                               current_time)
+
+    async def process_verifications(self):
+        """并发处理全部已到期的待验证项，同步或验证仍在执行的域名延后处理"""
+        if self.ddns.is_standby():
+            return
+        queue = self.ddns.verification_queue
+        items = []
+        for item in queue.pop_due():
+            if self.is_running(item['domain']):
+                logging.info(f"域名 {item['domain']} 上一次的同步或验证仍在执行，延后验证")
+                queue.defer(item)
+            else:
+                items.append(item)
+        await asyncio.gather(*(
+            self._run_task(f"验证域名 {item['domain']}", self.ddns.process_verification, item,
+                           running=self._running_verifications, key=item['domain'])
+            for item in items
+        ))
+
+    async def run_cycle(self):
+        """
+        执行一次DDNS更新周期
+
+        Returns:
+            float: 距下一周期开始需要等待的时间(秒)
+        """
+        ddns = self.ddns
+        cycle_start = time.monotonic()
+        cycle_succeeded = False
+
+        try:
+            logging.info("开始执行DDNS更新")
+            if not await self._run(ddns.initialize_components):
+                ddns.record_cycle_metrics(cycle_start, False)
+                return await self._run(ddns.handle_config_load_failure, time.time())
+            if not ddns.check_leadership():
+                return ddns.standby_delay()
+
+            config = ddns.config_manager.get_config()
+            self.task_timeout = config['async_task_timeout']
+            if config['ddns_mode'] == 'standalone':
+                cycle_succeeded = await self.sync_records()
+            else:
+                cycle_succeeded = await self._run(ddns.run_mode_cycle)
+            logging.info("DDNS更新执行结束")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            ddns.handle_cycle_error(e)
+
+        return ddns.finish_cycle(cycle_start, cycle_succeeded)
+
+    async def _sleep(self, seconds):
+        """
+        等待指定时间，启用网络变化监听时可被提前唤醒
+
+        Returns:
+            bool: 是否因网络变化提前唤醒
+        """
+        watcher = self.ddns.netlink_watcher
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + seconds
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            if watcher is not None and watcher.event.is_set():
+                if await self._run(watcher.wait, 0):
+                    logging.info("检测到网络变化，立即执行DDNS更新")
+                    return True
+            # 分段等待，使网络变化能及时唤醒，取消时也能立即退出
+            await asyncio.sleep(min(remaining, 0.5) if watcher is not None else remaining)
+
+    async def run(self, next_cycle_at=None):
+        """
+        运行主循环，任务被取消时关闭线程池和通知队列后退出
+
+        Args:
+            next_cycle_at: 首个周期的开始时间(time.monotonic)，为空时立即开始
+        """
+        if next_cycle_at is None:
+            next_cycle_at = time.monotonic()
+        try:
+            while True:
+                await self.process_verifications()
+
+                if time.monotonic() >= next_cycle_at:
+                    wait_time = await self.run_cycle()
+                    next_cycle_at = time.monotonic() + wait_time
+                    logging.info(f"等待 {wait_time:.0f} 秒后下次更新")
+
+                wake_at = next_cycle_at
+                next_due = self.ddns.verification_queue.next_due()
+                if next_due is not None:
+                    wake_at = min(wake_at, next_due)
+                if await self._sleep(max(0.0, wake_at - time.monotonic())):
+                    next_cycle_at = time.monotonic()
+        finally:
+            self.close()
+
+    def close(self):
+        """关闭线程池，取消尚未开始的任务"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self.ddns.notification_manager is not None:
+            self.ddns.notification_manager.stop()
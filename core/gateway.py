@@ -0,0 +1,286 @@
+import os
+import time
+import socket
+import struct
+import logging
+import ipaddress
+from urllib.parse import urljoin, urlparse
+import xml.etree.ElementTree as ET
+
+import requests
+
+from core.netlink import get_default_gateway
+
+# NAT-PMP 和 PCP 共用网关的 5351 端口（RFC 6886 / RFC 6887）
+NATPMP_PORT = 5351
+
+NATPMP_VERSION = 0
+NATPMP_OP_EXTERNAL_ADDRESS = 0
+
+PCP_VERSION = 2
+PCP_OP_MAP = 1
+PCP_RESPONSE = 0x80
+# 查询时建立的临时映射的有效期(秒)，收到响应后立即删除
+PCP_MAP_LIFETIME = 60
+
+# SSDP 多播地址
+SSDP_ADDR = ('239.255.255.250', 1900)
+SSDP_SEARCH_TARGETS = (
+    'urn:schemas-upnp-org:device:InternetGatewayDevice:1',
+    'urn:schemas-upnp-org:device:InternetGatewayDevice:2',
+)
+# 提供 GetExternalIPAddress 的服务类型，按优先级排列
+WAN_SERVICE_TYPES = (
+    'urn:schemas-upnp-org:service:WANIPConnection:2',
+    'urn:schemas-upnp-org:service:WANIPConnection:1',
+    'urn:schemas-upnp-org:service:WANPPPConnection:1',
+)
+
+PROTOCOLS = ('upnp', 'natpmp', 'pcp')
+
+
+class GatewayError(Exception):
+    """网关查询失败"""
+
+
+def _local_name(tag):
+    """去掉 XML 标签的命名空间前缀"""
+    return tag.rsplit('}', 1)[-1]
+
+
+class GatewayClient:
+    """
+    向本地路由器查询 WAN 口地址，支持 UPnP IGD、NAT-PMP 和 PCP
+
+    请求只在局域网内往返，不依赖外部 IP 服务。UPnP 的 SSDP 发现结果会被缓存，
+    只有缓存过期或控制接口请求失败时才重新发现。
+    """
+
+    def __init__(self, address=None, port=NATPMP_PORT, ssdp_addr=SSDP_ADDR, timeout=2.0,
+                 rto=0.25, discovery_ttl=3600):
+        """
+        初始化网关客户端
+
+        Args:
+            address: 路由器地址，为空时使用默认网关
+            port: NAT-PMP / PCP 端口
+            ssdp_addr: SSDP 搜索的目标地址
+            timeout: 单次查询的超时时间(秒)
+            rto: UDP 请求首次重传的等待时间(秒)，之后每次加倍
+            discovery_ttl: UPnP 发现结果的缓存时间(秒)
+        """
+        self.address = address
+        self.port = port
+        self.ssdp_addr = ssdp_addr
+        self.timeout = timeout
+        self.rto = rto
+        self.discovery_ttl = discovery_ttl
+        # (控制地址, 服务类型, 过期时间)
+        self._upnp_service = None
+
+    def get_gateway(self):
+        gateway = self.address or get_default_gateway()
+        if not gateway:
+            raise GatewayError("未找到默认网关")
+        return gateway
+
+    def get_external_ip(self, protocol):
+        """
+        查询路由器的 WAN 口地址
+
+        Args:
+            protocol: 'upnp'、'natpmp' 或 'pcp'
+
+        Returns:
+            str: 路由器返回的 IPv4 地址
+
+        Raises:
+            GatewayError: 网关不支持该协议、未响应或返回错误
+        """
+        if protocol == 'upnp':
+            return self._query_upnp()
+        if protocol == 'natpmp':
+            return self._query_natpmp()
+        if protocol == 'pcp':
+            return self._query_pcp()
+        raise GatewayError(f"不支持的网关协议: {protocol}")
+
+    def _exchange(self, build, parse, name):
+        """
+        向网关发送 UDP 请求，未收到响应时按 RTO 重传
+
+        Args:
+            build: 根据已连接的套接字构造请求的函数
+            parse: 解析响应的函数，不是本次请求的响应时返回 None
+            name: 协议名称，用于错误信息
+        """
+        gateway = self.get_gateway()
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect((gateway, self.port))
+            request = build(sock)
+            deadline = time.monotonic() + self.timeout
+            rto = self.rto
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    raise GatewayError(f"网关 {gateway} 未响应 {name} 请求")
+                sock.send(request)
+                wait_until = min(now + rto, deadline)
+                rto *= 2
+                while time.monotonic() < wait_until:
+                    sock.settimeout(max(0.001, wait_until - time.monotonic()))
+                    try:
+                        data = sock.recv(1100)
+                    except socket.timeout:
+                        break
+                    except ConnectionRefusedError:
+                        raise GatewayError(f"网关 {gateway} 未开启 {name}")
+                    result = parse(data)
+                    if result is not None:
+                        return result
+
+    def _query_natpmp(self):
+        def parse(data):
+            if len(data) < 4 or data[0] != NATPMP_VERSION or data[1] != 128 + NATPMP_OP_EXTERNAL_ADDRESS:
+                return None
+            code = struct.unpack('!H', data[2:4])[0]
+            if code != 0 or len(data) < 12:
+                raise GatewayError(f"NAT-PMP 返回错误码 {code}")
+            return socket.inet_ntoa(data[8:12])
+
+        return self._exchange(lambda sock: struct.pack('!BB', NATPMP_VERSION, NATPMP_OP_EXTERNAL_ADDRESS),
+                              parse, 'NAT-PMP')
+
+    @staticmethod
+    def _pcp_map_request(nonce, client_address, lifetime):
+        """构造 UDP 映射的 PCP MAP 请求，lifetime 为 0 时表示删除该映射"""
+        client_ip, client_port = client_address
+        header = struct.pack('!BBxxI16s', PCP_VERSION, PCP_OP_MAP, lifetime,
+                             ipaddress.IPv6Address(f'::ffff:{client_ip}').packed)
+        return header + struct.pack('!12sBxxxHH16s', nonce, socket.IPPROTO_UDP, client_port, 0,
+                                    ipaddress.IPv6Address('::').packed)
+
+    def _query_pcp(self):
+        """
+        PCP 没有单独查询外部地址的操作，通过为本地临时端口申请一个短期 UDP 映射，
+        从响应中的分配地址得到 WAN 口地址，随后删除该映射
+        """
+        nonce = os.urandom(12)
+        client = {}
+
+        def build(sock):
+            client['address'] = sock.getsockname()
+            return self._pcp_map_request(nonce, client['address'], PCP_MAP_LIFETIME)
+
+        def parse(data):
+            if len(data) < 24 or data[1] != PCP_RESPONSE | PCP_OP_MAP:
+                # 仅支持 NAT-PMP 的网关对未知版本以 NAT-PMP 格式返回“不支持的版本”
+                if len(data) >= 4 and data[0] == NATPMP_VERSION:
+                    raise GatewayError("网关不支持 PCP（仅支持 NAT-PMP）")
+                return None
+            code = data[3]
+            if code != 0:
+                raise GatewayError(f"PCP 返回错误码 {code}")
+            if len(data) < 60 or data[24:36] != nonce:
+                return None
+            address = ipaddress.IPv6Address(data[44:60])
+            return str(address.ipv4_mapped or address)
+
+        ip = self._exchange(build, parse, 'PCP')
+        try:
+            # 删除临时映射，失败时等待其自然过期
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.sendto(self._pcp_map_request(nonce, client['address'], 0), (self.get_gateway(), self.port))
+        except OSError:
+            pass
+        return ip
+
+    def discover_upnp(self):
+        """
+        通过 SSDP 搜索 IGD 设备，读取设备描述找到 WAN 连接服务的控制地址
+
+        指定了路由器地址时，只采用该地址发出、且设备描述也位于该地址的应答，
+        忽略局域网内其他 IGD 设备，与 NAT-PMP / PCP 查询同一台路由器。
+
+        Returns:
+            tuple: (控制地址, 服务类型)
+        """
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+            for target in SSDP_SEARCH_TARGETS:
+                message = (f"M-SEARCH * HTTP/1.1\r\nHOST: {self.ssdp_addr[0]}:{self.ssdp_addr[1]}\r\n"
+                           f"MAN: \"ssdp:discover\"\r\nMX: 1\r\nST: {target}\r\n\r\n")
+                sock.sendto(message.encode(), self.ssdp_addr)
+            deadline = time.monotonic() + self.timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise GatewayError("未发现 UPnP IGD 设备")
+                sock.settimeout(remaining)
+                try:
+                    data, sender = sock.recvfrom(2048)
+                except socket.timeout:
+                    continue
+                headers = {}
+                for line in data.decode('utf-8', errors='replace').split('\r\n')[1:]:
+                    key, _, value = line.partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                if self.address and (sender[0] != self.address
+                                     or urlparse(headers.get('location', '')).hostname != self.address):
+                    logging.debug(f"忽略非指定路由器 {self.address} 的SSDP应答: {sender[0]}")
+                    continue
+                if 'location' in headers:
+                    service = self._read_description(headers['location'])
+                    if service:
+                        return service
+
+    def _read_description(self, location):
+        """读取设备描述，返回优先级最高的 WAN 连接服务"""
+        try:
+            response = requests.get(location, timeout=self.timeout)
+            response.raise_for_status()
+            root = ET.fromstring(response.content)
+        except (requests.RequestException, ET.ParseError) as e:
+            logging.warning(f"读取UPnP设备描述 {location} 失败: {e}")
+            return None
+        base = next((e.text for e in root.iter() if _local_name(e.tag) == 'URLBase' and e.text), location)
+        services = {}
+        for element in root.iter():
+            if _local_name(element.tag) != 'service':
+                continue
+            fields = {_local_name(child.tag): (child.text or '').strip() for child in element}
+            if fields.get('serviceType') in WAN_SERVICE_TYPES and fields.get('controlURL'):
+                services[fields['serviceType']] = urljoin(base, fields['controlURL'])
+        for service_type in WAN_SERVICE_TYPES:
+            if service_type in services:
+                return services[service_type], service_type
+        return None
+
+    def _query_upnp(self):
+        now = time.monotonic()
+        if self._upnp_service is None or self._upnp_service[2] <= now:
+            control_url, service_type = self.discover_upnp()
+            self._upnp_service = (control_url, service_type, now + self.discovery_ttl)
+            logging.info(f"已发现UPnP IGD服务: {service_type} ({control_url})")
+        control_url, service_type, _ = self._upnp_service
+
+        body = ('<?xml version="1.0"?>'
+                '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" '
+                's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+                f'<s:Body><u:GetExternalIPAddress xmlns:u="{service_type}"/></s:Body></s:Envelope>')
+        headers = {
+            'Content-Type': 'text/xml; charset="utf-8"',
+            'SOAPAction': f'"{service_type}#GetExternalIPAddress"',
+        }
+        try:
+            response = requests.post(control_url, data=body.encode(), headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+            root = ET.fromstring(response.content)
+        except (requests.RequestException, ET.ParseError) as e:
+            # 路由器重启后控制地址可能变化，下次查询时重新发现
+            self._upnp_service = None
+            raise GatewayError(f"UPnP GetExternalIPAddress 请求失败: {e}")
+        ip = next((e.text for e in root.iter() if _local_name(e.tag) == 'NewExternalIPAddress'), None)
+        if not ip:
+            raise GatewayError("UPnP 响应中没有外部地址")
+        return ip.strip()
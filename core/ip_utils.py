@@ -1,18 +1,63 @@
 import re
+import time
 import logging
+import ipaddress
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
+from core.netlink import get_interface_addresses
+from core.stun import StunClient
+from core.gateway import GatewayClient
+from core.provider_health import ProviderHealth
+from core import metrics
+
+class FamilyAdapter(HTTPAdapter):
+    """
+    只通过指定地址族建立连接
+
+    连接绑定到该地址族的通配地址，getaddrinfo 返回的另一地址族候选地址绑定失败后被跳过。
+    双栈主机上 IPv4 查询不会经由 IPv6 发出，否则服务看到的是 IPv6 地址。
+    """
+
+    def __init__(self, family, **kwargs):
+        self.source_address = ('::', 0) if family == 6 else ('0.0.0.0', 0)
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['source_address'] = self.source_address
+        super().init_poolmanager(*args, **kwargs)
+
 
 class IPFetcher:
     """IP 地址获取工具类，负责从多个服务获取公网 IP"""
 
-    def __init__(self):
-        """初始化 IP 获取器"""
+    # 支持的获取模式：依次尝试 / 并发取最快结果 / 并发等待多数一致
+    MODES = ('sequential', 'race', 'quorum')
+
+    # 本地来源排在 HTTP 服务之前，彼此之间按此顺序排列
+    SOURCE_ORDER = ('interface', 'gateway', 'stun')
+
+    def __init__(self, mode='sequential', quorum=2, timeout=5):
+        """
+        初始化 IP 获取器
+        
+        Args:
+            mode: 获取模式，可选 'sequential'、'race'、'quorum'
+            quorum: quorum 模式下需要一致的服务数量
+            timeout: 单个服务的请求超时时间(秒)
+        """
+        self.mode = mode
+        self.quorum = quorum
+        self.timeout = timeout
+
         # 用于 HTTP 请求的通用头信息
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         
-        # 可用于获取公网 IP 的服务列表
+        # 可用于获取公网 IPv4 的服务列表
+        # HTTP 服务使用 url + parser；本地来源使用 name + fetch，fetch(family) 直接返回 IP
         self.ip_services = [
             # 国内服务
             {'url': 'https://myip.ipip.net/json', 'parser': lambda r: r.json()['data']['ip']},
@@ -22,24 +67,383 @@ class IPFetcher:
             {'url': 'https://ifconfig.me/ip', 'parser': lambda r: r.text.strip()},
         ]
 
-    def is_valid_ip(self, ip):
-        """验证 IP 地址格式"""
+        # 可用于获取公网 IPv6 的服务列表（仅有 AAAA 记录的域名，保证通过 IPv6 访问）
+        self.ipv6_services = [
+            {'url': 'https://6.ipw.cn', 'parser': lambda r: r.text.strip()},
+            {'url': 'https://api6.ipify.org', 'parser': lambda r: r.text.strip()},
+            {'url': 'https://v6.ident.me', 'parser': lambda r: r.text.strip()},
+        ]
+
+        # 每个地址族一个 Session，连接限定在该地址族上
+        self.sessions = {family: self._create_session(family) for family in (4, 6)}
+
+        # 每个服务最近一次请求的耗时(秒)，失败的请求同样记录
+        self.service_latency = {}
+        # 服务健康评分，决定每次请求时的服务顺序和熔断
+        self.health = ProviderHealth()
+        self._executor = None
+        self._executor_size = 0
+        self.interface = None
+        self.stun = None
+        self.gateway = None
+        self.gateway_protocols = []
+        # 地址族 -> 最近一次 STUN 查询判断出的 NAT 映射行为
+        self.nat_behavior = {}
+
+    def is_valid_ip(self, ip, family=4):
+        """
+        验证 IP 地址格式
+        
+        Args:
+            ip: IP 地址
+            family: 地址族，4 或 6
+        """
+        if family == 6:
+            try:
+                return isinstance(ipaddress.ip_address(str(ip)), ipaddress.IPv6Address)
+            except ValueError:
+                return False
         pattern = r'^(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$'
         return bool(re.match(pattern, str(ip)))
 
-    def get_public_ip(self):
-        """获取公网 IP 地址，使用可靠的多个备选服务"""
-        for service in self.ip_services:
-            try:
-                response = requests.get(service['url'], timeout=5, headers=self.headers)
+    def get_services(self, family=4):
+        """返回指定地址族的服务列表"""
+        return self.ipv6_services if family == 6 else self.ip_services
+
+    def is_public_ip(self, ip):
+        """是否为公网地址，排除私有、链路本地、ULA、CGNAT 等地址段"""
+        try:
+            return ipaddress.ip_address(ip).is_global
+        except ValueError:
+            return False
+
+    def set_health_file(self, path):
+        """设置健康评分的持久化文件，路径变化时重新加载"""
+        if path == self.health.path:
+            return
+        self.health.path = path
+        if path:
+            self.health.load()
+
+    @staticmethod
+    def _create_session(family):
+        session = requests.Session()
+        adapter = FamilyAdapter(family)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def effective_quorum(self, family=4):
+        """quorum 模式下实际需要一致的服务数量，不超过该地址族配置的服务总数"""
+        return max(1, min(self.quorum, len(self.get_services(family))))
+
+    def check_quorum(self, families):
+        """
+        检查 quorum 是否超过各地址族的服务数量，超过时记录警告，该地址族按服务总数计算
+
+        Args:
+            families: 需要获取的地址族集合
+        """
+        if self.mode != 'quorum':
+            return
+        for family in sorted(families):
+            count = len(self.get_services(family))
+            if self.quorum > count:
+                logging.warning(f"IP_QUORUM={self.quorum} 大于IPv{family}获取服务的数量 {count}，"
+                                f"IPv{family}改为需要 {self.effective_quorum(family)} 个服务一致")
+
+    def get_ranked_services(self, family=4):
+        """按健康评分返回本次应使用的服务列表"""
+        return self.health.rank(self.get_services(family), family, self.service_name)
+
+    @staticmethod
+    def service_name(service):
+        """返回服务的显示名称"""
+        return service.get('name') or service['url']
+
+    def _install_source(self, source, *entries, families=(4, 6)):
+        """
+        替换某一类本地来源，按 SOURCE_ORDER 放在其他本地来源之间、HTTP 服务之前
+
+        Args:
+            source: 来源类别
+            entries: 来源配置（name + fetch），为空时只移除该类来源
+            families: 加入哪些地址族的服务列表
+        """
+        rank = self.SOURCE_ORDER.index(source)
+        entries = [dict(entry, source=source) for entry in entries if entry]
+        for family in (4, 6):
+            services = [s for s in self.get_services(family) if s.get('source') != source]
+            if family in families:
+                position = sum(1 for s in services if s.get('source') in self.SOURCE_ORDER[:rank])
+                services[position:position] = entries
+            if family == 6:
+                self.ipv6_services = services
+            else:
+                self.ip_services = services
+
+    def set_interface(self, interface):
+        """
+        设置本地网卡来源，放在 HTTP 服务之前优先使用
+
+        Args:
+            interface: 网卡名称，为空时移除本地网卡来源
+        """
+        if interface == self.interface:
+            return
+        self.interface = interface
+        entry = None
+        if interface:
+            entry = {
+                'name': f'interface:{interface}',
+                'fetch': lambda family: self.get_interface_ip(interface, family),
+            }
+            logging.info(f"已启用本地网卡IP来源: {interface}")
+        self._install_source('interface', entry)
+
+    def set_stun_servers(self, servers):
+        """
+        设置 STUN 来源，放在本地网卡来源之后、HTTP 服务之前
+
+        Args:
+            servers: STUN 服务器地址列表，为空时移除 STUN 来源
+        """
+        servers = list(servers or [])
+        if servers == (self.stun.servers if self.stun else []):
+            return
+        self.stun = StunClient(servers, timeout=min(self.timeout, 2.0)) if servers else None
+        self.nat_behavior = {}
+        self._install_source('stun', {'name': 'stun', 'fetch': self.get_stun_ip} if servers else None)
+        if servers:
+            logging.info(f"已启用STUN来源: {', '.join(servers)}")
+
+    def set_gateway(self, protocols, address=None):
+        """
+        设置路由器来源，放在本地网卡来源之后、STUN 和 HTTP 服务之前
+
+        每种协议是一个独立的来源，同样参与健康评分排序和熔断。
+        NAT-PMP 和 UPnP 的 GetExternalIPAddress 只能查询 IPv4，因此只用于 IPv4。
+
+        Args:
+            protocols: 协议列表，可选 'upnp'、'natpmp'、'pcp'，为空时移除路由器来源
+            address: 路由器地址，为空时使用默认网关
+        """
+        protocols = list(protocols or [])
+        if protocols == self.gateway_protocols and (self.gateway is None or self.gateway.address == address):
+            return
+        self.gateway_protocols = protocols
+        self.gateway = GatewayClient(address, timeout=min(self.timeout, 2.0)) if protocols else None
+        self._install_source('gateway', *[
+            {'name': f'gateway:{protocol}', 'fetch': lambda family, p=protocol: self.get_gateway_ip(p)}
+            for protocol in protocols
+        ], families=(4,))
+        if protocols:
+            logging.info(f"已启用路由器IP来源: {', '.join(protocols)} (网关: {address or '默认网关'})")
+
+    def get_gateway_ip(self, protocol):
+        """
+        向路由器查询 WAN 口地址
+
+        Args:
+            protocol: 'upnp'、'natpmp' 或 'pcp'
+
+        Returns:
+            str: WAN 口的公网地址，WAN 口是私有或 CGNAT 地址（多层NAT）时返回 None
+        """
+        ip = self.gateway.get_external_ip(protocol)
+        if self.is_valid_ip(ip) and not self.is_public_ip(ip):
+            logging.warning(f"路由器WAN口地址 {ip} 不是公网地址（可能处于运营商NAT之后），改用其他来源")
+            return None
+        return ip
+
+    def get_stun_ip(self, family=4):
+        """
+        通过 STUN 获取公网地址，同时判断 NAT 是否为对称型
+
+        Args:
+            family: 地址族，4 或 6
+
+        Returns:
+            str: 各服务器一致看到的映射地址，没有响应或地址不一致时返回 None
+        """
+        results = self.stun.query(family)
+        if not results:
+            logging.warning(f"所有STUN服务器均未返回IPv{family}映射地址")
+            return None
+        addresses = {ip for ip, _ in results.values()}
+        if len(addresses) > 1:
+            # 多出口负载均衡时不同服务器看到的地址不同，无法确定应该写入哪一个
+            logging.warning(f"各STUN服务器看到的IPv{family}地址不一致: "
+                            f"{', '.join(f'{s}={ip}' for s, (ip, _) in results.items())}")
+            return None
+        if len(results) > 1:
+            ports = {port for _, port in results.values()}
+            self._set_nat_behavior(family, 'symmetric' if len(ports) > 1 else 'endpoint_independent')
+        return addresses.pop()
+
+    def _set_nat_behavior(self, family, behavior):
+        """记录 NAT 映射行为，变化时输出日志"""
+        if self.nat_behavior.get(family) == behavior:
+            return
+        self.nat_behavior[family] = behavior
+        if behavior == 'symmetric':
+            logging.warning(f"检测到IPv{family}对称型NAT：不同STUN服务器看到的映射端口不同。"
+                            f"公网地址仍可用于解析记录，但外部主机无法通过该地址直接访问内网服务，需要端口映射")
+        else:
+            logging.info(f"IPv{family} NAT 映射与目标地址无关（非对称型NAT）")
+
+    def get_interface_ip(self, interface, family=4):
+        """
+        从本地网卡读取公网地址
+
+        Args:
+            interface: 网卡名称
+            family: 地址族，4 或 6
+
+        Returns:
+            str: 网卡上的第一个公网地址，没有时返回 None
+        """
+        for address in get_interface_addresses(interface):
+            if self.is_valid_ip(address, family) and self.is_public_ip(address):
+                return address
+        logging.warning(f"网卡 {interface} 上没有公网IPv{family}地址")
+        return None
+
+    def _query_service(self, service, family=4):
+        """
+        查询单个服务并记录耗时
+        
+        Args:
+            service: 服务配置
+            family: 地址族，4 或 6
+            
+        Returns:
+            str: 合法的 IP 地址，失败时返回 None
+        """
+        name = self.service_name(service)
+        start = time.monotonic()
+        ip = None
+        try:
+            if 'fetch' in service:
+                ip = service['fetch'](family)
+            else:
+                response = self.sessions[family].get(service['url'], timeout=self.timeout, headers=self.headers)
                 if response.status_code == 200:
                     ip = service['parser'](response)
-                    if ip and self.is_valid_ip(ip):
-                        logging.info(f"成功从 {service['url']} 获取到IP: {ip}")
-                        return ip
-            except Exception as e:
-                logging.warning(f"从 {service['url']} 获取IP失败: {e}")
+                else:
+                    logging.warning(f"从 {name} 获取IP失败: HTTP {response.status_code}")
+            if ip is not None and not self.is_valid_ip(ip, family):
+                logging.warning(f"{name} 返回了无效的IP: {ip}")
+                ip = None
+            elif ip is not None and family == 6:
+                # 统一为压缩格式，避免同一地址因写法不同被误判为变化
+                ip = str(ipaddress.IPv6Address(ip))
+        except Exception as e:
+            logging.warning(f"从 {name} 获取IP失败: {e}")
+        finally:
+            latency = time.monotonic() - start
+            self.service_latency[name] = latency
+            self.health.record(self.health.key(name, family), ip is not None, latency)
+            metrics.IP_FETCH_SECONDS.observe(latency, provider=name, family=family,
+                                             result='success' if ip is not None else 'failure')
+            logging.debug(f"{name} 耗时 {latency * 1000:.0f} ms")
+        return ip
+
+    def _get_executor(self):
+        """懒加载用于并发查询的线程池"""
+        size = max(len(self.ip_services) + len(self.ipv6_services), 1)
+        if self._executor is None or self._executor_size < size:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='ip-fetch')
+            self._executor_size = size
+        return self._executor
+
+    def get_public_ip(self, family=4):
+        """
+        获取公网 IP 地址，根据 mode 选择依次尝试、并发竞速或多数一致
+        
+        Args:
+            family: 地址族，4 或 6
+        """
+        # 每次请求前按成功率和延迟重新排序，熔断中的服务会被跳过
+        services = self.get_ranked_services(family)
+        if self.mode == 'quorum' and len(services) < self.effective_quorum(family):
+            # 熔断不能减少需要一致的服务数量，否则剩下的单个服务出错时会被直接采用；
+            # 可用服务不足时熔断中的服务排在后面一并查询
+            services += [s for s in self.get_services(family) if s not in services]
+        try:
+            if self.mode == 'race':
+                return self._get_public_ip_race(services, family)
+            if self.mode == 'quorum':
+                return self._get_public_ip_quorum(services, family)
+            return self._get_public_ip_sequential(services, family)
+        finally:
+            self.health.save()
+
+    def get_public_ips(self, families=(4,)):
+        """
+        并发获取多个地址族的公网 IP
+        
+        Args:
+            families: 需要获取的地址族集合
+            
+        Returns:
+            dict: 地址族 -> IP 地址，获取失败的地址族值为 None
+        """
+        families = sorted(set(families))
+        if len(families) == 1:
+            return {families[0]: self.get_public_ip(families[0])}
+        # 单独的线程池，避免与服务查询线程池互相等待
+        with ThreadPoolExecutor(max_workers=len(families), thread_name_prefix='ip-family') as executor:
+            futures = {family: executor.submit(self.get_public_ip, family) for family in families}
+            return {family: future.result() for family, future in futures.items()}
+
+    def _get_public_ip_sequential(self, services, family):
+        """依次尝试各个服务，返回第一个合法结果"""
+        for service in services:
+            ip = self._query_service(service, family)
+            if ip:
+                logging.info(f"成功从 {self.service_name(service)} 获取到IP: {ip}")
+                return ip
+
+        logging.error(f"所有IPv{family}获取服务均失败")
+        return None
+
+    def _get_public_ip_race(self, services, family):
+        """并发查询所有服务，返回最先到达的合法结果"""
+        executor = self._get_executor()
+        futures = {executor.submit(self._query_service, s, family): s for s in services}
+        for future in as_completed(futures):
+            ip = future.result()
+            if ip:
+                name = self.service_name(futures[future])
+                logging.info(f"成功从 {name} 获取到IP: {ip} (耗时 {self.service_latency[name] * 1000:.0f} ms)")
+                return ip
+
+        logging.error(f"所有IPv{family}获取服务均失败")
+        return None
+
+    def _get_public_ip_quorum(self, services, family):
+        """并发查询所有服务，直到有 quorum 个服务返回相同的 IP"""
+        quorum = self.effective_quorum(family)
+        if len(services) < quorum:
+            logging.error(f"IPv{family}获取服务只有 {len(services)} 个，少于需要一致的 {quorum} 个，无法采用结果")
+            return None
+        executor = self._get_executor()
+        futures = {executor.submit(self._query_service, s, family): s for s in services}
+        votes = Counter()
+        for future in as_completed(futures):
+            ip = future.result()
+            if not ip:
                 continue
+            votes[ip] += 1
+            if votes[ip] >= quorum:
+                logging.info(f"{votes[ip]} 个服务一致返回IP: {ip}")
+                return ip
 
-        logging.error("所有IP获取服务均失败")
+        if votes:
+            logging.error(f"IPv{family}获取服务结果未达成一致 (需要 {quorum} 个一致): {dict(votes)}")
+        else:
+            logging.error(f"所有IPv{family}获取服务均失败")
         return None
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from core import metrics
+
+
+class LeaderLease:
+    """
+    基于共享卷上租约文件的主备选举
+
+    租约文件记录持有者和最近一次续期的时间戳，读写时持有 fcntl 记录锁，保证同一时刻只有一个
+    节点能修改租约。主节点每 ttl/3 秒续期一次；持有者超过 ttl 秒未续期时，备用节点接管。
+    主节点在最近一次成功续期后 ttl - ttl/3 秒内认为自己有效，续期持续失败时会先于备用节点
+    的接管时间主动退出，留出的间隔用于吸收时钟偏差和尚未完成的请求。
+    """
+
+    def __init__(self, path, node_id, ttl=30, clock=time.time, lock_timeout=1.0):
+        """
+        初始化租约
+
+        Args:
+            path: 租约文件路径，需要位于各节点共享的卷上
+            node_id: 本节点的唯一标识
+            ttl: 租约有效期(秒)
+            clock: 墙上时间函数，各节点需要同步时钟
+            lock_timeout: 获取文件锁的最长等待时间(秒)
+        """
+        self.path = path
+        self.node_id = node_id
+        self.ttl = ttl
+        self.interval = ttl / 3
+        self.clock = clock
+        self.lock_timeout = lock_timeout
+        self.holder = None
+        self._leader = False
+        self._valid_until = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @contextmanager
+    def _locked(self):
+        """打开租约文件并持有排他记录锁"""
+        import fcntl
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            deadline = time.monotonic() + self.lock_timeout
+            while True:
+                try:
+                    fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        raise
+                    time.sleep(0.05)
+            try:
+                yield fd
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _read(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        data = b''
+        while True:
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                break
+            data += chunk
+        try:
+            return json.loads(data) if data.strip() else {}
+        except ValueError:
+            logging.warning("租约文件内容无效，视为无人持有")
+            return {}
+
+    @staticmethod
+    def _write(fd, lease):
+        # 文件锁绑定在文件上，不能用替换文件的方式写入，持锁期间原地覆盖
+        data = json.dumps(lease).encode('utf-8')
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, data)
+        os.fsync(fd)
+
+    def read(self):
+        """读取当前租约内容"""
+        with self._locked() as fd:
+            return self._read(fd)
+
+    def attempt(self):
+        """
+        续期或尝试获取租约
+
+        Returns:
+            bool: 本节点是否为主节点
+        """
+        started = time.monotonic()
+        try:
+            with self._locked() as fd:
+                now = self.clock()
+                lease = self._read(fd)
+                holder = lease.get('holder')
+                expires_at = lease.get('renewed_at', 0) + lease.get('ttl', self.ttl)
+                if holder and holder != self.node_id and now < expires_at:
+                    self._set_leader(False, holder)
+                    return False
+                term = lease.get('term', 0) + (0 if holder == self.node_id else 1)
+                self._write(fd, {'holder': self.node_id, 'renewed_at': now, 'ttl': self.ttl, 'term': term})
+        except OSError as e:
+            # 续期失败时在有效期内保持当前身份，到期后自动退出
+            logging.warning(f"租约文件 {self.path} 读写失败: {e}")
+            return self.is_leader()
+        self._valid_until = started + self.ttl - self.interval
+        self._set_leader(True, self.node_id)
+        return True
+
+    def _set_leader(self, leader, holder):
+        if leader != self._leader or holder != self.holder:
+            if leader:
+                logging.info(f"已获得租约，成为主节点: {self.node_id}")
+            else:
+                logging.info(f"租约由 {holder} 持有，当前为备用节点")
+        self._leader = leader
+        self.holder = holder
+        metrics.HA_LEADER.set(1 if leader else 0)
+
+    def is_leader(self):
+        """本节点当前是否可以执行IP获取和记录修改"""
+        if self._leader and time.monotonic() >= self._valid_until:
+            logging.warning(f"租约超过 {self.ttl - self.interval:.0f} 秒未能续期，退出主节点")
+            self._set_leader(False, self.holder)
+        return self._leader
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.attempt()
+
+    def start(self):
+        """立即尝试一次获取租约，之后在后台线程中定期续期或尝试接管"""
+        self.attempt()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='ha-lease', daemon=True)
+        self._thread.start()
+
+    def stop(self, release=True):
+        """
+        停止续期
+
+        Args:
+            release: 是否释放租约，释放后备用节点在下一次检查时即可接管
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if release and self._leader:
+            try:
+                with self._locked() as fd:
+                    lease = self._read(fd)
+                    if lease.get('holder') == self.node_id:
+                        self._write(fd, dict(lease, holder=None, renewed_at=0))
+                logging.info("已释放租约")
+            except OSError as e:
+                logging.warning(f"释放租约失败: {e}")
+        self._leader = False
+        metrics.HA_LEADER.set(0)
@@ -0,0 +1,273 @@
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 默认的耗时桶(秒)，覆盖从本地网卡读取到慢速 HTTP 服务和 SMTP 发送的范围
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """指标基类，按标签组合分别保存数值"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def clear(self):
+        """清空全部标签组合的数值"""
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """返回 (后缀, 标签, 数值) 列表"""
+        with self._lock:
+            return [('', key, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """可任意设置的数值"""
+
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def remove(self, **labels):
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+
+class Histogram(_Metric):
+    """累积直方图，输出 _bucket、_sum 和 _count"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][i] += 1
+                    break
+            entry['sum'] += value
+            entry['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """统计代码块的耗时"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def get_count(self, **labels):
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry['count'] if entry else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry['counts']):
+                    cumulative += count
+                    samples.append(('_bucket', key + (('le', _format_value(bound)),), cumulative))
+                samples.append(('_sum', key, entry['sum']))
+                samples.append(('_count', key, entry['count']))
+        return samples
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """以 Prometheus 文本格式输出全部指标"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# 各阶段耗时
+IP_FETCH_SECONDS = REGISTRY.register(Histogram(
+    'ddns_ip_fetch_seconds', '单个IP服务的查询耗时', ('provider', 'family', 'result')))
+DNSPOD_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'ddns_dnspod_request_seconds', 'DNSPod API 请求耗时', ('action',)))
+VERIFICATION_SECONDS = REGISTRY.register(Histogram(
+    'ddns_verification_seconds', '一次记录验证（查询记录列表并核对）的耗时', ('result',)))
+SMTP_SEND_SECONDS = REGISTRY.register(Histogram(
+    'ddns_smtp_send_seconds', '邮件发送耗时（含建立连接）', ('result',)))
+DNSPOD_THROTTLE_SECONDS = REGISTRY.register(Histogram(
+    'ddns_dnspod_throttle_seconds', 'DNSPod API 请求在本地限流器中等待的时间'))
+CYCLE_SECONDS = REGISTRY.register(Histogram(
+    'ddns_cycle_seconds', '一次更新周期的耗时', ('result',)))
+
+# 计数
+DNSPOD_REQUESTS = REGISTRY.register(Counter(
+    'ddns_dnspod_requests_total', 'DNSPod API 请求次数', ('action', 'status')))
+RECORD_UPDATES = REGISTRY.register(Counter(
+    'ddns_record_updates_total', '记录修改请求次数', ('record_type', 'result')))
+CYCLES = REGISTRY.register(Counter(
+    'ddns_cycles_total', '更新周期次数', ('result',)))
+CYCLES_SKIPPED = REGISTRY.register(Counter(
+    'ddns_cycles_skipped_total', '因公网IP与已验证记录一致而未调用 DNSPod API 的周期次数'))
+DNSPOD_RETRIES = REGISTRY.register(Counter(
+    'ddns_dnspod_retries_total', 'DNSPod API 因限频或临时故障重试的次数', ('action', 'code')))
+ERROR_EMAILS_SUPPRESSED = REGISTRY.register(Counter(
+    'ddns_error_emails_suppressed_total', '因频率限制未发送的错误邮件次数', ('error_type',)))
+IP_CHANGES_SUPPRESSED = REGISTRY.register(Counter(
+    'ddns_ip_changes_suppressed_total', '因未保持稳定而被忽略的公网IP变化次数（每次节省一次记录修改、验证和通知）', ('family',)))
+AGGREGATOR_REPORTS = REGISTRY.register(Counter(
+    'ddns_aggregator_reports_total', '汇聚服务收到的上报条数，按处理结果分类', ('result',)))
+
+# 当前状态
+PUBLIC_IP = REGISTRY.register(Gauge(
+    'ddns_public_ip_info', '当前公网IP，值恒为1，地址在 ip 标签中', ('family', 'ip')))
+LAST_SUCCESS = REGISTRY.register(Gauge(
+    'ddns_last_success_timestamp_seconds', '最近一次成功周期的时间戳'))
+HA_LEADER = REGISTRY.register(Gauge(
+    'ddns_ha_leader', '启用主备模式时本节点是否为主节点（1 为主节点，0 为备用节点）'))
+
+
+def set_public_ip(family, ip):
+    """更新某个地址族的当前公网IP，旧地址的序列会被移除"""
+    for _, labels, _ in PUBLIC_IP.samples():
+        labels = dict(labels)
+        if labels['family'] == str(family) and labels['ip'] != ip:
+            PUBLIC_IP.remove(**labels)
+    PUBLIC_IP.set(1, family=family, ip=ip)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"指标请求: {self.address_string()} {format % args}")
+
+
+class MetricsServer:
+    """在后台线程中提供 /metrics 接口"""
+
+    def __init__(self, host='127.0.0.1', port=9108, registry=REGISTRY):
+        """
+        初始化指标服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口，为 0 时由系统分配
+            registry: 指标注册表
+        """
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        handler = type('MetricsHandler', (_MetricsHandler,), {'registry': self.registry})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+        logging.info(f"指标接口已启动: http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,290 @@
+import os
+import time
+import socket
+import struct
+import logging
+import threading
+import ipaddress
+
+# netlink 通用消息类型与标志
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+# rtnetlink 消息类型
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+
+# rtnetlink 多播组
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE = 0x400
+
+# 地址作用域：link 和 host 作用域的地址不会是公网地址
+RT_SCOPE_LINK = 253
+RT_SCOPE_HOST = 254
+
+# 主路由表
+RT_TABLE_MAIN = 254
+
+# ifaddrmsg 属性类型
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+# 地址标志：临时（隐私扩展）地址和已弃用地址不适合作为解析记录
+IFA_F_TEMPORARY = 0x01
+IFA_F_DEPRECATED = 0x20
+
+NLMSG_HEADER = struct.Struct('=IHHII')   # len, type, flags, seq, pid
+RTATTR = struct.Struct('=HH')            # len, type
+IFADDRMSG = struct.Struct('=BBBBI')      # family, prefixlen, flags, scope, index
+RTMSG = struct.Struct('=BBBBBBBBI')      # family, dst_len, src_len, tos, table, protocol, scope, type, flags
+
+
+def _dump_addresses_netlink():
+    """
+    通过 RTM_GETADDR 获取全部网卡地址
+
+    Returns:
+        list: (ifindex, scope, flags, 地址字符串) 列表
+    """
+    addresses = []
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as sock:
+        sock.settimeout(2)
+        sock.bind((0, 0))
+        payload = IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        sock.send(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(payload), RTM_GETADDR,
+                                    NLM_F_REQUEST | NLM_F_DUMP, 1, 0) + payload)
+        while True:
+            data = sock.recv(65536)
+            offset = 0
+            while offset + NLMSG_HEADER.size <= len(data):
+                length, msg_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+                if length < NLMSG_HEADER.size:
+                    return addresses
+                if msg_type == NLMSG_DONE:
+                    return addresses
+                if msg_type == NLMSG_ERROR:
+                    raise OSError("netlink 返回错误")
+                if msg_type == RTM_NEWADDR:
+                    family, _, flags, scope, index = IFADDRMSG.unpack_from(data, offset + NLMSG_HEADER.size)
+                    attrs = {}
+                    attr_offset = offset + NLMSG_HEADER.size + IFADDRMSG.size
+                    end = offset + length
+                    while attr_offset + RTATTR.size <= end:
+                        attr_len, attr_type = RTATTR.unpack_from(data, attr_offset)
+                        if attr_len < RTATTR.size:
+                            break
+                        attrs[attr_type] = data[attr_offset + RTATTR.size:attr_offset + attr_len]
+                        attr_offset += (attr_len + 3) & ~3
+                    # 点对点链路（如 PPPoE）上 IFA_ADDRESS 是对端地址，本端地址在 IFA_LOCAL
+                    raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+                    if raw:
+                        addresses.append((index, scope, flags, socket.inet_ntop(family, raw)))
+                offset += (length + 3) & ~3
+
+
+def _read_proc_inet6(interface):
+    """从 /proc/net/if_inet6 读取指定网卡的 IPv6 地址"""
+    addresses = []
+    with open('/proc/net/if_inet6', 'r') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) >= 6 and fields[5] == interface:
+                raw = fields[0]
+                addresses.append(str(ipaddress.IPv6Address(int(raw, 16))))
+    return addresses
+
+
+def _read_ioctl_inet(interface):
+    """通过 SIOCGIFADDR 读取指定网卡的主 IPv4 地址"""
+    import fcntl
+    SIOCGIFADDR = 0x8915
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        ifreq = struct.pack('256s', interface.encode()[:15])
+        try:
+            result = fcntl.ioctl(sock.fileno(), SIOCGIFADDR, ifreq)
+        except OSError:
+            return []
+    return [socket.inet_ntoa(result[20:24])]
+
+
+def get_interface_addresses(interface):
+    """
+    获取指定网卡上的全部地址（不含 link/host 作用域，以及临时和已弃用的 IPv6 地址）
+
+    优先使用 netlink 获取，netlink 不可用时退回到 ioctl 和 /proc/net/if_inet6
+
+    Args:
+        interface: 网卡名称，例如 ppp0、eth0
+
+    Returns:
+        list: 地址字符串列表，网卡不存在时返回空列表
+    """
+    try:
+        index = socket.if_nametoindex(interface)
+    except OSError:
+        return []
+
+    if hasattr(socket, 'AF_NETLINK'):
+        try:
+            return [addr for ifindex, scope, flags, addr in _dump_addresses_netlink()
+                    if ifindex == index and scope not in (RT_SCOPE_LINK, RT_SCOPE_HOST)
+                    and not flags & (IFA_F_TEMPORARY | IFA_F_DEPRECATED)]
+        except OSError as e:
+            logging.debug(f"netlink 获取网卡地址失败，改用 ioctl/proc: {e}")
+
+    addresses = _read_ioctl_inet(interface)
+    if os.path.exists('/proc/net/if_inet6'):
+        addresses.extend(_read_proc_inet6(interface))
+    return addresses
+
+
+def get_default_gateway():
+    """
+    从 /proc/net/route 读取 IPv4 默认网关
+
+    Returns:
+        str: 度量值最小的默认路由的网关地址，没有默认路由或不是 Linux 时返回 None
+    """
+    RTF_GATEWAY = 0x2
+    routes = []
+    try:
+        with open('/proc/net/route', 'r') as f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 7 and fields[1] == '00000000' and int(fields[3], 16) & RTF_GATEWAY:
+                    routes.append((int(fields[6]), socket.inet_ntoa(struct.pack('<I', int(fields[2], 16)))))
+    except (OSError, ValueError):
+        return None
+    return min(routes)[1] if routes else None
+
+
+class NetlinkWatcher:
+    """通过 rtnetlink 监听地址和默认路由变化，在变化时立即唤醒主循环"""
+
+    def __init__(self, interface=None, settle_time=2):
+        """
+        初始化监听器
+
+        Args:
+            interface: 只关注该网卡上的地址变化，为空时关注所有网卡
+            settle_time: 收到事件后等待的时间(秒)，用于合并拨号过程中连续产生的事件
+        """
+        self.interface = interface
+        self.settle_time = settle_time
+        self.event = threading.Event()
+        self.event_count = 0
+        self._sock = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def is_supported():
+        """当前平台是否支持 netlink"""
+        return hasattr(socket, 'AF_NETLINK')
+
+    def start(self):
+        """打开 netlink 套接字并启动后台监听线程"""
+        if self._thread is not None:
+            return
+        groups = RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR | RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_ROUTE
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        self._sock.bind((0, groups))
+        self._sock.settimeout(1)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='netlink-watcher', daemon=True)
+        self._thread.start()
+        logging.info(f"已启动网络变化监听 (网卡: {self.interface or '全部'})")
+
+    def stop(self):
+        """停止监听线程并关闭套接字"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                data = self._sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if not self._stop.is_set():
+                    logging.warning(f"netlink 读取失败: {e}")
+                    time.sleep(1)
+                continue
+            if self.handle_data(data):
+                self.event_count += 1
+                self.event.set()
+
+    def _interface_matches(self, index):
+        if not self.interface:
+            return True
+        try:
+            return socket.if_indextoname(index) == self.interface
+        except OSError:
+            # 网卡已被删除（例如 PPPoE 断开），视为相关事件
+            return True
+
+    def handle_data(self, data):
+        """
+        解析一段 netlink 数据
+
+        Args:
+            data: 从 netlink 套接字读取的原始字节
+
+        Returns:
+            bool: 是否包含需要唤醒主循环的事件
+        """
+        relevant = False
+        offset = 0
+        while offset + NLMSG_HEADER.size <= len(data):
+            length, msg_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+            if length < NLMSG_HEADER.size:
+                break
+            payload = offset + NLMSG_HEADER.size
+
+            if msg_type in (RTM_NEWADDR, RTM_DELADDR) and payload + IFADDRMSG.size <= len(data):
+                family, _, _, scope, index = IFADDRMSG.unpack_from(data, payload)
+                if scope not in (RT_SCOPE_LINK, RT_SCOPE_HOST) and self._interface_matches(index):
+                    action = '新增' if msg_type == RTM_NEWADDR else '删除'
+                    logging.info(f"检测到地址{action} (family={family}, ifindex={index})")
+                    relevant = True
+            elif msg_type in (RTM_NEWROUTE, RTM_DELROUTE) and payload + RTMSG.size <= len(data):
+                family, dst_len, _, _, table, _, _, _, _ = RTMSG.unpack_from(data, payload)
+                if dst_len == 0 and table == RT_TABLE_MAIN:
+                    action = '新增' if msg_type == RTM_NEWROUTE else '删除'
+                    logging.info(f"检测到默认路由{action} (family={family})")
+                    relevant = True
+
+            # netlink 消息按 4 字节对齐
+            offset += (length + 3) & ~3
+        return relevant
+
+    def wait(self, timeout):
+        """
+        等待网络变化事件或超时
+
+        Args:
+            timeout: 最长等待时间(秒)
+
+        Returns:
+            bool: 是否因网络变化而提前返回
+        """
+        if not self.event.wait(timeout):
+            return False
+        # 拨号过程中会连续产生多条事件，稍等片刻让地址和路由就绪
+        time.sleep(self.settle_time)
+        self.event.clear()
+        return True
@@ -1,20 +1,43 @@
 import time
+import queue
 import logging
 import smtplib
+import threading
 from email.mime.text import MIMEText
 from email.utils import formataddr
+from core import metrics
 
 class NotificationManager:
     """通知管理类，负责处理邮件通知和错误通知"""
 
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, async_mode=False, queue_size=100, digest_window=10,
+                 max_retries=3, retry_delay=5, idle_timeout=60):
         """
         初始化通知管理器
         
         Args:
             config_manager: 配置管理器实例
+            async_mode: 是否通过后台队列发送，开启后发送通知不会阻塞调用方
+            queue_size: 通知队列容量
+            digest_window: 合并窗口(秒)，窗口内的多条通知合并为一封汇总邮件
+            max_retries: 发送失败后的最大重试次数
+            retry_delay: 首次重试的等待时间(秒)，之后按指数增长
+            idle_timeout: 队列空闲多久后关闭复用的 SMTP 连接(秒)
         """
         self.config_manager = config_manager
+        self.async_mode = async_mode
+        self.digest_window = digest_window
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.idle_timeout = idle_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        # 停止标志和停止期限：期限之后后台线程丢弃未发送的通知并退出
+        self._stopping = threading.Event()
+        self._stop_deadline = float('inf')
+        self._server = None
+        self._server_key = None
         
         # 错误邮件发送的时间戳记录
         self.last_error_times = {
@@ -25,22 +48,8 @@ class NotificationManager:
             'general': 0        # 其他一般错误
         }
 
-    def send_notification_email(self, subject, body):
-        """
-        发送邮件通知
-        
-        Args:
-            subject: 邮件主题
-            body: 邮件正文
-            
-        Returns:
-            bool: 是否发送成功
-        """
-        config = self.config_manager.get_config()
-        if not config or not config.get('smtp_receiver_email'):
-            logging.info("未配置接收邮件地址，跳过邮件发送")
-            return False
-
+    def _build_message(self, config, subject, body):
+        """构造邮件对象"""
         msg = MIMEText(body)
         msg['Subject'] = subject
         # 使用formataddr设置发件人显示名称和邮箱地址
@@ -49,7 +58,15 @@ class NotificationManager:
              config.get('smtp_sender_email'))
         )
         msg['To'] = config['smtp_receiver_email']
+        return msg
 
+    def _connect(self, config):
+        """
+        建立并登录 SMTP 连接
+        
+        Returns:
+            smtplib.SMTP: 已登录的连接
+        """
         # 端口号决定使用哪种连接方式
         port = int(config.get('smtp_port', 587))
         use_ssl = port == 465  # 端口465通常使用SSL
@@ -57,59 +74,305 @@ class NotificationManager:
         
         logging.debug(f"邮件连接方式: SSL={use_ssl}, TLS={use_tls}, Port={port}")
         
-        try:
-            # 建立连接，根据端口选择使用SSL还是普通SMTP
-            if use_ssl:
-                # 对于端口465，使用SSL直接加密连接
-                logging.debug(f"使用SSL连接SMTP服务器: {config['smtp_host']}:{port}")
-                server = smtplib.SMTP_SSL(config['smtp_host'], port, timeout=30)
-            else:
-                # 对于端口587等，先使用普通连接，然后如果需要则升级到TLS
-                logging.debug(f"使用普通连接SMTP服务器: {config['smtp_host']}:{port}")
-                server = smtplib.SMTP(config['smtp_host'], port, timeout=30)
-            
-            # 增加调试级别
-            # server.set_debuglevel(1)  # 如需详细调试可启用此行
-            
-            # 设置连接超时
-            if hasattr(server, 'sock') and server.sock:
-                server.sock.settimeout(30)
-            
-            # 如果使用TLS但不是SSL，则升级连接
-            if use_tls:
-                server.starttls()
-                logging.debug("已升级连接到TLS")
-            
-            # 登录验证
-            server.login(config['smtp_user'], config['smtp_password'])
-            logging.debug("登录成功")
-            
-            # 发送邮件
-            server.sendmail(
-                config['smtp_sender_email'], 
-                [config['smtp_receiver_email']], 
-                msg.as_string()
-            )
+        # 建立连接，根据端口选择使用SSL还是普通SMTP
+        if use_ssl:
+            # 对于端口465，使用SSL直接加密连接
+            logging.debug(f"使用SSL连接SMTP服务器: {config['smtp_host']}:{port}")
+            server = smtplib.SMTP_SSL(config['smtp_host'], port, timeout=30)
+        else:
+            # 对于端口587等，先使用普通连接，然后如果需要则升级到TLS
+            logging.debug(f"使用普通连接SMTP服务器: {config['smtp_host']}:{port}")
+            server = smtplib.SMTP(config['smtp_host'], port, timeout=30)
+        
+        # 增加调试级别
+        # server.set_debuglevel(1)  # 如需详细调试可启用此行
+        
+        # 设置连接超时
+        if hasattr(server, 'sock') and server.sock:
+            server.sock.settimeout(30)
+        
+        # 如果使用TLS但不是SSL，则升级连接
+        if use_tls:
+            server.starttls()
+            logging.debug("已升级连接到TLS")
+        
+        # 登录验证
+        server.login(config['smtp_user'], config['smtp_password'])
+        logging.debug("登录成功")
+        return server
+
+    def _deliver(self, server, config, subject, body):
+        """通过已建立的连接发送一封邮件"""
+        msg = self._build_message(config, subject, body)
+        server.sendmail(
+            config['smtp_sender_email'], 
+            [config['smtp_receiver_email']], 
+            msg.as_string()
+        )
+
+    def _log_send_error(self, e):
+        """按异常类型输出邮件发送失败日志"""
+        if isinstance(e, smtplib.SMTPConnectError):
+            logging.error(f"邮件发送失败 - 连接错误: {e}")
+        elif isinstance(e, smtplib.SMTPAuthenticationError):
+            logging.error(f"邮件发送失败 - 认证错误: {e}")
+        elif isinstance(e, smtplib.SMTPException):
+            logging.error(f"邮件发送失败 - SMTP错误: {e}")
+        elif isinstance(e, (ConnectionRefusedError, TimeoutError)):
+            logging.error(f"邮件发送失败 - 连接被拒绝或超时: {e}")
+        else:
+            logging.error(f"邮件发送失败: {e}")
+
+    def send_notification_email(self, subject, body):
+        """
+        同步发送邮件通知，每次单独建立连接
+        
+        Args:
+            subject: 邮件主题
+            body: 邮件正文
             
+        Returns:
+            bool: 是否发送成功
+        """
+        config = self.config_manager.get_config()
+        if not config or not config.get('smtp_receiver_email'):
+            logging.info("未配置接收邮件地址，跳过邮件发送")
+            return False
+
+        start = time.monotonic()
+        try:
+            server = self._connect(config)
+            self._deliver(server, config, subject, body)
             # 关闭连接
             server.quit()
+            metrics.SMTP_SEND_SECONDS.observe(time.monotonic() - start, result='success')
             logging.info(f"邮件发送成功: {subject}")
             return True
-        except smtplib.SMTPConnectError as e:
-            logging.error(f"邮件发送失败 - 连接错误: {e}")
-            return False
-        except smtplib.SMTPAuthenticationError as e:
-            logging.error(f"邮件发送失败 - 认证错误: {e}")
-            return False
-        except smtplib.SMTPException as e:
-            logging.error(f"邮件发送失败 - SMTP错误: {e}")
+        except Exception as e:
+            metrics.SMTP_SEND_SECONDS.observe(time.monotonic() - start, result='failure')
+            self._log_send_error(e)
             return False
-        except (ConnectionRefusedError, TimeoutError) as e:
-            logging.error(f"邮件发送失败 - 连接被拒绝或超时: {e}")
+
+    def notify(self, subject, body):
+        """
+        发送通知：后台模式下放入队列立即返回，否则同步发送
+        
+        Args:
+            subject: 邮件主题
+            body: 邮件正文
+            
+        Returns:
+            bool: 后台模式下为是否成功入队，同步模式下为是否发送成功
+        """
+        if not self.async_mode:
+            return self.send_notification_email(subject, body)
+
+        config = self.config_manager.get_config()
+        if not config or not config.get('smtp_receiver_email'):
+            logging.info("未配置接收邮件地址，跳过邮件发送")
             return False
-        except Exception as e:
-            logging.error(f"邮件发送失败: {e}")
+
+        self.start()
+        # 入队时保存当前配置，配置加载失败时临时切换的 SMTP 配置也能正确使用
+        item = (subject, body, config)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # 队列已满时丢弃最旧的一条，保留最新的通知
+            try:
+                dropped = self.queue.get_nowait()
+                self.queue.task_done()
+                logging.warning(f"通知队列已满，丢弃最早的通知: {dropped[0]}")
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                logging.warning(f"通知队列已满，丢弃通知: {subject}")
+                return False
+        logging.debug(f"通知已加入队列: {subject}")
+        return True
+
+    def start(self):
+        """启动后台发送线程"""
+        with self._worker_lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._worker_loop, name='notification-worker', daemon=True)
+            self._worker.start()
+
+    def flush(self, timeout=None):
+        """
+        等待队列中的通知全部处理完毕
+        
+        Args:
+            timeout: 最长等待时间(秒)，为空时一直等待
+            
+        Returns:
+            bool: 是否在超时前处理完毕
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stop(self, timeout=10, wait=True):
+        """
+        发送完队列中的通知后停止后台线程并关闭连接
+
+        停止信号不会阻塞调用方：队列已满时不放入停止信号，后台线程处理完队列后根据停止标志退出；
+        超过 timeout 后仍未发送的通知被丢弃，发送失败的重试也不会超过这个期限。
+
+        Args:
+            timeout: 等待队列处理完毕的最长时间(秒)
+            wait: 是否等待后台线程退出，为 False 时立即返回，由后台线程自行发送完剩余通知
+        """
+        with self._worker_lock:
+            worker = self._worker
+            self._worker = None
+        if worker is None or not worker.is_alive():
+            self._close_server()
+            return
+        self._stop_deadline = time.monotonic() + timeout
+        self._stopping.set()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if wait:
+            worker.join(timeout)
+
+    def _worker_loop(self):
+        """后台线程：取出通知，合并突发消息后发送，空闲时关闭连接"""
+        while True:
+            if self._stopping.is_set() and (self.queue.empty() or time.monotonic() >= self._stop_deadline):
+                self._discard_pending()
+                self._close_server()
+                return
+            try:
+                first = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._close_server()
+                continue
+            if first is None:
+                # 停止信号，回到循环开头检查停止标志
+                self.queue.task_done()
+                continue
+
+            # 在合并窗口内继续收集，突发的多条通知合并为一封汇总邮件
+            batch = [first]
+            deadline = min(time.monotonic() + self.digest_window, self._stop_deadline)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.queue.task_done()
+                    break
+                batch.append(item)
+
+            try:
+                subject, body = self._merge(batch)
+                self._send_with_retry(subject, body, batch[-1][2])
+            except Exception as e:
+                logging.error(f"通知发送线程发生错误: {e}", exc_info=True)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _discard_pending(self):
+        """停止时丢弃队列中剩余的通知"""
+        dropped = 0
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.queue.task_done()
+            if item is not None:
+                dropped += 1
+        if dropped:
+            logging.warning(f"通知发送线程已停止，丢弃 {dropped} 条未发送的通知")
+
+    def _wait_retry(self, seconds):
+        """
+        等待重试间隔，停止期限先于间隔结束时返回 False
+
+        Returns:
+            bool: 是否可以继续重试
+        """
+        end = time.monotonic() + seconds
+        if not self._stopping.wait(seconds):
+            return True
+        # 等待期间开始停止，只在停止期限内继续等待
+        if end > self._stop_deadline:
             return False
+        time.sleep(max(0.0, end - time.monotonic()))
+        return True
+
+    def _merge(self, batch):
+        """将多条通知合并为一封汇总邮件"""
+        if len(batch) == 1:
+            return batch[0][0], batch[0][1]
+        subject = f"DDNS通知汇总 ({len(batch)}条): {batch[0][0]}"
+        sections = [f"[{i}] {subject_}\n{body}" for i, (subject_, body, _) in enumerate(batch, 1)]
+        return subject, "\n\n".join(sections)
+
+    def _send_with_retry(self, subject, body, config):
+        """使用复用的连接发送邮件，失败时重新连接并按退避重试"""
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            try:
+                server = self._get_server(config)
+                self._deliver(server, config, subject, body)
+                metrics.SMTP_SEND_SECONDS.observe(time.monotonic() - start, result='success')
+                logging.info(f"邮件发送成功: {subject}")
+                return True
+            except Exception as e:
+                metrics.SMTP_SEND_SECONDS.observe(time.monotonic() - start, result='failure')
+                self._log_send_error(e)
+                self._close_server()
+                if attempt < self.max_retries:
+                    wait_time = self.retry_delay * (2 ** attempt)
+                    logging.info(f"{wait_time} 秒后重试发送邮件 ({attempt + 1}/{self.max_retries})")
+                    if not self._wait_retry(wait_time):
+                        logging.warning("通知发送线程正在停止，不再重试")
+                        break
+        logging.error(f"邮件发送失败，已放弃: {subject}")
+        return False
+
+    def _get_server(self, config):
+        """返回可用的已登录连接，连接失效或配置变化时重新建立"""
+        key = (config['smtp_host'], config.get('smtp_port'), config['smtp_user'])
+        if self._server is not None and self._server_key == key:
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except Exception:
+                pass
+            self._close_server()
+        elif self._server is not None:
+            self._close_server()
+        self._server = self._connect(config)
+        self._server_key = key
+        return self._server
+
+    def _close_server(self):
+        """关闭复用的 SMTP 连接"""
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        self._server = None
+        self._server_key = None
 
     def send_error_notification(self, subject, body, current_time, error_type='general'):
         """
@@ -134,10 +397,11 @@ class NotificationManager:
         error_interval = config.get('error_email_interval', 3600)
         if (current_time - last_error_time) <= error_interval:
             logging.info(f"{error_type} 类型的错误邮件已在 {error_interval} 秒内发送过，本次跳过")
+            metrics.ERROR_EMAILS_SUPPRESSED.inc(error_type=error_type)
             return False
         
-        if self.send_notification_email(subject, body):
-            # 更新错误通知时间
+        if self.notify(subject, body):
+            # 更新错误通知时间（后台模式下以入队成功为准）
             self.last_error_times[error_type] = current_time
             return True
         return False
@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+
+class ProviderHealth:
+    """IP 服务健康评分，按成功率和延迟排序，并对持续失败的服务进行熔断"""
+
+    # 熔断器状态
+    CLOSED = 'closed'          # 正常
+    OPEN = 'open'              # 熔断中，冷却期内不再请求
+    HALF_OPEN = 'half_open'    # 冷却结束，允许一次试探请求
+
+    def __init__(self, path=None, alpha=0.2, failure_threshold=3,
+                 cooldown=60, max_cooldown=3600, save_interval=300, clock=time.time):
+        """
+        初始化健康评分
+
+        Args:
+            path: 持久化文件路径，为空时只保存在内存中
+            alpha: 成功率和延迟 EWMA 的平滑系数
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 首次熔断的冷却时间(秒)，试探失败后加倍
+            max_cooldown: 冷却时间上限(秒)
+            save_interval: 只有评分变化时写入文件的最小间隔(秒)，熔断状态变化时立即写入
+            clock: 时间函数，使用墙上时间以便重启后冷却时间依然有效
+        """
+        self.path = path
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.save_interval = save_interval
+        self.clock = clock
+        self.providers = {}
+        self._lock = threading.Lock()
+        # 未写入文件的变化：_dirty 为任意评分变化，_state_changed 为熔断状态变化
+        self._dirty = False
+        self._state_changed = False
+        self._last_save = None
+        if path:
+            self.load()
+
+    @staticmethod
+    def key(name, family=4):
+        """生成服务在评分表中的键，同一服务的 IPv4 和 IPv6 分开统计"""
+        return f"{name}#v{family}"
+
+    def _entry(self, key):
+        entry = self.providers.get(key)
+        if entry is None:
+            entry = {
+                'success_rate': 1.0,
+                'latency': None,
+                'consecutive_failures': 0,
+                'total_success': 0,
+                'total_failure': 0,
+                'state': self.CLOSED,
+                'open_until': 0,
+                'cooldown': self.cooldown,
+            }
+            self.providers[key] = entry
+        return entry
+
+    def record(self, key, success, latency):
+        """
+        记录一次请求结果
+
+        Args:
+            key: 服务键
+            success: 是否成功获取到合法 IP
+            latency: 请求耗时(秒)
+        """
+        with self._lock:
+            self._dirty = True
+            entry = self._entry(key)
+            entry['success_rate'] += self.alpha * ((1.0 if success else 0.0) - entry['success_rate'])
+            if entry['latency'] is None:
+                entry['latency'] = latency
+            else:
+                entry['latency'] += self.alpha * (latency - entry['latency'])
+
+            if success:
+                entry['total_success'] += 1
+                entry['consecutive_failures'] = 0
+                if entry['state'] != self.CLOSED:
+                    logging.info(f"IP服务 {key} 试探成功，恢复正常")
+                    self._state_changed = True
+                entry['state'] = self.CLOSED
+                entry['cooldown'] = self.cooldown
+                return
+
+            entry['total_failure'] += 1
+            entry['consecutive_failures'] += 1
+            if entry['state'] == self.HALF_OPEN:
+                # 试探失败，冷却时间加倍
+                entry['cooldown'] = min(entry['cooldown'] * 2, self.max_cooldown)
+                self._trip(key, entry)
+            elif entry['state'] == self.CLOSED and entry['consecutive_failures'] >= self.failure_threshold:
+                self._trip(key, entry)
+
+    def _trip(self, key, entry):
+        self._state_changed = True
+        entry['state'] = self.OPEN
+        entry['open_until'] = self.clock() + entry['cooldown']
+        logging.warning(f"IP服务 {key} 连续失败 {entry['consecutive_failures']} 次，熔断 {entry['cooldown']} 秒")
+
+    def score(self, key):
+        """返回服务得分，越小越好：按成功率折算后的期望延迟"""
+        entry = self.providers.get(key)
+        if entry is None or entry['latency'] is None:
+            # 没有数据的服务给一个中等分数，保证它有机会被尝试
+            return 1.0
+        return entry['latency'] / max(entry['success_rate'], 0.05)
+
+    def rank(self, services, family, name_func):
+        """
+        按健康评分对服务排序，并过滤掉熔断中的服务
+
+        Args:
+            services: 服务列表
+            family: 地址族
+            name_func: 返回服务名称的函数
+
+        Returns:
+            list: 排序后的可用服务，全部熔断时返回最早结束冷却的一个作为兜底
+        """
+        now = self.clock()
+        available = []
+        with self._lock:
+            for service in services:
+                key = self.key(name_func(service), family)
+                entry = self.providers.get(key)
+                if entry and entry['state'] == self.OPEN:
+                    if now < entry['open_until']:
+                        continue
+                    entry['state'] = self.HALF_OPEN
+                    logging.info(f"IP服务 {key} 冷却结束，进行试探请求")
+                available.append(service)
+
+            if not available and services:
+                fallback = min(services, key=lambda s: self.providers[self.key(name_func(s), family)]['open_until'])
+                logging.warning("所有IP服务均处于熔断状态，尝试最早结束冷却的服务")
+                available = [fallback]
+
+        return sorted(available, key=lambda s: self.score(self.key(name_func(s), family)))
+
+    def get_snapshot(self):
+        """返回所有服务的健康数据，用于查看和导出"""
+        with self._lock:
+            return {key: dict(entry, score=round(self.score(key), 4)) for key, entry in self.providers.items()}
+
+    def load(self):
+        """从文件加载评分数据"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.providers = json.load(f).get('providers', {})
+            logging.info(f"已加载IP服务健康评分: {self.path} ({len(self.providers)} 个服务)")
+        except Exception as e:
+            logging.warning(f"IP服务健康评分文件读取失败，将重新统计: {e}")
+            self.providers = {}
+        self._dirty = self._state_changed = False
+        self._last_save = None
+
+    def save(self, force=False):
+        """
+        将评分数据写入文件
+
+        每次获取IP后都会调用。熔断状态变化时立即写入；只有评分变化时距上次写入不少于
+        save_interval 秒才写入，避免每个周期都重写文件（路由器等使用闪存的设备上尤其明显）。
+
+        Args:
+            force: 有未写入的变化时忽略写入间隔立即写入，例如服务退出时
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            now = self.clock()
+            if (not force and not self._state_changed and self._last_save is not None
+                    and now - self._last_save < self.save_interval):
+                return
+            data = {'providers': self.providers}
+            self._dirty = self._state_changed = False
+            self._last_save = now
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.warning(f"IP服务健康评分文件写入失败: {e}")
+
+
+def print_snapshot(path):
+    """以表格形式打印持久化的健康评分"""
+    health = ProviderHealth(path)
+    snapshot = health.get_snapshot()
+    if not snapshot:
+        print(f"没有健康评分数据: {path}")
+        return
+    now = time.time()
+    print(f"{'服务':<48} {'状态':<10} {'成功率':>6} {'延迟(ms)':>9} {'连续失败':>8} {'得分':>8}")
+    for key, entry in sorted(snapshot.items(), key=lambda item: item[1]['score']):
+        latency = f"{entry['latency'] * 1000:.0f}" if entry['latency'] is not None else '-'
+        state = entry['state']
+        if state == ProviderHealth.OPEN and entry['open_until'] > now:
+            state = f"open({entry['open_until'] - now:.0f}s)"
+        print(f"{key:<48} {state:<10} {entry['success_rate']:>6.2f} {latency:>9} "
+              f"{entry['consecutive_failures']:>8} {entry['score']:>8.3f}")
+
+
+if __name__ == '__main__':
+    # 用法: python -m core.provider_health [健康评分文件路径]
+    default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.ddns_providers.json')
+    print_snapshot(sys.argv[1] if len(sys.argv) > 1 else default_path)
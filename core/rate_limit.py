@@ -0,0 +1,57 @@
+import time
+import threading
+
+class TokenBucket:
+    """令牌桶限流器，多个线程共享同一个桶时总请求速率不超过设定值"""
+
+    def __init__(self, rate=5.0, capacity=10, clock=time.monotonic, sleep=time.sleep):
+        """
+        初始化令牌桶
+
+        Args:
+            rate: 每秒补充的令牌数，即长期平均请求速率，小于等于 0 时不限流
+            capacity: 桶容量，即允许的突发请求数
+            clock: 单调时钟函数
+            sleep: 等待函数
+        """
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+    def configure(self, rate, capacity):
+        """更新速率和容量，保留当前已积累的令牌"""
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = capacity
+            self._tokens = min(self._tokens, float(capacity))
+
+    def _refill(self):
+        now = self.clock()
+        if self.rate > 0:
+            self._tokens = min(float(self.capacity), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """
+        获取令牌，令牌不足时等待
+
+        Returns:
+            float: 实际等待的时间(秒)
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                if self.rate <= 0:
+                    return waited
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
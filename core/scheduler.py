@@ -0,0 +1,78 @@
+import time
+import random
+import logging
+
+class PollScheduler:
+    """轮询调度器，根据上一周期的结果计算下一周期的开始时间"""
+
+    def __init__(self, base_interval=60, fast_interval=15, fast_window=300,
+                 max_backoff=900, jitter=0.1, clock=time.monotonic):
+        """
+        初始化调度器
+
+        Args:
+            base_interval: 正常轮询间隔(秒)
+            fast_interval: 检测到变化后的快速轮询间隔(秒)，同时作为故障退避的起点
+            fast_window: 检测到变化后保持快速轮询的时长(秒)
+            max_backoff: 故障退避的最大间隔(秒)
+            jitter: 随机抖动比例，例如 0.1 表示在 ±10% 范围内随机
+            clock: 单调时钟函数
+        """
+        self.configure(base_interval, fast_interval, fast_window, max_backoff, jitter)
+        self.clock = clock
+
+        self.consecutive_failures = 0
+        self.fast_until = 0
+
+    def configure(self, base_interval, fast_interval, fast_window, max_backoff, jitter):
+        """更新调度参数，保留当前的故障计数和快速轮询窗口"""
+        self.base_interval = base_interval
+        self.fast_interval = fast_interval
+        self.fast_window = fast_window
+        self.max_backoff = max(max_backoff, base_interval)
+        self.jitter = jitter
+
+    def record_success(self, changed=False):
+        """
+        记录一次成功的周期
+
+        Args:
+            changed: 本周期是否观察到公网 IP 变化
+        """
+        if self.consecutive_failures:
+            logging.info(f"服务恢复正常，结束退避 (此前连续失败 {self.consecutive_failures} 次)")
+        self.consecutive_failures = 0
+        if changed:
+            self.fast_until = self.clock() + self.fast_window
+
+    def record_failure(self):
+        """记录一次失败的周期（IP获取失败、API异常等）"""
+        self.consecutive_failures += 1
+
+    def current_interval(self):
+        """返回不含抖动的下一周期间隔(秒)"""
+        if self.consecutive_failures:
+            # 从快速间隔开始指数退避，偶发故障能很快重试，持续故障时逐步降低请求频率
+            backoff = self.fast_interval * (2 ** (self.consecutive_failures - 1))
+            return min(backoff, self.max_backoff)
+        if self.clock() < self.fast_until:
+            return min(self.fast_interval, self.base_interval)
+        return self.base_interval
+
+    def next_delay(self, cycle_start):
+        """
+        计算距下一周期开始还需等待的时间
+
+        以本周期开始时间为基准计算截止时间，周期内的耗时不会累加到间隔上
+
+        Args:
+            cycle_start: 本周期开始时的单调时钟读数
+
+        Returns:
+            float: 需要等待的秒数
+        """
+        interval = self.current_interval()
+        if self.jitter:
+            interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        deadline = cycle_start + interval
+        return max(0.0, deadline - self.clock())
@@ -0,0 +1,127 @@
+import os
+import json
+import logging
+import threading
+
+class StateCache:
+    """
+    本地状态缓存，持久化每条记录最近一次验证过的记录值，避免每个周期都查询API
+
+    同时保存自动查找到的记录ID索引，(域名, 子域名, 记录类型, 线路) -> RecordId
+    """
+
+    def __init__(self, path):
+        """
+        初始化状态缓存
+        
+        Args:
+            path: 状态文件路径
+        """
+        self.path = path
+        # 可重入锁：修改缓存项和写入文件在同一把锁内完成，多个线程并发同步不同域名时不会互相干扰
+        self._lock = threading.RLock()
+        self.records = {}
+        self.record_ids = {}
+        self.last_verification_time = 0
+        self.load()
+
+    @staticmethod
+    def record_key(record):
+        """生成记录在缓存中的键"""
+        return f"{record['domain']}|{record['subdomain']}|{record['record_type']}|{record['record_id']}"
+
+    @staticmethod
+    def identity_key(record):
+        """生成记录ID索引的键，不含记录ID"""
+        return f"{record['domain']}|{record['subdomain']}|{record['record_type']}|{record['record_line']}"
+
+    def load(self):
+        """从状态文件加载缓存，文件不存在或损坏时从空缓存开始"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.records = data.get('records', {})
+            self.record_ids = data.get('record_ids', {})
+            self.last_verification_time = data.get('last_verification_time', 0)
+            logging.info(f"已加载状态缓存: {self.path} ({len(self.records)} 条记录)")
+        except Exception as e:
+            logging.warning(f"状态缓存文件读取失败，将重新建立缓存: {e}")
+            self.records = {}
+            self.record_ids = {}
+            self.last_verification_time = 0
+
+    def save(self):
+        """将缓存写入状态文件，先写临时文件再替换，避免写入中断导致文件损坏"""
+        with self._lock:
+            data = {
+                'records': self.records,
+                'record_ids': self.record_ids,
+                'last_verification_time': self.last_verification_time,
+            }
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logging.warning(f"状态缓存文件写入失败: {e}")
+
+    def get(self, record):
+        """获取记录的缓存项，不存在时返回 None"""
+        return self.records.get(self.record_key(record))
+
+    def matches(self, record, value):
+        """缓存中的记录值是否与给定值一致"""
+        entry = self.get(record)
+        return bool(entry) and entry.get('value') == value
+
+    def set(self, record, value, timestamp):
+        """
+        记录一次验证过的记录值
+        
+        Args:
+            record: 记录配置
+            value: 已验证的记录值
+            timestamp: 验证时间戳
+        """
+        key = self.record_key(record)
+        entry = {'value': value, 'record_id': str(record['record_id']), 'verified_at': timestamp}
+        with self._lock:
+            if self.records.get(key, {}).get('value') == value:
+                # 记录值未变化时只在内存中刷新时间，减少磁盘写入
+                self.records[key] = entry
+                return
+            self.records[key] = entry
+            self.save()
+
+    def invalidate(self, record):
+        """删除记录的缓存项，下个周期会重新查询API"""
+        with self._lock:
+            if self.records.pop(self.record_key(record), None) is not None:
+                self.save()
+
+    def get_record_id(self, record):
+        """获取索引中记录对应的记录ID，不存在时返回 None"""
+        return self.record_ids.get(self.identity_key(record))
+
+    def set_record_id(self, record, record_id):
+        """保存自动查找到的记录ID"""
+        key = self.identity_key(record)
+        with self._lock:
+            if self.record_ids.get(key) != str(record_id):
+                self.record_ids[key] = str(record_id)
+                self.save()
+
+    def remove_record_id(self, record):
+        """记录已不存在时从索引中删除，下次同步时重新查找"""
+        with self._lock:
+            if self.record_ids.pop(self.identity_key(record), None) is not None:
+                self.save()
+
+    def mark_verified(self, timestamp):
+        """记录一次完整核对的时间"""
+        with self._lock:
+            self.last_verification_time = timestamp
+            self.save()
@@ -0,0 +1,205 @@
+import os
+import time
+import socket
+import struct
+import logging
+import ipaddress
+
+# STUN 消息类型（RFC 5389）
+BINDING_REQUEST = 0x0001
+BINDING_RESPONSE = 0x0101
+
+# 固定的 magic cookie，同时用于 XOR-MAPPED-ADDRESS 的异或
+MAGIC_COOKIE = 0x2112A442
+
+# 属性类型：旧版服务器只返回 MAPPED-ADDRESS，0x8020 为部分服务器使用的早期草案编号
+ATTR_MAPPED_ADDRESS = 0x0001
+ATTR_XOR_MAPPED_ADDRESS = 0x0020
+ATTR_XOR_MAPPED_ADDRESS_DRAFT = 0x8020
+
+# 属性中的地址族编号
+ADDRESS_FAMILY_IPV4 = 0x01
+ADDRESS_FAMILY_IPV6 = 0x02
+
+DEFAULT_PORT = 3478
+
+HEADER = struct.Struct('!HHI12s')
+
+
+def parse_server(spec):
+    """
+    解析 STUN 服务器地址
+
+    Args:
+        spec: host、host:port、IPv6 字面量或 [IPv6]:port
+
+    Returns:
+        tuple: (主机, 端口)
+    """
+    spec = spec.strip()
+    if spec.startswith('['):
+        host, _, rest = spec[1:].partition(']')
+        return host, int(rest[1:]) if rest.startswith(':') else DEFAULT_PORT
+    if spec.count(':') == 1:
+        host, port = spec.split(':')
+        return host, int(port)
+    return spec, DEFAULT_PORT
+
+
+def build_binding_request(transaction_id):
+    """构造不带属性的 Binding 请求"""
+    return HEADER.pack(BINDING_REQUEST, 0, MAGIC_COOKIE, transaction_id)
+
+
+def _decode_address(value, transaction_id, xor):
+    """解码 (XOR-)MAPPED-ADDRESS 属性值，返回 (地址, 端口)"""
+    if len(value) < 4:
+        return None
+    family, port = struct.unpack('!xBH', value[:4])
+    raw = value[4:]
+    if family == ADDRESS_FAMILY_IPV4 and len(raw) >= 4:
+        raw, mask = raw[:4], struct.pack('!I', MAGIC_COOKIE)
+    elif family == ADDRESS_FAMILY_IPV6 and len(raw) >= 16:
+        raw, mask = raw[:16], struct.pack('!I', MAGIC_COOKIE) + transaction_id
+    else:
+        return None
+    if xor:
+        port ^= MAGIC_COOKIE >> 16
+        raw = bytes(a ^ b for a, b in zip(raw, mask))
+    return str(ipaddress.ip_address(raw)), port
+
+
+def parse_binding_response(data, transaction_id):
+    """
+    解析 Binding 成功响应
+
+    Args:
+        data: 收到的数据报
+        transaction_id: 对应请求的事务ID
+
+    Returns:
+        tuple: (映射地址, 映射端口)，不是该请求的成功响应或没有地址属性时返回 None
+    """
+    if len(data) < HEADER.size:
+        return None
+    message_type, length, cookie, tid = HEADER.unpack_from(data)
+    if message_type != BINDING_RESPONSE or cookie != MAGIC_COOKIE or tid != transaction_id:
+        return None
+
+    mapped = None
+    offset = HEADER.size
+    end = min(len(data), HEADER.size + length)
+    while offset + 4 <= end:
+        attr_type, attr_length = struct.unpack_from('!HH', data, offset)
+        value = data[offset + 4:offset + 4 + attr_length]
+        if attr_type in (ATTR_XOR_MAPPED_ADDRESS, ATTR_XOR_MAPPED_ADDRESS_DRAFT):
+            address = _decode_address(value, transaction_id, xor=True)
+            if address:
+                return address
+        elif attr_type == ATTR_MAPPED_ADDRESS and mapped is None:
+            mapped = _decode_address(value, transaction_id, xor=False)
+        # 属性按 4 字节对齐
+        offset += 4 + (attr_length + 3) // 4 * 4
+    return mapped
+
+
+class StunClient:
+    """
+    STUN Binding 客户端
+
+    从同一个 UDP 套接字同时向所有服务器发送 Binding 请求，一个往返即可得到各服务器看到的
+    映射地址和端口；使用同一个本地端口，才能通过比较映射端口判断 NAT 是否为对称型。
+    """
+
+    def __init__(self, servers, timeout=2.0, rto=0.5, resolve_ttl=300):
+        """
+        初始化客户端
+
+        Args:
+            servers: 服务器地址列表，格式见 parse_server
+            timeout: 单次查询的总超时时间(秒)
+            rto: 首次重传的等待时间(秒)，之后每次加倍
+            resolve_ttl: 服务器域名解析结果的缓存时间(秒)
+        """
+        self.servers = list(servers)
+        self.timeout = timeout
+        self.rto = rto
+        self.resolve_ttl = resolve_ttl
+        self._resolved = {}
+
+    def _resolve(self, server, family):
+        """解析服务器地址，结果缓存 resolve_ttl 秒"""
+        now = time.monotonic()
+        cached = self._resolved.get((server, family))
+        if cached and cached[0] > now:
+            return cached[1]
+        host, port = parse_server(server)
+        af = socket.AF_INET6 if family == 6 else socket.AF_INET
+        try:
+            sockaddr = socket.getaddrinfo(host, port, af, socket.SOCK_DGRAM)[0][4]
+        except (OSError, IndexError) as e:
+            logging.warning(f"STUN服务器 {server} 没有可用的IPv{family}地址: {e}")
+            sockaddr = None
+        self._resolved[(server, family)] = (now + self.resolve_ttl, sockaddr)
+        return sockaddr
+
+    def query(self, family=4):
+        """
+        并发查询所有服务器
+
+        Args:
+            family: 地址族，4 或 6
+
+        Returns:
+            dict: 服务器 -> (映射地址, 映射端口)，只包含在超时前响应的服务器
+        """
+        pending = {}
+        for server in self.servers:
+            sockaddr = self._resolve(server, family)
+            if sockaddr is not None:
+                pending[os.urandom(12)] = (server, sockaddr)
+        if not pending:
+            return {}
+
+        results = {}
+        sock = socket.socket(socket.AF_INET6 if family == 6 else socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            start = time.monotonic()
+            deadline = start + self.timeout
+            rto = self.rto
+            next_send = start
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                if now >= next_send:
+                    # UDP 可能丢包，未响应的服务器按 RTO 重传，重传使用相同的事务ID
+                    for transaction_id, (server, sockaddr) in pending.items():
+                        try:
+                            sock.sendto(build_binding_request(transaction_id), sockaddr)
+                        except OSError as e:
+                            logging.debug(f"向STUN服务器 {server} 发送请求失败: {e}")
+                    next_send = now + rto
+                    rto *= 2
+                sock.settimeout(max(0.001, min(next_send, deadline) - now))
+                try:
+                    data, _ = sock.recvfrom(2048)
+                except (socket.timeout, OSError):
+                    continue
+                for transaction_id in list(pending):
+                    address = parse_binding_response(data, transaction_id)
+                    if address is not None:
+                        server, _ = pending.pop(transaction_id)
+                        results[server] = address
+                        if len(results) == 1:
+                            # 第一个响应到达后，其余服务器只再等待同等量级的时间，
+                            # 不可达的服务器不会把查询拖到总超时
+                            elapsed = time.monotonic() - start
+                            deadline = min(deadline, time.monotonic() + max(0.1, 2 * elapsed))
+                        break
+        finally:
+            sock.close()
+
+        for server, _ in pending.values():
+            logging.debug(f"STUN服务器 {server} 未在超时前响应")
+        return results
@@ -0,0 +1,157 @@
+"""
+轻量 DNSPod API 客户端
+
+自行实现 TC3-HMAC-SHA256 签名，只依赖标准库和 requests，不导入腾讯云 SDK，
+适合一次性运行（cron）或内存受限的容器。接口与 SDK 客户端的适配层一致：
+call(action, params) 返回支持属性访问的响应对象，错误时抛出 DnspodAPIError。
+"""
+
+import json
+import hmac
+import time
+import hashlib
+from datetime import datetime, timezone
+
+import requests
+
+# DNSPod API 的服务名和版本
+SERVICE = "dnspod"
+API_VERSION = "2021-03-23"
+CONTENT_TYPE = "application/json"
+
+
+class DnspodAPIError(Exception):
+    """DNSPod API 返回的错误，SDK 和轻量客户端统一使用该异常"""
+
+    def __init__(self, code, message, request_id=None):
+        super().__init__(f"[{code}] {message}" + (f" (RequestId: {request_id})" if request_id else ""))
+        self.code = code
+        self.message = message
+        self.request_id = request_id
+
+    def get_code(self):
+        return self.code
+
+
+class ApiObject:
+    """JSON 响应的属性访问包装，不存在的字段返回 None，与 SDK 模型的行为一致"""
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _wrap(self._data.get(name))
+
+    def __repr__(self):
+        return f"ApiObject({self._data!r})"
+
+
+def _wrap(value):
+    if isinstance(value, dict):
+        return ApiObject(value)
+    if isinstance(value, list):
+        return [_wrap(v) for v in value]
+    return value
+
+
+def _hmac_sha256(key, msg):
+    return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).digest()
+
+
+def sign_request(secret_id, secret_key, host, action, payload, timestamp, service=SERVICE, version=API_VERSION):
+    """
+    生成 TC3-HMAC-SHA256 签名的请求头
+
+    Args:
+        secret_id: 访问密钥 ID
+        secret_key: 访问密钥
+        host: 接入点域名
+        action: API 名称
+        payload: 请求体（bytes）
+        timestamp: 请求时间戳(秒)
+        service: 服务名
+        version: API 版本
+
+    Returns:
+        dict: 包含 Authorization 在内的请求头
+    """
+    date = datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d')
+    canonical_headers = f"content-type:{CONTENT_TYPE}\nhost:{host}\n"
+    signed_headers = "content-type;host"
+    canonical_request = "\n".join([
+        "POST", "/", "", canonical_headers, signed_headers, hashlib.sha256(payload).hexdigest()
+    ])
+    scope = f"{date}/{service}/tc3_request"
+    string_to_sign = "\n".join([
+        "TC3-HMAC-SHA256", str(timestamp), scope,
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+    ])
+    secret_date = _hmac_sha256(("TC3" + secret_key).encode('utf-8'), date)
+    secret_service = _hmac_sha256(secret_date, service)
+    secret_signing = _hmac_sha256(secret_service, "tc3_request")
+    signature = hmac.new(secret_signing, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+    return {
+        "Authorization": (f"TC3-HMAC-SHA256 Credential={secret_id}/{scope}, "
+                          f"SignedHeaders={signed_headers}, Signature={signature}"),
+        "Content-Type": CONTENT_TYPE,
+        "Host": host,
+        "X-TC-Action": action,
+        "X-TC-Timestamp": str(timestamp),
+        "X-TC-Version": version,
+    }
+
+
+class LiteDnspodClient:
+    """自行签名的 DNSPod API 客户端"""
+
+    def __init__(self, secret_id, secret_key, endpoint, request=None, timeout=60):
+        """
+        初始化客户端
+
+        Args:
+            secret_id: 访问密钥 ID
+            secret_key: 访问密钥
+            endpoint: 接入点，可带 http:// 或 https:// 前缀，默认 https
+            request: 发送请求的函数 (method, url, body, headers) -> Response，默认使用 requests.request
+            timeout: 默认发送函数的超时时间(秒)
+        """
+        self.secret_id = secret_id
+        self.secret_key = secret_key
+        scheme, _, host = endpoint.rpartition('://')
+        self.host = host
+        self.url = f"{scheme or 'https'}://{host}/"
+        self.timeout = timeout
+        self.request = request or self._default_request
+
+    def _default_request(self, method, url, body=None, headers=None):
+        return requests.request(method, url, data=body, headers=headers, timeout=self.timeout)
+
+    def call(self, action, params):
+        """
+        调用 API
+
+        Args:
+            action: API 名称，例如 DescribeRecordList
+            params: 请求参数字典
+
+        Returns:
+            ApiObject: 响应中 Response 字段的内容
+        """
+        payload = json.dumps(params).encode('utf-8')
+        headers = sign_request(self.secret_id, self.secret_key, self.host, action, payload, int(time.time()))
+        try:
+            response = self.request("POST", self.url, body=payload, headers=headers)
+        except requests.RequestException as e:
+            raise DnspodAPIError("ClientNetworkError", str(e)) from e
+        if response.status_code != 200:
+            raise DnspodAPIError("ServerNetworkError", f"HTTP {response.status_code}: {response.text[:200]}")
+        try:
+            data = response.json()["Response"]
+        except (ValueError, KeyError) as e:
+            raise DnspodAPIError("ServerNetworkError", f"无法解析响应: {e}") from e
+        error = data.get("Error")
+        if error:
+            raise DnspodAPIError(error.get("Code"), error.get("Message"), data.get("RequestId"))
+        return ApiObject(data)
@@ -0,0 +1,95 @@
+import time
+import threading
+
+class VerificationQueue:
+    """待验证队列，记录修改后需要在指定时间核对的记录，由主循环在到期时处理"""
+
+    def __init__(self, wait_time=10, max_attempts=3, clock=time.monotonic):
+        """
+        初始化待验证队列
+
+        Args:
+            wait_time: 修改后到首次验证、以及两次验证之间的间隔(秒)
+            max_attempts: 最大验证次数
+            clock: 单调时钟函数
+        """
+        self.wait_time = wait_time
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self._items = []
+        self._lock = threading.Lock()
+
+    def add(self, domain, changes, requested_at):
+        """
+        添加一组待验证记录
+
+        Args:
+            domain: 主域名
+            changes: (记录配置, 期望值) 列表
+            requested_at: 发起修改时的时间戳，用于通知内容
+        """
+        if not changes:
+            return
+        with self._lock:
+            self._items.append({
+                'domain': domain,
+                'changes': list(changes),
+                'attempt': 0,
+                'due': self.clock() + self.wait_time,
+                'requested_at': requested_at,
+            })
+
+    def pop_due(self):
+        """取出所有已到期的待验证项"""
+        now = self.clock()
+        with self._lock:
+            due = [item for item in self._items if item['due'] <= now]
+            self._items = [item for item in self._items if item['due'] > now]
+        return due
+
+    def clear(self):
+        """丢弃全部待验证项"""
+        with self._lock:
+            self._items = []
+
+    def reschedule(self, item, remaining):
+        """
+        将尚未验证成功的记录放回队列
+
+        Args:
+            item: 待验证项
+            remaining: 仍需验证的 (记录配置, 期望值) 列表
+
+        Returns:
+            bool: 是否还有剩余尝试次数并已放回队列
+        """
+        item['attempt'] += 1
+        if item['attempt'] >= self.max_attempts:
+            return False
+        item['changes'] = list(remaining)
+        item['due'] = self.clock() + self.wait_time
+        with self._lock:
+            self._items.append(item)
+        return True
+
+    def defer(self, item):
+        """将取出但暂时不能处理的待验证项放回队列，等待 wait_time（至少 1 秒）后再处理，不计入尝试次数"""
+        item['due'] = self.clock() + max(self.wait_time, 1)
+        with self._lock:
+            self._items.append(item)
+
+    def next_due(self):
+        """返回最早的到期时间，队列为空时返回 None"""
+        with self._lock:
+            return min((item['due'] for item in self._items), default=None)
+
+    def is_pending(self, record):
+        """记录是否正在等待验证"""
+        record_id = str(record['record_id'])
+        with self._lock:
+            return any(str(r['record_id']) == record_id
+                       for item in self._items for r, _ in item['changes'])
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
@@ -1,11 +1,39 @@
+import sys
 import time
+import signal
+import asyncio
 import logging
 
 # 导入自定义模块
 from core.config import ConfigManager
 from core.ip_utils import IPFetcher
-from core.dns_api import DNSUpdater
+from core.dns_api import DNSUpdater, configure_rate_limit
 from core.notification import NotificationManager
+from core.state import StateCache
+from core.netlink import NetlinkWatcher
+from core.scheduler import PollScheduler
+from core.damping import FlapDamper
+from core.engine import AsyncEngine
+from core.verification import VerificationQueue
+from core.dns_probe import PropagationProbe
+from core.metrics import MetricsServer
+from core.aggregator import Aggregator, send_report
+from core.lease import LeaderLease
+from core import metrics
+
+# 各组件依赖的配置项，配置重新加载后只更新相关配置项发生变化的组件
+NOTIFICATION_FIELDS = {'notification_async', 'notification_queue_size', 'notification_digest_window', 'notification_max_retries'}
+IP_FETCHER_FIELDS = {'ip_fetch_mode', 'ip_quorum', 'ip_interface', 'stun_servers', 'gateway_protocols', 'gateway_addr',
+                     'provider_health_file'}
+VERIFICATION_FIELDS = {'verification_interval', 'verify_wait_time', 'verify_max_attempts'}
+PROBE_FIELDS = {'propagation_probe', 'probe_resolvers', 'probe_max_wait'}
+SCHEDULER_FIELDS = {'update_interval', 'fast_check_interval', 'fast_check_window', 'max_backoff_interval', 'poll_jitter'}
+NETLINK_FIELDS = {'netlink_watch', 'netlink_interface'}
+METRICS_FIELDS = {'metrics_port', 'metrics_addr'}
+DNSPOD_FIELDS = {'dnspod_rate_limit', 'dnspod_rate_burst', 'dnspod_max_retries', 'dnspod_batch_update'}
+AGGREGATOR_FIELDS = {'ddns_mode', 'aggregator_addr', 'aggregator_port', 'aggregator_secret', 'aggregator_agents',
+                     'aggregator_flush_interval'}
+LEASE_FIELDS = {'ha_lease_file', 'ha_lease_ttl', 'ha_node_id'}
 
 # 配置日志
 logging.basicConfig(
@@ -17,12 +45,28 @@ logging.basicConfig(
 class DDNS:
     """DDNS主类，用于协调各个组件完成DDNS更新工作"""
 
-    def __init__(self):
-        """初始化DDNS更新器"""
-        self.config_manager = ConfigManager()
+    def __init__(self, config_manager=None):
+        """
+        初始化DDNS更新器
+        
+        Args:
+            config_manager: 配置管理器，默认读取项目目录下的 .env
+        """
+        self.config_manager = config_manager or ConfigManager()
         self.ip_fetcher = IPFetcher()
         self.notification_manager = None  # 初始化为None，等配置加载后再创建
         self.dns_updater = None  # 初始化为None，等配置加载后再创建
+        self.state_cache = None  # 本地状态缓存，等配置加载后再创建
+        self.netlink_watcher = None  # 网络变化监听器，按配置启用
+        self.scheduler = PollScheduler()  # 轮询调度器，按配置更新参数
+        self.damper = FlapDamper()  # 公网IP抖动抑制，按配置设置稳定窗口
+        self.last_public_ips = {}  # 上一周期获取到的公网IP，用于判断IP是否变化
+        self.verification_queue = VerificationQueue()  # 修改后等待验证的记录
+        self.propagation_probe = None  # DNS生效探测器，按配置启用
+        self.metrics_server = None  # 指标接口，按配置启用
+        self.aggregator = None  # 汇聚服务，仅 server 模式启用
+        self.lease = None  # 主备模式的租约，按配置启用
+        self.leading = None  # 上一周期是否为主节点，用于在身份切换时输出日志和重置状态
         
         # 配置初始状态变量
         self.update_verified = False  # 跟踪上次成功更新是否已验证
@@ -30,13 +74,163 @@ class DDNS:
         self.last_verification_time = 0
 
     def initialize_components(self):
-        """初始化依赖组件"""
-        # 加载配置
-        config = self.config_manager.load_config()
-        if config:
-            # 配置加载成功，创建其他组件
-            self.notification_manager = NotificationManager(self.config_manager)
+        """初始化依赖组件，配置文件未变化时直接复用现有组件"""
+        # 仅在 .env 文件变化时重新加载配置
+        config, changed = self.config_manager.reload_if_changed()
+        if not config:
+            return False
+        # DNSUpdater 长期复用，底层客户端在凭证变化时才会重建
+        if self.dns_updater is None:
             self.dns_updater = DNSUpdater(self.config_manager)
+        if changed:
+            self.apply_config(config, changed)
+        return True
+
+    def apply_config(self, config, changed):
+        """
+        按变化的配置项更新组件，只重建依赖这些配置项的组件，其余组件及其运行状态保持不变
+        
+        Args:
+            config: 新配置
+            changed: 发生变化的配置项集合
+        """
+        if self.notification_manager is None or changed & NOTIFICATION_FIELDS:
+            previous = self.notification_manager
+            self.notification_manager = NotificationManager(
+                self.config_manager,
+                async_mode=config['notification_async'],
+                queue_size=config['notification_queue_size'],
+                digest_window=config['notification_digest_window'],
+                max_retries=config['notification_max_retries']
+            )
+            if previous is not None:
+                # 保留错误邮件频率限制状态，旧队列中的通知由其后台线程发送完，不阻塞本周期
+                self.notification_manager.last_error_times.update(previous.last_error_times)
+                previous.stop(wait=False)
+        if changed & IP_FETCHER_FIELDS:
+            self.ip_fetcher.mode = config['ip_fetch_mode']
+            self.ip_fetcher.quorum = config['ip_quorum']
+            self.ip_fetcher.set_interface(config['ip_interface'])
+            self.ip_fetcher.set_gateway(config['gateway_protocols'], config['gateway_addr'])
+            self.ip_fetcher.set_stun_servers(config['stun_servers'])
+            self.ip_fetcher.set_health_file(config['provider_health_file'])
+            self.ip_fetcher.check_quorum(self.config_manager.get_required_families())
+        if changed & VERIFICATION_FIELDS:
+            self.verification_interval = config['verification_interval']
+            self.verification_queue.wait_time = config['verify_wait_time']
+            self.verification_queue.max_attempts = config['verify_max_attempts']
+        if changed & PROBE_FIELDS:
+            if config['propagation_probe']:
+                if self.propagation_probe is None:
+                    self.propagation_probe = PropagationProbe()
+                self.propagation_probe.set_resolvers(config['probe_resolvers'])
+                self.propagation_probe.max_wait = config['probe_max_wait']
+            elif self.propagation_probe is not None:
+                self.propagation_probe.close()
+                self.propagation_probe = None
+        if 'ip_stable_window' in changed:
+            self.damper.window = config['ip_stable_window']
+        if changed & SCHEDULER_FIELDS:
+            self.scheduler.configure(
+                base_interval=config['update_interval'],
+                fast_interval=config['fast_check_interval'],
+                fast_window=config['fast_check_window'],
+                max_backoff=config['max_backoff_interval'],
+                jitter=config['poll_jitter']
+            )
+        if self.state_cache is None or 'state_file' in changed:
+            self.state_cache = StateCache(config['state_file'])
+            self.last_verification_time = self.state_cache.last_verification_time
+        if changed & NETLINK_FIELDS:
+            if self.netlink_watcher is not None:
+                self.netlink_watcher.stop()
+                self.netlink_watcher = None
+            if config['netlink_watch']:
+                self.start_netlink_watcher(config.get('netlink_interface'))
+        if changed & DNSPOD_FIELDS:
+            configure_rate_limit(config['dnspod_rate_limit'], config['dnspod_rate_burst'])
+            self.dns_updater.max_retries = config['dnspod_max_retries']
+            self.dns_updater.batch_update = config['dnspod_batch_update']
+        if changed & LEASE_FIELDS:
+            if self.lease is not None:
+                self.lease.stop()
+                self.lease = None
+            if config['ha_lease_file']:
+                self.lease = LeaderLease(config['ha_lease_file'], config['ha_node_id'], ttl=config['ha_lease_ttl'])
+                self.lease.start()
+        if changed & AGGREGATOR_FIELDS:
+            if self.aggregator is not None:
+                self.aggregator.stop()
+                self.aggregator = None
+            # 备用节点不启动汇聚服务，成为主节点后由 run_mode_cycle 启动
+            if config['ddns_mode'] == 'server' and (self.lease is None or self.lease.is_leader()):
+                self.start_aggregator(config)
+        if self.aggregator is not None and 'verification_interval' in changed:
+            self.aggregator.verification_interval = config['verification_interval']
+        if self.aggregator is not None and 'state_file' in changed:
+            self.aggregator.state_cache = self.state_cache
+        if changed & METRICS_FIELDS:
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+                self.metrics_server = None
+            if config['metrics_port']:
+                self.start_metrics_server(config['metrics_addr'], config['metrics_port'])
+
+    def start_netlink_watcher(self, interface):
+        """启动网络变化监听，失败时回退到定时轮询"""
+        if not NetlinkWatcher.is_supported():
+            logging.warning("当前平台不支持 netlink，网络变化监听未启用，仅使用定时轮询")
+            return
+        try:
+            watcher = NetlinkWatcher(interface=interface)
+            watcher.start()
+            self.netlink_watcher = watcher
+        except OSError as e:
+            logging.warning(f"网络变化监听启动失败，仅使用定时轮询: {e}")
+
+    def start_aggregator(self, config):
+        """启动汇聚服务，修改失败时通过通知管理器发送错误邮件"""
+        def on_failure(record, ip):
+            domain_name = self.config_manager.get_record_name(record)
+            self.notification_manager.send_error_notification(
+                f"DDNS API更新请求失败: {domain_name}",
+                f"汇聚服务更新域名 {domain_name} 到 {ip} 的API请求失败。请检查腾讯云后台和脚本日志。",
+                time.time(),
+                error_type='dns_update'
+            )
+
+        aggregator = Aggregator(self.config_manager, self.dns_updater, config['aggregator_secret'],
+                                flush_interval=config['aggregator_flush_interval'],
+                                verification_interval=config['verification_interval'],
+                                on_failure=on_failure, agents=config['aggregator_agents'],
+                                state_cache=self.state_cache)
+        try:
+            aggregator.start(config['aggregator_addr'], config['aggregator_port'])
+            self.aggregator = aggregator
+        except OSError as e:
+            logging.error(f"汇聚服务启动失败: {e}")
+
+    def start_metrics_server(self, host, port):
+        """启动指标接口，失败时不影响DDNS更新"""
+        try:
+            server = MetricsServer(host, port)
+            server.start()
+            self.metrics_server = server
+        except OSError as e:
+            logging.warning(f"指标接口启动失败: {e}")
+
+    def wait_for_next_cycle(self, wait_time):
+        """
+        等待下一个周期，启用网络变化监听时可被地址或默认路由变化提前唤醒
+        
+        Returns:
+            bool: 是否因网络变化提前唤醒
+        """
+        if self.netlink_watcher is None:
+            time.sleep(wait_time)
+            return False
+        if self.netlink_watcher.wait(wait_time):
+            logging.info("检测到网络变化，立即执行DDNS更新")
             return True
         return False
 
@@ -67,116 +261,617 @@ class DDNS:
                 
             return 60  # 返回等待时间
 
-    def run(self):
-        """运行DDNS服务的主循环"""
-        config = None  # 在循环外初始化config，以便finally块中可用
+    def update_zone(self, domain, records, public_ips, current_time):
+        """
+        同步一个域名（zone）下的配置记录
+        
+        Args:
+            domain: 主域名
+            records: 该域名下需要核对的记录配置列表
+            public_ips: 地址族 -> 当前公网 IP，A 记录使用 IPv4，AAAA 记录使用 IPv6
+            current_time: 当前时间戳
+            
+        Returns:
+            bool: 是否成功获取到该域名的记录列表
+        """
+        # 单条记录时按子域名过滤，减小响应体积；多条记录时一次取回整个 zone
+        record_types = {r['record_type'] for r in records}
+        record_type = record_types.pop() if len(record_types) == 1 else None
+        subdomain = records[0]['subdomain'] if len(records) == 1 else None
+        zone_records = self.dns_updater.get_zone_records(domain, record_type=record_type, subdomain=subdomain)
+        if zone_records is None:
+            # 查询失败时缓存不再可信
+            for record in records:
+                self.state_cache.invalidate(record)
 
-        while True:
-            try:
-                logging.info("开始执行DDNS更新")
-                
-                # 初始化/重新初始化组件
-                if not self.initialize_components():
-                    wait_time = self.handle_config_load_failure(time.time())
-                    time.sleep(wait_time)
+        to_update = []
+        resolve_failed = False
+        for record in records:
+            domain_name = self.config_manager.get_record_name(record)
+            current_public_ip = public_ips[self.config_manager.get_record_family(record)]
+            if (zone_records is not None and record.get('auto_id')
+                    and str(record['record_id']) not in zone_records):
+                # 自动查找到的记录已被删除，索引失效，从本次取回的记录列表中重新查找
+                logging.warning(f"记录ID {record['record_id']} 已不存在: {domain_name}，重新查找")
+                self.state_cache.invalidate(record)
+                self.state_cache.remove_record_id(record)
+                record['record_id'] = ''
+                result = self.discover_record_id(record, zone_records, public_ips)
+                if result is None:
+                    resolve_failed = True
                     continue
-                
-                config = self.config_manager.get_config()
-                current_time = time.time()
-                current_public_ip = self.ip_fetcher.get_public_ip()
-
-                if not current_public_ip:
-                    logging.error("无法获取当前公网IP，跳过本次更新")
-                    domain_name = self.config_manager.get_full_domain()
-                    self.notification_manager.send_error_notification(
-                        f"DDNS IP获取失败: {domain_name}",
-                        f"DDNS服务在为域名 {domain_name} 获取公网IP时失败。请检查网络连接和IP查询服务。",
-                        current_time,
-                        error_type='ip_fetch'
-                    )
-                    time.sleep(config.get('update_interval', 60))
+                if result == 'created':
                     continue
+            current_dns_record = zone_records.get(str(record['record_id'])) if zone_records is not None else None
+            current_dns_ip = current_dns_record.get('value') if current_dns_record else None
 
-                domain_name = self.config_manager.get_full_domain()
-                record_updated_in_this_cycle = False
-                
-                # 获取当前DNS记录值
-                current_dns_record = self.dns_updater.get_current_dns_record()
-                current_dns_ip = current_dns_record.get('value') if current_dns_record else None
-                
-                if not current_dns_record:
-                    logging.warning(f"无法获取当前DNS记录值，将尝试更新到当前公网IP: {current_public_ip}")
-                    update_needed = True
-                else:
-                    logging.info(f"当前DNS记录值: {domain_name} -> {current_dns_ip}")
-                    update_needed = current_public_ip != current_dns_ip
-                    
-                if update_needed:
-                    logging.info(f"需要更新DNS记录: {domain_name} 从 {current_dns_ip or '未知'} 到 {current_public_ip}")
-                    update_success = self.dns_updater.update_dns_record(current_public_ip)
-                    
-                    if update_success:
-                        logging.info(f"腾讯云API报告DNS记录更新请求成功: {domain_name} -> {current_public_ip}")
-                        record_updated_in_this_cycle = True
-                        
-                        # 直接通过API验证更新是否成功
-                        self.update_verified = self.dns_updater.verify_dns_update(current_public_ip, max_attempts=3, wait_time=10)
-
-                        if self.update_verified:
-                            logging.info(f"验证成功: {domain_name} 已指向 {current_public_ip}")
-                            
-                            if config.get('smtp_receiver_email'):
-                                self.notification_manager.send_notification_email(
-                                    f"DDNS更新成功: {domain_name}", 
-                                    f"域名 {domain_name} 已成功更新并验证指向 {current_public_ip}。"
-                                )
-                            self.last_verification_time = current_time
-                        else:
-                            logging.warning(f"验证失败: {domain_name} 未能解析到 {current_public_ip} (在API成功后)")
-                            self.notification_manager.send_error_notification(
-                                f"DDNS验证失败: {domain_name}", 
-                                f"域名 {domain_name} 更新后未能验证指向 {current_public_ip}。请检查DNS状态。", 
-                                current_time,
-                                error_type='dns_verify'
-                            )
-                    else:
-                        logging.error(f"腾讯云API报告DNS记录更新请求失败: {domain_name} -> {current_public_ip}")
-                        self.notification_manager.send_error_notification(
-                            f"DDNS API更新请求失败: {domain_name}", 
-                            f"更新域名 {domain_name} 到 {current_public_ip} 的API请求失败。请检查腾讯云后台和脚本日志。", 
-                            current_time,
-                            error_type='dns_update'
-                        )
-                else:
-                    logging.info(f"当前DNS记录值与公网IP一致 ({current_public_ip}) for {domain_name}，跳过DNS更新")
-
-                logging.info("DDNS更新执行结束")
+            if not current_dns_record:
+                logging.warning(f"无法获取当前DNS记录值: {domain_name}，将尝试更新到当前公网IP: {current_public_ip}")
+            elif current_public_ip != current_dns_ip:
+                logging.info(f"当前DNS记录值: {domain_name} -> {current_dns_ip}")
+            else:
+                logging.info(f"当前DNS记录值与公网IP一致 ({current_public_ip}) for {domain_name}，跳过DNS更新")
+                self.state_cache.set(record, current_dns_ip, current_time)
+                continue
+
+            self.state_cache.invalidate(record)
+
+            logging.info(f"需要更新DNS记录: {domain_name} 从 {current_dns_ip or '未知'} 到 {current_public_ip}")
+            to_update.append((record, current_public_ip))
+
+        # 目标值相同的记录合并为一次批量修改
+        changed = []
+        for record, current_public_ip, updated in self.dns_updater.update_zone_records(domain, to_update):
+            domain_name = self.config_manager.get_record_name(record)
+            metrics.RECORD_UPDATES.inc(record_type=record['record_type'], result='success' if updated else 'failure')
+            if updated:
+                logging.info(f"腾讯云API报告DNS记录更新请求成功: {domain_name} -> {current_public_ip}")
+                changed.append((record, current_public_ip))
+            else:
+                logging.error(f"腾讯云API报告DNS记录更新请求失败: {domain_name} -> {current_public_ip}")
+                self.notification_manager.send_error_notification(
+                    f"DDNS API更新请求失败: {domain_name}", 
+                    f"更新域名 {domain_name} 到 {current_public_ip} 的API请求失败。请检查腾讯云后台和脚本日志。", 
+                    current_time,
+                    error_type='dns_update'
+                )
+
+        if not changed:
+            return zone_records is not None and not resolve_failed
+
+        # 验证不在此处阻塞等待，而是加入待验证队列，由主循环在到期时处理
+        self.verification_queue.add(domain, changed, current_time)
+        logging.info(f"{domain} 下 {len(changed)} 条记录已加入待验证队列，{self.verification_queue.wait_time} 秒后验证")
+        return not resolve_failed
+
+    def resolve_record_ids(self, public_ips, current_time):
+        """
+        为未配置记录ID的记录查找记录ID
+        
+        优先使用状态文件中的索引，索引中没有的记录每个域名只查询一次记录列表
+        
+        Args:
+            public_ips: 地址族 -> 当前公网 IP，自动创建记录时使用
+            current_time: 当前时间戳
             
-            except Exception as e:
-                logging.error(f"主循环发生未知错误：{e}", exc_info=True)  # 添加exc_info=True获取更详细的traceback
-                current_time = time.time()
+        Returns:
+            bool: 是否全部记录都已有记录ID
+        """
+        pending = {}
+        for record in self.config_manager.get_records():
+            if record['record_id']:
+                continue
+            record_id = self.state_cache.get_record_id(record)
+            if record_id:
+                record['record_id'] = record_id
+            else:
+                pending.setdefault(record['domain'], []).append(record)
+        if not pending:
+            return True
 
-                error_subject = "DDNS服务发生严重错误"
-                error_body = f"DDNS服务在主循环中遇到严重错误: {str(e)}。请检查日志获取详细的Traceback。"
-                
-                # 确定用于发送错误邮件的配置
-                if self.notification_manager:
-                    self.notification_manager.send_error_notification(
-                        error_subject, error_body, current_time, error_type='general'
+        unresolved = []
+        for domain, records in pending.items():
+            zone_records = self.dns_updater.get_zone_records(domain)
+            if zone_records is None:
+                logging.error(f"无法获取域名 {domain} 的记录列表，暂时无法查找记录ID")
+                unresolved.extend(records)
+                continue
+            unresolved.extend(r for r in records if self.discover_record_id(r, zone_records, public_ips) is None)
+
+        if unresolved:
+            names = ", ".join(f"{self.config_manager.get_record_name(r)} ({r['record_type']})" for r in unresolved)
+            self.notification_manager.send_error_notification(
+                f"DDNS记录ID查找失败: {names}",
+                f"未能找到以下记录的记录ID: {names}。请在DNSPod中创建记录、在配置中指定记录ID，或启用 AUTO_CREATE_RECORDS。",
+                current_time,
+                error_type='record_id'
+            )
+        return not unresolved
+
+    def discover_record_id(self, record, zone_records, public_ips):
+        """
+        在记录列表中查找记录ID并写入索引，未找到且启用了自动创建时创建记录
+        
+        Args:
+            record: 记录配置，查找成功后写入 record_id
+            zone_records: 该域名的记录列表
+            public_ips: 地址族 -> 当前公网 IP
+            
+        Returns:
+            str: 'found' 或 'created'，未找到时返回 None
+        """
+        domain_name = self.config_manager.get_record_name(record)
+        description = f"{domain_name} ({record['record_type']}, 线路: {record['record_line']})"
+        record_id = self.dns_updater.find_record_id(record, zone_records)
+        result = 'found'
+        if record_id is None:
+            ip = public_ips.get(self.config_manager.get_record_family(record))
+            if not self.config_manager.get_config().get('auto_create_records'):
+                logging.error(f"未找到记录: {description}")
+                return None
+            if not ip:
+                logging.warning(f"未找到记录: {description}，获取到公网IP后再创建")
+                return None
+            record_id = self.dns_updater.create_record(record, ip)
+            if record_id is None:
+                return None
+            logging.info(f"已创建DNS记录: {description} -> {ip} (记录ID: {record_id})")
+            result = 'created'
+        else:
+            logging.info(f"已找到记录ID: {description} -> {record_id}")
+
+        record['record_id'] = record_id
+        self.state_cache.set_record_id(record, record_id)
+        if result == 'created':
+            self.state_cache.set(record, ip, time.time())
+        return result
+
+    def report_verification(self, verified, failed, current_time):
+        """
+        输出验证结果并发送通知
+        
+        Args:
+            verified: 验证成功的 (记录配置, IP) 列表
+            failed: 最终验证失败的 (记录配置, IP) 列表
+            current_time: 当前时间戳
+        """
+        config = self.config_manager.get_config()
+        if verified and not failed:
+            self.update_verified = True
+        if failed:
+            self.update_verified = False
+
+        # 按目标 IP 分组输出结果，A 和 AAAA 记录分别汇总
+        for ip in dict.fromkeys(ip for _, ip in verified + failed):
+            verified_records = [r for r, target in verified if target == ip]
+            failed_records = [r for r, target in failed if target == ip]
+
+            if verified_records:
+                names = ", ".join(self.config_manager.get_record_name(r) for r in verified_records)
+                logging.info(f"验证成功: {names} 已指向 {ip}")
+                for record in verified_records:
+                    self.state_cache.set(record, ip, current_time)
+                    if self.propagation_probe:
+                        self.propagation_probe.probe_in_background(
+                            self.config_manager.get_record_name(record), record['record_type'], ip,
+                            zone=record['domain'])
+                if config.get('smtp_receiver_email'):
+                    self.notification_manager.notify(
+                        f"DDNS更新成功: {names}", 
+                        f"域名 {names} 已成功更新并验证指向 {ip}。"
                     )
-                else:
-                    # 尝试使用临时配置发送错误通知
-                    self.handle_config_load_failure(current_time)
 
-            finally:
+            if failed_records:
+                names = ", ".join(self.config_manager.get_record_name(r) for r in failed_records)
+                logging.warning(f"验证失败: {names} 未能解析到 {ip} (在API成功后)")
+                self.notification_manager.send_error_notification(
+                    f"DDNS验证失败: {names}", 
+                    f"域名 {names} 更新后未能验证指向 {ip}。请检查DNS状态。", 
+                    current_time,
+                    error_type='dns_verify'
+                )
+
+    def check_leadership(self):
+        """
+        主备模式下判断本节点是否可以执行本周期，身份切换时重置相关状态
+
+        Returns:
+            bool: 未启用主备模式或本节点为主节点时返回 True
+        """
+        if self.lease is None:
+            return True
+        leader = self.lease.is_leader()
+        if leader and self.leading is False:
+            # 备用期间本地缓存可能已过时，接管后完整核对一次全部记录
+            logging.info("已接管为主节点，本周期完整核对全部记录")
+            self.last_verification_time = 0
+        elif not leader and self.leading is not False:
+            logging.info(f"当前为备用节点（主节点: {self.lease.holder}），暂停IP获取和记录修改")
+            self.verification_queue.clear()
+            if self.aggregator is not None:
+                self.aggregator.stop()
+                self.aggregator = None
+        self.leading = leader
+        return leader
+
+    def is_standby(self):
+        """主备模式下本节点是否为备用节点"""
+        return self.lease is not None and not self.lease.is_leader()
+
+    def standby_delay(self):
+        """备用节点距下一次检查租约的等待时间(秒)"""
+        return self.lease.interval
+
+    def process_verifications(self):
+        """处理已到期的待验证记录，同一域名每次只查询一次记录列表"""
+        if self.is_standby():
+            return
+        for item in self.verification_queue.pop_due():
+            self.process_verification(item)
+
+    def process_verification(self, item):
+        """核对一个待验证项，未生效的记录放回队列，次数用尽时发送通知"""
+        try:
+            domain = item['domain']
+            attempt = item['attempt'] + 1
+            max_attempts = self.verification_queue.max_attempts
+            expected = {r['record_id']: ip for r, ip in item['changes']}
+            start = time.monotonic()
+            verified_ids = self.dns_updater.check_zone_update(domain, expected)
+            if verified_ids is None:
+                result = 'error'
+            else:
+                result = 'verified' if len(verified_ids) == len(expected) else 'pending'
+            metrics.VERIFICATION_SECONDS.observe(time.monotonic() - start, result=result)
+
+            if verified_ids is None:
+                logging.warning(f"无法获取域名 {domain} 的记录列表 (尝试 {attempt}/{max_attempts})")
+                verified_ids = set()
+            verified = [(r, ip) for r, ip in item['changes'] if str(r['record_id']) in verified_ids]
+            remaining = [(r, ip) for r, ip in item['changes'] if str(r['record_id']) not in verified_ids]
+            logging.info(f"API记录验证 (尝试 {attempt}/{max_attempts}): {domain} 已验证 {len(verified)} 条, 待验证 {len(remaining)} 条")
+
+            current_time = time.time()
+            self.report_verification(verified, [], current_time)
+            if remaining and not self.verification_queue.reschedule(item, remaining):
+                logging.error(f"DNS记录验证失败: {domain} 下 {len(remaining)} 条记录在 {max_attempts} 次尝试后仍未生效")
+                self.report_verification([], remaining, current_time)
+        except Exception as e:
+            logging.error(f"DNS记录验证过程发生错误: {e}", exc_info=True)
+
+    def fetch_public_ips(self, current_time):
+        """
+        获取配置记录所需地址族的公网IP，获取失败的地址族发送错误通知
+        
+        Returns:
+            tuple: (地址族 -> IP, 与上一周期相比是否变化)，全部获取失败时返回 (None, False)
+        """
+        # 按记录类型并发获取所需地址族的公网IP（A 记录需要 IPv4，AAAA 记录需要 IPv6）
+        public_ips = self.ip_fetcher.get_public_ips(self.config_manager.get_required_families())
+
+        if not any(public_ips.values()):
+            logging.error("无法获取当前公网IP，跳过本次更新")
+            domain_name = self.config_manager.get_full_domain()
+            self.notification_manager.send_error_notification(
+                f"DDNS IP获取失败: {domain_name}",
+                f"DDNS服务在为域名 {domain_name} 获取公网IP时失败。请检查网络连接和IP查询服务。",
+                current_time,
+                error_type='ip_fetch'
+            )
+            return None, False
+
+        # 与上一周期相比公网IP发生变化时，调度器会在一段时间内加快轮询
+        ip_changed = any(
+            ip and self.last_public_ips.get(family) and ip != self.last_public_ips[family]
+            for family, ip in public_ips.items()
+        )
+        self.last_public_ips.update({family: ip for family, ip in public_ips.items() if ip})
+        for family, ip in public_ips.items():
+            if ip:
+                metrics.set_public_ip(family, ip)
+        # 新地址未保持稳定前继续使用上一个已采用的地址，后续同步与缓存比较时不会产生修改
+        public_ips = self.damper.filter(public_ips, current_time)
+
+        for family, ip in public_ips.items():
+            if not ip:
+                # 单个地址族失败时仍然更新另一个地址族的记录
+                logging.error(f"无法获取当前公网IPv{family}，跳过对应记录的更新")
+                domain_name = self.config_manager.get_full_domain()
+                self.notification_manager.send_error_notification(
+                    f"DDNS IPv{family}获取失败: {domain_name}",
+                    f"DDNS服务在为域名 {domain_name} 获取公网IPv{family}时失败。请检查网络连接和IP查询服务。",
+                    current_time,
+                    error_type='ip_fetch'
+                )
+        return public_ips, ip_changed
+
+    def push_reports(self):
+        """
+        上报节点模式：获取公网IP后上报给汇聚服务，由汇聚服务统一修改记录
+        
+        每个周期都会上报全部记录，汇聚服务重启后可由下一次上报恢复状态，值未变化时服务端不会调用 API
+        
+        Returns:
+            bool: 本周期是否成功
+        """
+        current_time = time.time()
+        public_ips, ip_changed = self.fetch_public_ips(current_time)
+        if public_ips is None:
+            return False
+
+        reports = []
+        for record in self.config_manager.get_records():
+            ip = public_ips.get(self.config_manager.get_record_family(record))
+            if ip:
+                reports.append({'name': self.config_manager.get_record_name(record),
+                                'type': record['record_type'], 'ip': ip})
+        config = self.config_manager.get_config()
+        result = send_report(config['aggregator_url'], config['aggregator_secret'], reports,
+                             agent=config['aggregator_agent'])
+        if result is None:
+            self.notification_manager.send_error_notification(
+                "DDNS 上报失败",
+                f"向汇聚服务 {config['aggregator_url']} 上报IP失败，请检查网络和汇聚服务状态。",
+                current_time,
+                error_type='aggregator'
+            )
+            return False
+        if result.get('unknown'):
+            logging.warning(f"汇聚服务未配置以下记录: {', '.join(result['unknown'])}")
+        logging.info(f"已上报 {len(reports)} 条记录，其中 {result.get('accepted', 0)} 条等待修改")
+
+        succeeded = len(reports) == len(self.config_manager.get_records()) and not result.get('unknown')
+        if succeeded:
+            self.scheduler.record_success(changed=ip_changed)
+        return succeeded
+
+    def sync_records(self):
+        """
+        获取公网IP并同步全部记录
+        
+        Returns:
+            bool: 本周期是否成功（IP获取和API查询均无失败）
+        """
+        current_time = time.time()
+        public_ips, ip_changed = self.fetch_public_ips(current_time)
+        if public_ips is None:
+            return False
+
+        full_check, plan, all_zones_checked = self.plan_sync(public_ips, current_time)
+        for domain, pending in plan:
+            if not self.update_zone(domain, pending, public_ips, current_time):
+                all_zones_checked = False
+        return self.finish_sync(full_check, all_zones_checked, bool(plan), ip_changed, current_time)
+
+    def plan_sync(self, public_ips, current_time):
+        """
+        确定本周期需要查询API的域名和记录
+        
+        Args:
+            public_ips: 地址族 -> 当前公网 IP
+            current_time: 当前时间戳
+            
+        Returns:
+            tuple: (是否完整核对, [(域名, 需要核对的记录列表)], 是否全部记录都可以处理)
+        """
+        # 距上次完整核对超过 verification_interval 时，忽略缓存查询全部记录
+        full_check = (current_time - self.last_verification_time) >= self.verification_interval
+        all_ready = self.resolve_record_ids(public_ips, current_time)
+
+        # 每个域名（zone）只查询一次记录列表，仅修改不一致的记录
+        # 每条记录按自身地址族与缓存比较，IPv6 前缀变化不会触发 A 记录的查询和修改
+        plan = []
+        for domain, records in self.config_manager.get_records_by_zone().items():
+            pending = []
+            for record in records:
+                ip = public_ips.get(self.config_manager.get_record_family(record))
+                if not ip or not record['record_id']:
+                    all_ready = False
+                    continue
+                if self.verification_queue.is_pending(record):
+                    # 已修改、正在等待验证的记录不重复处理
+                    continue
+                if full_check or not self.state_cache.matches(record, ip):
+                    pending.append(record)
+            if not pending:
+                logging.info(f"公网IP与缓存的已验证记录值一致，跳过 {domain} 的API查询")
+                continue
+            plan.append((domain, pending))
+        return full_check, plan, all_ready
+
+    def finish_sync(self, full_check, all_zones_checked, api_queried, ip_changed, current_time):
+        """
+        记录同步结果，更新完整核对时间和调度状态
+        
+        Returns:
+            bool: 本周期是否成功
+        """
+        if not api_queried:
+            metrics.CYCLES_SKIPPED.inc()
+
+        if full_check and all_zones_checked:
+            self.last_verification_time = current_time
+            self.state_cache.mark_verified(current_time)
+
+        # IP获取或API查询存在失败时按故障处理，进入退避
+        if all_zones_checked:
+            self.scheduler.record_success(changed=ip_changed)
+
+        stats = self.dns_updater.get_connection_stats()
+        logging.info(f"DNSPod连接统计: 请求 {stats['requests']} 次, 新建连接 {stats['handshakes']} 次, 复用连接 {stats['reused']} 次")
+        return all_zones_checked
+
+    def run_mode_cycle(self):
+        """
+        按运行模式执行本周期的工作（组件已初始化）
+        
+        Returns:
+            bool: 本周期是否成功
+        """
+        config = self.config_manager.get_config()
+        mode = config['ddns_mode']
+        if mode == 'server':
+            # 记录由汇聚服务按上报修改，主循环只负责重新加载配置、调度和重启失败的汇聚服务
+            if self.aggregator is None:
+                self.start_aggregator(config)
+            if self.aggregator is None:
+                return False
+            self.scheduler.record_success()
+            return True
+        if mode == 'agent':
+            return self.push_reports()
+        return self.sync_records()
+
+    def run_cycle(self):
+        """
+        执行一次DDNS更新周期
+        
+        Returns:
+            float: 距下一周期开始需要等待的时间(秒)
+        """
+        # 以周期开始时的单调时钟为基准计算下一周期，周期内的耗时不会累加到间隔上
+        cycle_start = time.monotonic()
+        cycle_succeeded = False
+
+        try:
+            logging.info("开始执行DDNS更新")
+            
+            # 初始化/重新初始化组件
+            if not self.initialize_components():
+                self.record_cycle_metrics(cycle_start, False)
+                # 配置加载失败时使用固定的重试等待时间
+                return self.handle_config_load_failure(time.time())
+
+            if not self.check_leadership():
+                return self.standby_delay()
+
+            cycle_succeeded = self.run_mode_cycle()
+            logging.info("DDNS更新执行结束")
+        
+        except Exception as e:
+            self.handle_cycle_error(e)
+
+        return self.finish_cycle(cycle_start, cycle_succeeded)
+
+    def handle_cycle_error(self, e):
+        """记录周期中未处理的异常并发送通知"""
+        logging.error(f"主循环发生未知错误：{e}", exc_info=True)  # 添加exc_info=True获取更详细的traceback
+        current_time = time.time()
+
+        error_subject = "DDNS服务发生严重错误"
+        error_body = f"DDNS服务在主循环中遇到严重错误: {str(e)}。请检查日志获取详细的Traceback。"
+        
+        # 确定用于发送错误邮件的配置
+        if self.notification_manager:
+            self.notification_manager.send_error_notification(
+                error_subject, error_body, current_time, error_type='general'
+            )
+        else:
+            # 尝试使用临时配置发送错误通知
+            self.handle_config_load_failure(current_time)
+
+    def finish_cycle(self, cycle_start, succeeded):
+        """
+        记录周期指标并计算下一周期的等待时间
+        
+        Returns:
+            float: 距下一周期开始需要等待的时间(秒)
+        """
+        self.record_cycle_metrics(cycle_start, succeeded)
+        if not succeeded:
+            self.scheduler.record_failure()
+        delay = self.scheduler.next_delay(cycle_start)
+        # 有等待稳定的新地址时，在稳定窗口结束时安排下一周期
+        pending = self.damper.pending_delay(time.time())
+        if pending is not None:
+            delay = min(delay, pending)
+        return delay
+
+    def record_cycle_metrics(self, cycle_start, succeeded):
+        """记录周期次数、耗时和最近一次成功的时间"""
+        result = 'success' if succeeded else 'failure'
+        metrics.CYCLES.inc(result=result)
+        metrics.CYCLE_SECONDS.observe(time.monotonic() - cycle_start, result=result)
+        if succeeded:
+            metrics.LAST_SUCCESS.set(time.time())
+
+    def run(self):
+        """运行DDNS服务，退出时释放主备租约，备用节点无需等待租约过期即可接管"""
+        try:
+            self.run_loop()
+        finally:
+            self.ip_fetcher.health.save(force=True)
+            if self.propagation_probe is not None:
+                self.propagation_probe.close()
+            if self.lease is not None:
+                self.lease.stop()
+
+    def run_engine(self, config, next_cycle_at=None):
+        """
+        按配置选择运行时，配置为 async 时交由 AsyncEngine 执行直到服务停止
+
+        Args:
+            config: 当前配置
+            next_cycle_at: AsyncEngine 首个周期的开始时间，为空时立即开始
+
+        Returns:
+            bool: 是否已由 AsyncEngine 运行（此时服务已停止），为 False 时由调用方继续同步循环
+        """
+        if config['ddns_engine'] != 'async':
+            logging.info("使用同步运行时 (DDNS_ENGINE=sync)")
+            return False
+        logging.info("使用 asyncio 运行时 (DDNS_ENGINE=async)")
+        engine = AsyncEngine(self, task_timeout=config['async_task_timeout'],
+                             max_workers=config['async_max_workers'])
+        try:
+            asyncio.run(engine.run(next_cycle_at))
+        except KeyboardInterrupt:
+            logging.info("DDNS服务已停止")
+        return True
+
+    def run_loop(self):
+        """
+        运行DDNS服务的主循环
+
+        运行时在配置首次加载成功后按 DDNS_ENGINE 选择；启动时配置加载失败，先以同步循环重试加载，
+        加载成功后再选择，配置为 async 时从同步循环切换到 AsyncEngine
+        """
+        engine_selected = self.initialize_components()
+        if engine_selected:
+            if self.run_engine(self.config_manager.get_config()):
+                return
+        else:
+            logging.warning("配置加载失败，暂以同步运行时重试，配置加载成功后再按 DDNS_ENGINE 选择运行时")
+
+        next_cycle_at = time.monotonic()
+
+        while True:
+            # 先处理到期的验证，验证等待期间不阻塞其他记录和后续周期
+            self.process_verifications()
+
+            if time.monotonic() >= next_cycle_at:
+                wait_time = self.run_cycle()
+                next_cycle_at = time.monotonic() + wait_time
                 config = self.config_manager.get_config()
-                wait_time = config.get('update_interval', 60) if config else 60  # 如果config加载失败，默认等待60s
-                logging.info(f"等待 {wait_time} 秒后下次更新")
-                time.sleep(wait_time)
+                if not engine_selected and config:
+                    engine_selected = True
+                    if self.run_engine(config, next_cycle_at):
+                        return
+                logging.info(f"等待 {wait_time:.0f} 秒后下次更新")
+
+            # 睡眠到下一周期或最早的待验证项到期
+            wake_at = next_cycle_at
+            next_due = self.verification_queue.next_due()
+            if next_due is not None:
+                wake_at = min(wake_at, next_due)
+            if self.wait_for_next_cycle(max(0.0, wake_at - time.monotonic())):
+                next_cycle_at = time.monotonic()
 
 
 def main():
     """主程序入口"""
+    # 容器停止时发送 SIGTERM，转为正常退出以便释放主备租约
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     try:
         ddns = DDNS()
         ddns.run()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试共用的 fixture
+
+本地 DNSPod API 和 IP 回显服务替身来自 benchmarks.fakes，不需要真实凭证。
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fakes import FakeNetwork, FakeIPService, FakeDnspodAPI, write_env
+from core.config import ConfigManager
+from ddns import DDNS
+
+
+@pytest.fixture(autouse=True)
+def isolated_environ(monkeypatch):
+    """配置写入的环境变量不影响其他测试"""
+    monkeypatch.setattr(os, 'environ', dict(os.environ))
+
+
+@pytest.fixture
+def network():
+    return FakeNetwork()
+
+
+@pytest.fixture
+def api():
+    api = FakeDnspodAPI()
+    yield api
+    api.close()
+
+
+@pytest.fixture
+def ip_service(network):
+    ip_service = FakeIPService(network)
+    yield ip_service
+    ip_service.close()
+
+
+@pytest.fixture
+def services(network, api, ip_service):
+    return network, api, ip_service
+
+
+@pytest.fixture
+def make_ddns(api, ip_service):
+    """
+    返回创建 DDNS 实例的函数，实例使用本地 DNSPod API 和 IP 回显服务
+
+    函数参数为 (目录, RECORDS, **其他配置项)，.env、状态文件和健康评分文件都写在该目录下；
+    记录修改后的验证不等待，调用 process_verifications 即可完成。
+    """
+    def make(path, records, **settings):
+        path.mkdir(exist_ok=True)
+        write_env(path / '.env', {
+            'TENCENT_SECRET_ID': 'id',
+            'TENCENT_SECRET_KEY': 'key',
+            'DNSPOD_ENDPOINT': api.endpoint,
+            'RECORDS': records,
+            'STATE_FILE': path / 'state.json',
+            'PROVIDER_HEALTH_FILE': path / 'providers.json',
+            'VERIFY_WAIT_TIME': 0,
+            'NOTIFICATION_ASYNC': 'false',
+            **settings,
+        })
+        ddns = DDNS(ConfigManager(str(path / '.env')))
+        ddns.ip_fetcher.ip_services = [ip_service.as_service()]
+        return ddns
+
+    return make
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试汇聚服务：签名校验、上报合并和批量提交，以及上报节点模式
+
+使用 benchmarks.fakes 中的本地 DNSPod API 和 IP 回显服务替身，不需要真实凭证。
+"""
+
+import os
+import sys
+import json
+import time
+import http.client
+
+import pytest
+import requests
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.aggregator import MAX_BODY_SIZE, Aggregator, send_report, sign_report
+from core.config import ConfigManager
+from core.dns_api import DNSUpdater
+from core.state import StateCache
+
+SECRET = 'shared-secret'
+
+
+@pytest.fixture
+def aggregator(api):
+    records = []
+    for domain, subdomain in [('a.example', 'site1'), ('a.example', 'site2'), ('b.example', 'site3')]:
+        record_id = api.add_record(domain, subdomain, value='198.51.100.1')
+        records.append(f"{domain},{subdomain},A,默认,{record_id}")
+    config_manager = ConfigManager()
+    config_manager.config = {'secret_id': 'id', 'secret_key': 'key', 'dnspod_endpoint': api.endpoint,
+                             'records': ConfigManager.parse_records(';'.join(records))}
+    # 提交间隔设得很长，由测试手动调用 flush
+    aggregator = Aggregator(config_manager, DNSUpdater(config_manager), SECRET, flush_interval=3600)
+    aggregator.start('127.0.0.1', 0)
+    yield aggregator
+    aggregator.stop()
+
+
+def report(name, ip):
+    return {'name': name, 'ip': ip}
+
+
+def post(aggregator, body, secret=SECRET, agent='', timestamp=None):
+    """发送已签名的原始请求体"""
+    timestamp = timestamp or str(int(time.time()))
+    headers = {'X-DDNS-Timestamp': timestamp, 'X-DDNS-Signature': sign_report(secret, timestamp, body, agent)}
+    if agent:
+        headers['X-DDNS-Agent'] = agent
+    return requests.post(f"http://127.0.0.1:{aggregator.port}/report", data=body, headers=headers)
+
+
+def test_rejects_invalid_signature(aggregator):
+    """签名错误或时间戳过期的上报被拒绝"""
+    url = f"http://127.0.0.1:{aggregator.port}/report"
+    body = json.dumps({'reports': [report('site1.a.example', '203.0.113.1')]}).encode()
+    response = requests.post(url, data=body, headers={'X-DDNS-Timestamp': str(int(time.time())),
+                                                      'X-DDNS-Signature': sign_report('wrong', '0', body)})
+    assert response.status_code == 401
+
+    stale = str(int(time.time()) - 3600)
+    response = requests.post(url, data=body, headers={'X-DDNS-Timestamp': stale,
+                                                      'X-DDNS-Signature': sign_report(SECRET, stale, body)})
+    assert response.status_code == 401
+    assert not aggregator.desired
+
+
+def test_rejects_replayed_report(aggregator):
+    """同一请求重放、或时间戳早于已接受请求的上报被拒绝"""
+    body = json.dumps({'reports': [report('site1.a.example', '203.0.113.1')]}).encode()
+    now = str(int(time.time()))
+    first = post(aggregator, body, agent='edge-1', timestamp=now)
+    assert first.status_code == 200
+    headers = {'X-DDNS-Timestamp': now, 'X-DDNS-Agent': 'edge-1',
+               'X-DDNS-Signature': sign_report(SECRET, now, body, 'edge-1')}
+    replay = requests.post(f"http://127.0.0.1:{aggregator.port}/report", data=body, headers=headers)
+    assert replay.status_code == 401
+
+    # 同一秒内内容不同的上报可以接受，更早的时间戳不能覆盖较新的上报
+    other = json.dumps({'reports': [report('site1.a.example', '203.0.113.2')]}).encode()
+    assert post(aggregator, other, agent='edge-1', timestamp=now).status_code == 200
+    older = json.dumps({'reports': [report('site1.a.example', '203.0.113.3')]}).encode()
+    assert post(aggregator, older, agent='edge-1', timestamp=str(int(now) - 10)).status_code == 401
+    assert aggregator.desired['site1.a.example|A']['ip'] == '203.0.113.2'
+
+    # 节点名参与签名，不能把请求改成其他节点发出的
+    headers['X-DDNS-Agent'] = 'edge-2'
+    assert requests.post(f"http://127.0.0.1:{aggregator.port}/report", data=other,
+                         headers=headers).status_code == 401
+
+
+def test_rejects_bad_content_length(aggregator):
+    """缺少、非数字或为负数的 Content-Length 立即被拒绝，不读取请求体"""
+    for length, status in [(None, 411), ('abc', 400), ('-1', 400), (str(MAX_BODY_SIZE + 1), 413)]:
+        conn = http.client.HTTPConnection('127.0.0.1', aggregator.port, timeout=5)
+        try:
+            conn.putrequest('POST', '/report', skip_accept_encoding=True)
+            if length is not None:
+                conn.putheader('Content-Length', length)
+            conn.endheaders()
+            assert conn.getresponse().status == status, length
+        finally:
+            conn.close()
+    assert not aggregator.desired
+
+
+def test_rejects_malformed_body(aggregator):
+    """格式错误的上报返回 400，整批不生效"""
+    payloads = [
+        b'not json',
+        b'[]',
+        b'{"reports": {"name": "site1.a.example"}}',
+        b'{"reports": [["site1.a.example", "203.0.113.1"]]}',
+        b'{"reports": [{"name": 1, "ip": "203.0.113.1"}]}',
+        b'{"reports": [{"name": "site1.a.example", "ip": ["203.0.113.1"]}]}',
+        b'{"reports": [{"name": "site1.a.example", "ip": "203.0.113.300"}]}',
+        b'{"reports": [{"name": "site1.a.example", "ip": "203.0.113.1", "type": "AAAA"}]}',
+        b'{"reports": [{"name": "site1.a.example", "ip": "203.0.113.1", "type": 4}]}',
+    ]
+    for payload in payloads:
+        assert post(aggregator, payload).status_code == 400, payload
+    assert not aggregator.desired
+
+
+def test_per_agent_secrets_and_records(api, aggregator):
+    """配置了节点时每个节点使用自己的密钥，只能上报允许的域名"""
+    aggregator.agents = ConfigManager.parse_aggregator_agents(
+        "edge-1,secret-1,site1.a.example;edge-2,secret-2")
+    body = json.dumps({'reports': [report('site1.a.example', '203.0.113.1')]}).encode()
+    assert post(aggregator, body, secret=SECRET, agent='edge-1').status_code == 401
+    assert post(aggregator, body, secret='secret-2', agent='edge-1').status_code == 401
+    assert post(aggregator, body, secret='secret-1', agent='unknown').status_code == 401
+    assert post(aggregator, body, secret='secret-1', agent='edge-1').status_code == 200
+
+    other = json.dumps({'reports': [report('site1.a.example', '203.0.113.1'),
+                                    report('site2.a.example', '203.0.113.1')]}).encode()
+    assert post(aggregator, other, secret='secret-1', agent='edge-1').status_code == 403
+    assert 'site2.a.example|A' not in aggregator.desired
+    assert post(aggregator, other, secret='secret-2', agent='edge-2').status_code == 200
+
+
+def test_flush_persists_record_ids(tmp_path, api):
+    """提交时查找到的记录ID写入状态缓存"""
+    record_id = api.add_record('a.example', 'site1', value='198.51.100.1')
+    config_manager = ConfigManager()
+    config_manager.config = {'secret_id': 'id', 'secret_key': 'key', 'dnspod_endpoint': api.endpoint,
+                             'records': ConfigManager.parse_records('a.example,site1,A,默认')}
+    state_cache = StateCache(str(tmp_path / 'state.json'))
+    aggregator = Aggregator(config_manager, DNSUpdater(config_manager), SECRET, state_cache=state_cache)
+    aggregator.submit([report('site1.a.example', '203.0.113.1')])
+    assert aggregator.flush() == 1
+    record = config_manager.get_records()[0]
+    assert StateCache(str(tmp_path / 'state.json')).get_record_id(record) == str(record_id)
+
+
+def test_reports_are_coalesced_into_batched_updates(api, aggregator):
+    """两次提交之间的多次上报只保留最新值，每个域名查询一次记录列表并批量修改"""
+    url = f"http://127.0.0.1:{aggregator.port}"
+    for ip in ('203.0.113.1', '203.0.113.2', '203.0.113.3'):
+        result = send_report(url, SECRET, [report('site1.a.example', ip), report('site2.a.example', ip),
+                                           report('site3.b.example', '203.0.113.9')], agent='edge-1')
+        assert result['accepted'] == 3
+    assert send_report(url, SECRET, [report('other.example', '203.0.113.1')])['unknown'] == ['other.example']
+
+    assert aggregator.flush() == 3
+    assert api.calls == {'DescribeRecordList': 2, 'ModifyRecordBatch': 1, 'ModifyDynamicDNS': 1}
+    assert {r['Value'] for r in api.zones['a.example'].values()} == {'203.0.113.3'}
+
+    # 与已写入的值一致的上报不产生任何 API 调用
+    api.reset_calls()
+    result = send_report(url, SECRET, [report('site1.a.example', '203.0.113.3')])
+    assert result == {'accepted': 0, 'unchanged': 1, 'unknown': []}
+    assert aggregator.flush() == 0
+    assert api.calls == {}
+
+
+def test_agent_mode_pushes_reports(tmp_path, services, make_ddns, aggregator):
+    """上报节点模式获取公网IP后上报给汇聚服务，不调用 DNSPod API"""
+    network, api, ip_service = services
+    ddns = make_ddns(tmp_path, 'a.example,site1,A,默认', DDNS_MODE='agent',
+                     AGGREGATOR_URL=f"http://127.0.0.1:{aggregator.port}", AGGREGATOR_SECRET=SECRET)
+    ddns.run_cycle()
+    assert aggregator.desired['site1.a.example|A']['ip'] == network.ips[4]
+    assert api.calls == {}
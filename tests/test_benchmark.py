@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+基准测试工具的冒烟测试：用本地替身服务跑几个完整周期，检查端到端行为和统计结果
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.bench_cycle import run_benchmark, compare, percentile
+
+
+def test_cycles_against_local_fakes():
+    """IP变化时每个域名查询一次并修改全部记录，未变化的周期不调用API，连接全程复用"""
+    result = run_benchmark(cycles=8, zones=2, records_per_zone=2, services=2, service_latency=0,
+                           service_jitter=0, failure_rate=0, api_latency=0, ip_change_every=4)
+    assert result['records_out_of_sync'] == 0
+    # 首个周期和第 4 个周期各修改 4 条记录（每个域名一次批量修改），每次修改后每个域名验证一次
+    assert result['api_calls_by_action'] == {'DescribeRecordList': 8, 'ModifyRecordBatch': 4}
+    assert result['api_connections'] == 1
+    assert result['emails'] > 0 and result['smtp_connections'] == 1
+    assert result['latency_ms']['p50'] <= result['latency_ms']['p99']
+
+
+def test_compare_detects_regressions():
+    """耗时超过阈值或API调用增加时报告退化"""
+    baseline = {'latency_ms': {'p50': 10, 'p90': 20, 'p99': 30},
+                'api_calls_per_cycle': 0.5, 'memory_kb': {'traced_peak': 400}}
+    same = {'latency_ms': {'p50': 11, 'p90': 20, 'p99': 30}, 'api_calls_per_cycle': 0.5,
+            'memory_kb': {'traced_peak': 410}, 'records_out_of_sync': 0}
+    assert compare(same, baseline, 0.2) == []
+    worse = dict(same, api_calls_per_cycle=1.0, latency_ms={'p50': 10, 'p90': 40, 'p99': 30})
+    assert len(compare(worse, baseline, 0.2)) == 2
+
+
+def test_percentile():
+    assert percentile([5, 1, 3, 2, 4], 50) == 3
+    assert percentile([5, 1, 3, 2, 4], 99) == 5
+    assert percentile([], 90) == 0.0
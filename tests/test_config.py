@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试配置加载和热重载
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.config import ConfigManager
+from ddns import DDNS
+
+BASE_ENV = """TENCENT_SECRET_ID=id
+TENCENT_SECRET_KEY=key
+RECORDS=example.com,home,A,默认,1001
+UPDATE_INTERVAL=60
+"""
+
+
+def write_env(path, content):
+    """写入 .env 并推进修改时间，避免同一时间戳内的两次写入无法区分"""
+    path.write_text(content, encoding='utf-8')
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_reload_only_when_file_changes(tmp_path):
+    """文件未变化时不重新解析，变化后只报告变化的配置项"""
+    env = tmp_path / '.env'
+    write_env(env, BASE_ENV)
+    manager = ConfigManager(str(env))
+
+    config, changed = manager.reload_if_changed()
+    assert config['update_interval'] == 60
+    assert 'update_interval' in changed and 'secret_id' in changed
+
+    assert manager.reload_if_changed() == (config, set())
+
+    write_env(env, BASE_ENV.replace('UPDATE_INTERVAL=60', 'UPDATE_INTERVAL=120'))
+    config, changed = manager.reload_if_changed()
+    assert config['update_interval'] == 120
+    assert changed == {'update_interval'}
+
+
+def test_removed_keys_fall_back_to_defaults(tmp_path):
+    """从 .env 删除的配置项恢复默认值，而不是保留上次加载的值"""
+    env = tmp_path / '.env'
+    write_env(env, BASE_ENV + "IP_FETCH_MODE=race\n")
+    manager = ConfigManager(str(env))
+    assert manager.reload_if_changed()[0]['ip_fetch_mode'] == 'race'
+
+    write_env(env, BASE_ENV)
+    config, changed = manager.reload_if_changed()
+    assert config['ip_fetch_mode'] == 'sequential'
+    assert 'IP_FETCH_MODE' not in os.environ
+    assert changed == {'ip_fetch_mode'}
+
+
+def test_invalid_config_is_not_reparsed(tmp_path):
+    """配置无效时保持失败状态直到文件被修复"""
+    env = tmp_path / '.env'
+    write_env(env, "TENCENT_SECRET_ID=id\n")
+    manager = ConfigManager(str(env))
+    assert manager.reload_if_changed() == (None, set())
+    assert manager.reload_if_changed() == (None, set())
+
+    write_env(env, BASE_ENV)
+    config, _ = manager.reload_if_changed()
+    assert config['records'][0]['record_id'] == '1001'
+
+
+def test_components_survive_unrelated_reload(tmp_path):
+    """无关配置变化不重建通知管理器，错误邮件频率限制状态得以保留"""
+    env = tmp_path / '.env'
+    write_env(env, BASE_ENV + "NOTIFICATION_ASYNC=false\n")
+    ddns = DDNS(ConfigManager(str(env)))
+    assert ddns.initialize_components()
+    notification_manager = ddns.notification_manager
+    notification_manager.last_error_times['ip_fetch'] = 12345
+
+    write_env(env, BASE_ENV.replace('UPDATE_INTERVAL=60', 'UPDATE_INTERVAL=300') + "NOTIFICATION_ASYNC=false\n")
+    assert ddns.initialize_components()
+    assert ddns.notification_manager is notification_manager
+    assert ddns.scheduler.base_interval == 300
+
+    # 通知相关配置变化时重建，但频率限制状态会被带到新的实例
+    write_env(env, BASE_ENV + "NOTIFICATION_ASYNC=false\nNOTIFICATION_MAX_RETRIES=5\n")
+    assert ddns.initialize_components()
+    assert ddns.notification_manager is not notification_manager
+    assert ddns.notification_manager.max_retries == 5
+    assert ddns.notification_manager.last_error_times['ip_fetch'] == 12345
+
+
+def test_record_id_is_optional():
+    """记录ID可省略或写为 auto，由服务自动查找"""
+    records = ConfigManager.parse_records("example.com,home,A,默认;example.com,home,AAAA,默认,auto;"
+                                          "example.com,www,A,默认,1001")
+    assert [(r['record_id'], r['auto_id']) for r in records] == [('', True), ('', True), ('1001', False)]
+    assert ConfigManager.parse_records("example.com,home,A") is None
+
+
+def test_records_across_zones(tmp_path):
+    """RECORDS 中的多条记录按域名分组，分号和换行都可以分隔记录"""
+    env = tmp_path / '.env'
+    write_env(env, "TENCENT_SECRET_ID=id\nTENCENT_SECRET_KEY=key\n"
+                   "RECORDS=\"a.example,www,A,默认,1;b.example,@,A,电信,2\na.example,home,AAAA,默认,3\"\n")
+    manager = ConfigManager(str(env))
+    assert manager.load_config()
+    zones = manager.get_records_by_zone()
+    assert list(zones) == ['a.example', 'b.example']
+    assert [(r['subdomain'], r['record_type'], r['record_id']) for r in zones['a.example']] == \
+        [('www', 'A', '1'), ('home', 'AAAA', '3')]
+    assert zones['b.example'][0]['record_line'] == '电信'
+    assert manager.get_record_name(zones['b.example'][0]) == 'b.example'
+    assert manager.get_required_families() == {4, 6}
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试公网IP抖动抑制
+"""
+
+import os
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import metrics
+from core.damping import FlapDamper
+
+A, B, C = '203.0.113.1', '203.0.113.2', '203.0.113.3'
+
+
+def test_first_address_is_applied_immediately():
+    damper = FlapDamper(window=60)
+    assert damper.filter({4: A}, 0) == {4: A}
+    assert damper.pending_delay(0) is None
+
+
+def test_bounce_is_collapsed():
+    """窗口内 A→B→A→C→A 的变化全部被忽略，不产生任何修改"""
+    damper = FlapDamper(window=60)
+    before = metrics.IP_CHANGES_SUPPRESSED.get(family=4)
+    damper.filter({4: A}, 0)
+    for now, ip in [(10, B), (20, A), (30, C), (40, A), (50, B), (55, A)]:
+        assert damper.filter({4: ip}, now) == {4: A}
+    assert damper.suppressed == 3
+    assert metrics.IP_CHANGES_SUPPRESSED.get(family=4) == before + 3
+
+
+def test_stable_change_is_applied_after_window():
+    """新地址持续出现满一个窗口后被采用，获取失败不影响计时"""
+    damper = FlapDamper(window=60)
+    damper.filter({4: A, 6: '2001:db8::1'}, 0)
+    assert damper.filter({4: B, 6: '2001:db8::1'}, 100) == {4: A, 6: '2001:db8::1'}
+    assert damper.pending_delay(130) == 30
+    assert damper.filter({4: None, 6: '2001:db8::1'}, 140) == {4: None, 6: '2001:db8::1'}
+    assert damper.filter({4: B, 6: '2001:db8::1'}, 160) == {4: B, 6: '2001:db8::1'}
+    assert damper.suppressed == 0
+    assert damper.pending_delay(160) is None
+
+
+def test_disabled_window_passes_through():
+    damper = FlapDamper(window=0)
+    for now, ip in enumerate([A, B, A]):
+        assert damper.filter({4: ip}, now) == {4: ip}
+    assert damper.suppressed == 0
+
+
+def test_expired_window_schedules_next_cycle_immediately(tmp_path, make_ddns):
+    """稳定窗口已经结束的候选地址在下一周期立即采用，不再等待一个轮询间隔"""
+    ddns = make_ddns(tmp_path, "example.com,home,A,默认,1", POLL_JITTER=0)
+    ddns.damper.window = 60
+    ddns.damper.filter({4: A}, 0)
+    ddns.damper.filter({4: B}, 100)
+    assert ddns.finish_cycle(time.monotonic(), True) == 0
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试 DNSPod API 的分页、限流和重试，以及多个域名的同步
+
+使用 benchmarks.fakes 中的本地 DNSPod API 替身，不需要真实凭证。
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fakes import FakeDnspodAPI
+from core.config import ConfigManager
+from core.dns_api import DNSUpdater, is_retryable_error, is_rejected_error, get_connection_stats
+from core.rate_limit import TokenBucket
+
+
+class FakeClock:
+    """sleep 时推进时间的时钟"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_burst_then_rate():
+    """桶满时允许突发，之后按设定速率放行"""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock, sleep=clock.sleep)
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.acquire() == pytest.approx(0.5)
+    clock.now += 10
+    # 空闲期间积累的令牌不超过容量
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_token_bucket_disabled():
+    """速率为 0 时不限流"""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0, capacity=1, clock=clock, sleep=clock.sleep)
+    assert all(bucket.acquire() == 0 for _ in range(100))
+
+
+def test_retryable_error_codes():
+    assert is_retryable_error('RequestLimitExceeded')
+    assert is_retryable_error('RequestLimitExceeded.UinLimitExceeded')
+    assert is_retryable_error('InternalError')
+    assert is_retryable_error('ServerNetworkError')
+    assert not is_retryable_error('AuthFailure.SignatureFailure')
+    assert not is_retryable_error('InvalidParameter.DomainInvalid')
+    assert not is_retryable_error('RequestLimitExceededFoo')
+    assert not is_retryable_error(None)
+
+
+def make_updater(api, max_retries=3):
+    config_manager = ConfigManager()
+    config_manager.config = {'secret_id': 'id', 'secret_key': 'key', 'dnspod_endpoint': api.endpoint}
+    return DNSUpdater(config_manager, max_retries=max_retries, retry_delay=0.01)
+
+
+@pytest.mark.parametrize('client', ['sdk', 'lite'])
+def test_client_and_connection_reused(api, client):
+    """多次调用复用同一客户端和同一条长连接，凭证或接入点变化后重建客户端，统计不丢失"""
+    api.add_record('example.com', 'home')
+    updater = make_updater(api)
+    updater.config_manager.config['dnspod_client'] = client
+    before = get_connection_stats()
+
+    first = updater.get_client()
+    for _ in range(5):
+        assert updater.get_zone_records('example.com')
+    assert updater.get_client() is first
+    assert api.connections == 1
+    stats = get_connection_stats()
+    assert stats['handshakes'] - before['handshakes'] == 1
+    assert stats['reused'] - before['reused'] == 4
+
+    # 凭证变化：重建客户端并新建连接，旧连接池的统计保留
+    updater.config_manager.config['secret_key'] = 'rotated'
+    rotated = updater.get_client()
+    assert rotated is not first
+    assert updater.get_zone_records('example.com')
+    assert updater.get_client() is rotated
+    assert api.connections == 2
+    stats = get_connection_stats()
+    assert stats['handshakes'] - before['handshakes'] == 2
+    assert stats['requests'] - before['requests'] == 6
+
+    # 接入点变化：使用另一个接入点的客户端
+    other = FakeDnspodAPI()
+    try:
+        other.add_record('example.com', 'home')
+        updater.config_manager.config['dnspod_endpoint'] = other.endpoint
+        assert updater.get_client() is not rotated
+        assert updater.get_zone_records('example.com')
+        assert other.connections == 1 and api.connections == 2
+    finally:
+        other.close()
+
+
+def test_retry_on_rate_limit(api):
+    """限频错误重试后成功"""
+    record_id = api.add_record('example.com', 'home', value='198.51.100.1')
+    record = {'domain': 'example.com', 'subdomain': 'home', 'record_type': 'A',
+              'record_line': '默认', 'record_id': record_id}
+    api.inject_errors('RequestLimitExceeded', 'RequestLimitExceeded.UinLimitExceeded')
+    assert make_updater(api).update_dns_record('203.0.113.1', record=record)
+    assert api.calls == {'ModifyDynamicDNS': 3}
+    assert api.get_value('example.com', record_id) == '203.0.113.1'
+
+
+def test_no_retry_on_permanent_error(api):
+    """参数、鉴权等错误不重试"""
+    api.add_record('example.com', 'home')
+    api.inject_errors('AuthFailure.SignatureFailure')
+    assert make_updater(api).get_zone_records('example.com') is None
+    assert api.calls == {'DescribeRecordList': 1}
+
+
+def test_retry_gives_up(api):
+    """超过最大重试次数后放弃"""
+    api.add_record('example.com', 'home')
+    api.inject_errors(*['InternalError'] * 5)
+    assert make_updater(api, max_retries=2).get_zone_records('example.com') is None
+    assert api.calls == {'DescribeRecordList': 3}
+
+
+def test_create_record_is_not_blindly_retried(api):
+    """CreateRecord 限频时直接重试；服务端错误时先查询记录列表，已创建的记录不会重复创建"""
+    assert is_rejected_error('RequestLimitExceeded.UinLimitExceeded')
+    assert not is_rejected_error('InternalError')
+    api.add_record('example.com', 'www')
+    record = {'domain': 'example.com', 'subdomain': 'home', 'record_type': 'A',
+              'record_line': '默认', 'record_id': ''}
+    updater = make_updater(api)
+
+    api.inject_errors('RequestLimitExceeded')
+    first = updater.create_record(record, '203.0.113.1')
+    assert api.calls == {'CreateRecord': 2}
+
+    # 请求已处理但响应丢失：查询到已创建的记录，不再重试
+    api.reset_calls()
+    api.remove_record('example.com', first)
+    api.lose_responses('CreateRecord')
+    second = updater.create_record(record, '203.0.113.1')
+    assert api.calls == {'CreateRecord': 1, 'DescribeRecordList': 1}
+    assert [r['Name'] for r in api.zones['example.com'].values()].count('home') == 1
+    assert api.get_value('example.com', second) == '203.0.113.1'
+
+    # 请求未被处理：确认记录不存在后再重试
+    api.reset_calls()
+    api.remove_record('example.com', second)
+    api.inject_errors('InternalError')
+    third = updater.create_record(record, '203.0.113.1')
+    assert third is not None
+    assert api.calls == {'CreateRecord': 2, 'DescribeRecordList': 1}
+    assert [r['Name'] for r in api.zones['example.com'].values()].count('home') == 1
+
+
+def test_zone_records_are_paged(api):
+    """记录数超过单页上限时按 Offset 翻页取回全部记录"""
+    records = add_records(api, 5)
+    updater = make_updater(api)
+    updater.PAGE_LIMIT = 2
+    zone_records = updater.get_zone_records('example.com')
+    assert sorted(zone_records) == sorted(str(r['record_id']) for r in records)
+    assert api.calls == {'DescribeRecordList': 3}
+
+
+def test_zones_are_synced_independently(tmp_path, services, make_ddns):
+    """每个域名只查询一次记录列表，只修改值不一致的记录，一个域名失败不影响其他域名"""
+    network, api, ip_service = services
+    stale = api.add_record('a.example', 'home', value='198.51.100.1')
+    current = api.add_record('b.example', 'home', value=network.ips[4])
+    ddns = make_ddns(tmp_path, f"a.example,home,A,默认,{stale};b.example,home,A,默认,{current};"
+                               f"missing.example,home,A,默认,9999")
+    ddns.run_cycle()
+    # b.example 的记录值已一致，不修改；missing.example 查询失败时仍尝试修改一次
+    assert api.calls == {'DescribeRecordList': 3, 'ModifyDynamicDNS': 2}
+    assert api.get_value('a.example', stale) == network.ips[4]
+    assert ddns.state_cache.matches(ddns.config_manager.get_records()[1], network.ips[4])
+    # 不存在的域名使本周期按失败处理
+    assert ddns.scheduler.consecutive_failures == 1
+
+
+def test_ipv6_change_leaves_a_records(tmp_path, services, make_ddns):
+    """双栈记录中只有 IPv6 地址变化时，只修改 AAAA 记录，A 记录及其缓存项不变"""
+    network, api, ip_service = services
+    a = api.add_record('example.com', 'home', value='198.51.100.1')
+    aaaa = api.add_record('example.com', 'home', record_type='AAAA', value='2001:db8::1')
+    ddns = make_ddns(tmp_path, f"example.com,home,A,默认,{a};example.com,home,AAAA,默认,{aaaa}",
+                     VERIFICATION_INTERVAL=3600)
+    ddns.ip_fetcher.ipv6_services = [{'name': 'fake-v6', 'fetch': lambda family: network.ips[6]}]
+    ddns.run_cycle()
+    ddns.process_verifications()
+    a_record, aaaa_record = ddns.config_manager.get_records()
+    a_entry = dict(ddns.state_cache.get(a_record))
+
+    api.reset_calls()
+    network.rotate(6)
+    ddns.run_cycle()
+    ddns.process_verifications()
+    assert api.get_value('example.com', a) == network.ips[4]
+    assert api.get_value('example.com', aaaa) == network.ips[6]
+    assert api.calls.get('ModifyDynamicDNS', 0) + api.calls.get('ModifyRecord', 0) == 1
+    assert ddns.state_cache.get(a_record) == a_entry
+    assert ddns.state_cache.matches(aaaa_record, network.ips[6])
+
+
+def add_records(api, count, domain='example.com', record_type='A'):
+    return [{'domain': domain, 'subdomain': f'host{i}', 'record_type': record_type, 'record_line': '默认',
+             'record_id': api.add_record(domain, f'host{i}', record_type=record_type)}
+            for i in range(count)]
+
+
+def test_batch_update_groups_by_value(api):
+    """目标值相同的多条记录合并为一次批量修改，单条记录使用 ModifyDynamicDNS"""
+    records = add_records(api, 3)
+    aaaa = add_records(api, 1, record_type='AAAA')
+    changes = [(r, '203.0.113.5') for r in records] + [(aaaa[0], '2001:db8::5')]
+    results = make_updater(api).update_zone_records('example.com', changes)
+    assert [ok for _, _, ok in results] == [True] * 4
+    assert [r for r, _, _ in results] == [r for r, _ in changes]
+    assert api.calls == {'ModifyRecordBatch': 1, 'ModifyDynamicDNS': 1}
+    assert all(api.get_value('example.com', r['record_id']) == '203.0.113.5' for r in records)
+
+
+def test_fallback_when_batch_and_dynamic_unavailable(api):
+    """批量接口和 ModifyDynamicDNS 不可用时回退到逐条 ModifyRecord，之后不再尝试"""
+    api.disabled_actions = {'ModifyRecordBatch', 'ModifyDynamicDNS'}
+    records = add_records(api, 2)
+    updater = make_updater(api)
+    results = updater.update_zone_records('example.com', [(r, '203.0.113.6') for r in records])
+    assert all(ok for _, _, ok in results)
+    assert api.calls == {'ModifyRecordBatch': 1, 'ModifyDynamicDNS': 1, 'ModifyRecord': 2}
+    assert not updater.batch_update and not updater.dynamic_dns
+
+    api.reset_calls()
+    updater.update_zone_records('example.com', [(r, '203.0.113.7') for r in records])
+    assert api.calls == {'ModifyRecord': 2}
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试 DNS 生效探测模块
+
+使用本地 UDP 桩服务器模拟权威服务器和解析器，不访问外部网络。
+"""
+
+import os
+import sys
+import time
+import socket
+import struct
+import threading
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.dns_probe import (
+    QTYPE_A, QTYPE_AAAA, QTYPE_NS, DNS_HEADER,
+    build_query, parse_response, query, LatencyHistogram, PropagationProbe
+)
+
+
+class StubDNSServer:
+    """本地 DNS 桩服务器，按当前配置的记录值应答，可在指定时间后切换为新值"""
+
+    def __init__(self, answers, ns_names=None):
+        self.answers = dict(answers)        # {qtype: 地址}
+        self.ns_names = ns_names or []
+        self.switch_at = None
+        self.next_answers = None
+        self.queries = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.1)
+        self.address = self.sock.getsockname()
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def switch_after(self, seconds, answers):
+        self.next_answers = dict(answers)
+        self.switch_at = time.monotonic() + seconds
+
+    def _serve(self):
+        while self.running:
+            try:
+                data, peer = self.sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            self.queries += 1
+            if self.switch_at is not None and time.monotonic() >= self.switch_at:
+                self.answers = self.next_answers
+                self.switch_at = None
+            self.sock.sendto(self._answer(data), peer)
+
+    def _answer(self, data):
+        query_id = DNS_HEADER.unpack_from(data, 0)[0]
+        question_end = data.index(b'\x00', DNS_HEADER.size) + 5
+        qtype = struct.unpack_from('!H', data, question_end - 4)[0]
+        records = []
+        if qtype == QTYPE_NS:
+            for name in self.ns_names:
+                rdata = b''.join(bytes([len(l)]) + l.encode() for l in name.split('.')) + b'\x00'
+                records.append(rdata)
+        elif qtype in self.answers:
+            family = socket.AF_INET6 if qtype == QTYPE_AAAA else socket.AF_INET
+            records.append(socket.inet_pton(family, self.answers[qtype]))
+        # 回答中的名称使用指向问题部分的压缩指针
+        body = b''.join(b'\xc0\x0c' + struct.pack('!HHIH', qtype, 1, 60, len(r)) + r for r in records)
+        header = DNS_HEADER.pack(query_id, 0x8180, 1, len(records), 0, 0)
+        return header + data[DNS_HEADER.size:question_end] + body
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.sock.close()
+
+
+def test_query_roundtrip():
+    """构造的查询能被桩服务器解析，应答中的 A、AAAA 和 NS 记录能被正确解析"""
+    server = StubDNSServer({QTYPE_A: '203.0.113.5', QTYPE_AAAA: '2001:db8::5'},
+                           ns_names=['ns1.example.net', 'ns2.example.net'])
+    try:
+        assert query(server.address, 'home.example.com', QTYPE_A)['answers'] == [(QTYPE_A, '203.0.113.5')]
+        assert query(server.address, 'home.example.com', QTYPE_AAAA)['answers'] == [(QTYPE_AAAA, '2001:db8::5')]
+        ns = query(server.address, 'example.com', QTYPE_NS)['answers']
+        assert [value for _, value in ns] == ['ns1.example.net', 'ns2.example.net']
+    finally:
+        server.close()
+
+
+def test_build_query_layout():
+    """查询报文包含一个问题，关闭递归时不设置 RD 标志"""
+    query_id, packet = build_query('a.example.com', QTYPE_A, query_id=0x1234, recursion=False)
+    assert query_id == 0x1234
+    assert DNS_HEADER.unpack_from(packet, 0) == (0x1234, 0, 1, 0, 0, 0)
+    assert packet[DNS_HEADER.size:] == b'\x01a\x07example\x03com\x00\x00\x01\x00\x01'
+    assert parse_response(packet)['answers'] == []
+
+
+def test_query_timeout_returns_none():
+    """没有应答的服务器返回 None"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    try:
+        assert query(sock.getsockname(), 'example.com', QTYPE_A, timeout=0.2) is None
+    finally:
+        sock.close()
+
+
+def test_probe_records_time_to_propagation():
+    """已生效的服务器立即返回，延迟生效的服务器记录实际等待时间，始终未生效的记为 None"""
+    fresh = StubDNSServer({QTYPE_A: '203.0.113.9'})
+    lagging = StubDNSServer({QTYPE_A: '203.0.113.1'})
+    stale = StubDNSServer({QTYPE_A: '203.0.113.1'})
+    lagging.switch_after(0.5, {QTYPE_A: '203.0.113.9'})
+    try:
+        probe = PropagationProbe(include_authoritative=False, interval=0.1, max_wait=1.5, timeout=0.5)
+        results = probe.probe('home.example.com', 'A', '203.0.113.9',
+                              servers=[fresh.address, lagging.address, stale.address])
+        key = lambda server: f"{server.address[0]}:{server.address[1]}"
+        assert results[key(fresh)] < 0.3
+        assert 0.4 < results[key(lagging)] < 1.0
+        assert results[key(stale)] is None
+        assert probe.histogram.total == 2 and probe.histogram.timeouts == 1
+    finally:
+        for server in (fresh, lagging, stale):
+            server.close()
+
+
+def test_histogram_buckets():
+    """耗时落入对应的桶，超出最大桶的计入 +Inf"""
+    histogram = LatencyHistogram(buckets=(1, 10))
+    for seconds in (0.5, 3, 3, 42, None):
+        histogram.observe(seconds)
+    assert histogram.counts == [1, 2, 1]
+    assert histogram.timeouts == 1
+    assert '+Inf' in histogram.render()
+
+
+def test_probe_queries_authoritative_servers():
+    """通过解析器查到 NS 后，权威服务器也参与探测"""
+    server = StubDNSServer({QTYPE_A: '203.0.113.9'}, ns_names=['localhost'])
+    try:
+        port = server.address[1]
+        probe = PropagationProbe(resolvers=[server.address], interval=0.1, max_wait=1, timeout=0.5, port=port)
+        assert probe.find_authoritative_servers('example.com') == [('127.0.0.1', port)]
+        results = probe.probe('home.example.com', 'A', '203.0.113.9', zone='example.com')
+        # 解析器同时是权威服务器，只探测一次
+        assert list(results) == [f"127.0.0.1:{port}"]
+        assert results[f"127.0.0.1:{port}"] is not None
+    finally:
+        server.close()
+
+
+def test_background_probes_share_bounded_pool():
+    """后台探测共用有上限的线程池，同一记录的探测进行中时跳过相同值、取消旧值"""
+    server = StubDNSServer({QTYPE_A: '203.0.113.1'})
+    try:
+        probe = PropagationProbe(resolvers=[server.address], include_authoritative=False,
+                                 interval=0.05, max_wait=30, timeout=0.5, max_background=1)
+        first = probe.probe_in_background('home.example.com', 'A', '203.0.113.9')
+        assert probe.probe_in_background('home.example.com', 'A', '203.0.113.9') is None
+        # 记录值再次变化，旧的探测被取消，新的探测在唯一的工作线程空出后执行
+        second = probe.probe_in_background('home.example.com', 'A', '203.0.113.1')
+        second.result(timeout=5)
+        assert first.done()
+        assert probe.histogram.total == 1 and probe.histogram.timeouts == 0
+        assert list(probe.last_results['home.example.com'].values())[0] is not None
+
+        # 关闭时取消进行中的探测
+        pending = probe.probe_in_background('other.example.com', 'A', '203.0.113.9')
+        start = time.monotonic()
+        probe.close()
+        # 尚未开始的探测直接取消，已开始的在下一次查询后结束
+        while not pending.done() and time.monotonic() - start < 5:
+            time.sleep(0.01)
+        assert time.monotonic() - start < 2
+        assert probe.histogram.total == 1
+    finally:
+        server.close()
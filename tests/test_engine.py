@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试 asyncio 运行时：各域名并发同步，以及单个任务超时
+
+使用 benchmarks.fakes 中的本地 DNSPod API 和 IP 回显服务替身，不需要真实凭证。
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.engine import AsyncEngine
+
+ZONES = 4
+
+
+@pytest.fixture
+def make_zones_ddns(api, make_ddns):
+    """返回创建 DDNS 实例的函数，每个实例有 ZONES 个域名各一条新记录，API 每次请求延迟 0.2 秒"""
+    api.latency = 0.2
+
+    def make(path, **settings):
+        records = [f"zone{z}.example,home,A,默认,{api.add_record(f'zone{z}.example', 'home')}"
+                   for z in range(ZONES)]
+        return make_ddns(path, ';'.join(records), POLL_JITTER=0, **settings)
+
+    return make
+
+
+def timed_async_cycle(engine):
+    async def cycle():
+        try:
+            start = time.perf_counter()
+            await engine.run_cycle()
+            return time.perf_counter() - start
+        finally:
+            engine.close()
+    return asyncio.run(cycle())
+
+
+def test_zones_are_synced_concurrently(tmp_path, services, make_zones_ddns):
+    """每个域名查询并修改一次（各约 0.4 秒），并发执行时周期耗时接近单个域名而不是总和"""
+    network, api, ip_service = services
+    sync_ddns = make_zones_ddns(tmp_path / 'sync')
+    start = time.perf_counter()
+    assert sync_ddns.run_cycle()
+    sync_elapsed = time.perf_counter() - start
+
+    async_ddns = make_zones_ddns(tmp_path / 'async')
+    network.rotate()
+    engine = AsyncEngine(async_ddns)
+    async_elapsed = timed_async_cycle(engine)
+
+    assert async_elapsed < sync_elapsed / 2
+    assert async_ddns.scheduler.consecutive_failures == 0
+    assert all(api.get_value(f'zone{z}.example', r['record_id']) == network.ips[4]
+               for z, r in enumerate(async_ddns.config_manager.get_records()))
+
+
+def test_task_timeout_fails_cycle_without_blocking(tmp_path, services, make_zones_ddns):
+    """单个域名超时时周期按失败处理，不等待慢请求完成"""
+    network, api, ip_service = services
+    ddns = make_zones_ddns(tmp_path / 'slow', ASYNC_TASK_TIMEOUT=0.3)
+    api.latency = 1.0
+    elapsed = timed_async_cycle(AsyncEngine(ddns))
+    assert elapsed < 1.0
+    assert ddns.scheduler.consecutive_failures == 1
+
+
+def test_timed_out_zone_not_resubmitted_while_running(tmp_path, services, make_zones_ddns):
+    """超时的域名在其线程结束前不会被再次提交，线程结束后的周期正常完成"""
+    network, api, ip_service = services
+    ddns = make_zones_ddns(tmp_path / 'slow', ASYNC_TASK_TIMEOUT=0.3)
+    api.latency = 0.5
+    engine = AsyncEngine(ddns)
+
+    async def two_cycles():
+        await engine.run_cycle()
+        assert all(engine.is_running(f'zone{z}.example') for z in range(ZONES))
+        await engine.run_cycle()
+
+    asyncio.run(two_cycles())
+    assert ddns.scheduler.consecutive_failures == 2
+    # 等待超时的线程执行完毕
+    engine._executor.shutdown(wait=True)
+    engine._executor = None
+    assert not any(engine.is_running(f'zone{z}.example') for z in range(ZONES))
+    assert api.calls['DescribeRecordList'] == ZONES
+
+    api.latency = 0
+    timed_async_cycle(engine)
+    assert ddns.scheduler.consecutive_failures == 0
+    assert api.calls['DescribeRecordList'] == ZONES
+    assert all(api.get_value(f'zone{z}.example', r['record_id']) == network.ips[4]
+               for z, r in enumerate(ddns.config_manager.get_records()))
+
+
+def test_engine_selected_after_config_loads(tmp_path, services, make_zones_ddns, monkeypatch):
+    """启动时配置加载失败，先以同步循环重试，配置加载成功后再按 DDNS_ENGINE 切换到 asyncio 运行时"""
+    network, api, ip_service = services
+    ddns = make_zones_ddns(tmp_path / 'ddns', DDNS_ENGINE='async')
+    env_path = tmp_path / 'ddns' / '.env'
+    valid_env = env_path.read_text(encoding='utf-8')
+    env_path.write_text(valid_env.replace('TENCENT_SECRET_ID', 'UNUSED_SECRET_ID'), encoding='utf-8')
+
+    selected = []
+    waits = []
+
+    def run_engine(config, next_cycle_at=None):
+        selected.append(config['ddns_engine'])
+        return config['ddns_engine'] == 'async'
+
+    def wait_for_next_cycle(timeout):
+        # 第一次等待时修复配置文件，并立即开始下一周期
+        waits.append(timeout)
+        env_path.write_text(valid_env, encoding='utf-8')
+        return True
+
+    monkeypatch.setattr(ddns, 'run_engine', run_engine)
+    monkeypatch.setattr(ddns, 'wait_for_next_cycle', wait_for_next_cycle)
+    ddns.run_loop()
+    assert selected == ['async']
+    assert len(waits) == 1
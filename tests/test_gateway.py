@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试路由器IP来源：UPnP IGD、NAT-PMP 和 PCP
+
+使用 benchmarks.fakes 中监听在回环地址上的路由器替身，不访问外部网络。
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fakes import FakeNetwork, FakeIPService, FakeGateway
+from core.gateway import GatewayClient, GatewayError
+from core.ip_utils import IPFetcher
+
+
+@pytest.fixture
+def gateways():
+    started = []
+
+    def start(**kwargs):
+        gateway = FakeGateway(**kwargs)
+        started.append(gateway)
+        return gateway
+
+    yield start
+    for gateway in started:
+        gateway.close()
+
+
+def make_client(gateway, timeout=0.5):
+    return GatewayClient(timeout=timeout, **gateway.client_options())
+
+
+@pytest.mark.parametrize('protocol', ['natpmp', 'pcp', 'upnp'])
+def test_external_ip(gateways, protocol):
+    gateway = gateways()
+    assert make_client(gateway).get_external_ip(protocol) == gateway.wan_ip
+
+
+def test_pcp_mapping_is_deleted(gateways):
+    """PCP 查询使用的临时映射在收到响应后被删除"""
+    gateway = gateways()
+    make_client(gateway).get_external_ip('pcp')
+    deadline = time.monotonic() + 2
+    while gateway.requests['pcp_delete'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert gateway.requests['pcp'] == 1
+    assert gateway.requests['pcp_delete'] == 1
+
+
+def test_pcp_unsupported_by_natpmp_gateway(gateways):
+    """只支持 NAT-PMP 的网关返回不支持的版本，不必等到超时"""
+    client = make_client(gateways(protocols=('natpmp',)), timeout=5)
+    start = time.monotonic()
+    with pytest.raises(GatewayError):
+        client.get_external_ip('pcp')
+    assert time.monotonic() - start < 1
+
+
+def test_upnp_ignores_other_gateways(gateways):
+    """指定了路由器地址时，忽略其他设备的 SSDP 应答"""
+    gateway = gateways()
+    client = GatewayClient(timeout=0.5, **dict(gateway.client_options(), address='127.0.0.2'))
+    with pytest.raises(GatewayError):
+        client.get_external_ip('upnp')
+    assert gateway.requests['ssdp'] == 2
+    assert gateway.requests['description'] == 0
+
+
+def test_upnp_discovery_is_cached(gateways):
+    """SSDP 发现和设备描述只读取一次，控制接口失败后重新发现"""
+    gateway = gateways(service_type='urn:schemas-upnp-org:service:WANPPPConnection:1')
+    client = make_client(gateway)
+    for _ in range(3):
+        assert client.get_external_ip('upnp') == gateway.wan_ip
+    assert gateway.requests['description'] == 1
+    assert gateway.requests['soap'] == 3
+
+    # 控制地址失效（例如路由器重启后端口变化）
+    _, service_type, expires = client._upnp_service
+    client._upnp_service = ('http://127.0.0.1:1/ctl/IPConn', service_type, expires)
+    with pytest.raises(GatewayError):
+        client.get_external_ip('upnp')
+    assert client.get_external_ip('upnp') == gateway.wan_ip
+    assert gateway.requests['description'] == 2
+
+
+def make_fetcher(gateway, protocols, *services):
+    fetcher = IPFetcher()
+    fetcher.set_gateway(protocols, '127.0.0.1')
+    fetcher.gateway = make_client(gateway, timeout=0.3)
+    fetcher.ip_services = [s for s in fetcher.ip_services if s.get('source') == 'gateway'] + list(services)
+    return fetcher
+
+
+def test_gateway_sources_order():
+    """路由器来源排在网卡来源之后、STUN 之前，只用于 IPv4"""
+    fetcher = IPFetcher()
+    fetcher.set_stun_servers(['127.0.0.1'])
+    fetcher.set_gateway(['upnp', 'natpmp'])
+    fetcher.set_interface('ppp0')
+    names = [fetcher.service_name(s) for s in fetcher.ip_services[:4]]
+    assert names == ['interface:ppp0', 'gateway:upnp', 'gateway:natpmp', 'stun']
+    assert not any(s.get('source') == 'gateway' for s in fetcher.ipv6_services)
+    fetcher.set_gateway([])
+    assert not any(s.get('source') == 'gateway' for s in fetcher.ip_services)
+
+
+def test_fallback_between_gateway_protocols(gateways):
+    """网关不支持的协议失败后依次回退到下一个来源"""
+    gateway = gateways(protocols=('upnp',))
+    fetcher = make_fetcher(gateway, ['natpmp', 'upnp'])
+    assert fetcher.get_public_ip() == gateway.wan_ip
+
+
+def test_private_wan_address_falls_back(gateways):
+    """WAN 口是 CGNAT 地址时不采用，回退到 HTTP 服务"""
+    network = FakeNetwork(ipv4='8.8.8.8')
+    ip_service = FakeIPService(network)
+    try:
+        fetcher = make_fetcher(gateways(wan_ip='100.64.1.2'), ['natpmp'], ip_service.as_service())
+        assert fetcher.get_public_ip() == '8.8.8.8'
+    finally:
+        ip_service.close()
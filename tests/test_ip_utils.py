@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试 IP 获取模块
+
+网卡来源测试需要 Linux、root 权限和 unshare 命令，会在独立的网络命名空间中运行。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import subprocess
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.ip_utils import IPFetcher
+from core.provider_health import ProviderHealth
+from benchmarks.fakes import FakeNetwork, FakeIPService
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def run_in_netns(script):
+    """在新的网络命名空间中运行脚本，返回标准输出"""
+    if not shutil.which('unshare') or not shutil.which('ip'):
+        pytest.skip("需要 Linux、unshare 和 ip 命令")
+    if subprocess.run(['unshare', '-n', 'true'], capture_output=True).returncode != 0:
+        pytest.skip("无法创建网络命名空间（需要 root 权限）")
+    result = subprocess.run(
+        ['unshare', '-n', sys.executable, '-c', f"import sys; sys.path.insert(0, {ROOT!r})\n" + script],
+        capture_output=True, text=True, timeout=30
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+def test_is_public_ip():
+    """私有、链路本地、CGNAT、ULA 地址不是公网地址"""
+    fetcher = IPFetcher()
+    assert fetcher.is_public_ip('8.8.8.8')
+    assert fetcher.is_public_ip('2400:3200::1')
+    for ip in ['10.0.0.1', '192.168.1.1', '172.16.0.1', '100.64.0.1', '169.254.1.1',
+               '127.0.0.1', 'fd00::1', 'fe80::1', 'not-an-ip']:
+        assert not fetcher.is_public_ip(ip), ip
+
+
+def test_interface_source_is_first():
+    """网卡来源排在 HTTP 服务之前，重复设置不会重复添加"""
+    fetcher = IPFetcher()
+    fetcher.set_interface('ppp0')
+    fetcher.set_interface('ppp0')
+    assert fetcher.service_name(fetcher.ip_services[0]) == 'interface:ppp0'
+    assert sum(1 for s in fetcher.ip_services if s.get('source') == 'interface') == 1
+    fetcher.set_interface(None)
+    assert all(s.get('source') != 'interface' for s in fetcher.ip_services)
+
+
+def test_interface_ip_in_network_namespace():
+    """从网卡读取地址时跳过私有地址，返回公网地址"""
+    output = run_in_netns("""
+import subprocess
+from core.ip_utils import IPFetcher
+from core.provider_health import ProviderHealth
+subprocess.run(['ip', 'link', 'set', 'lo', 'up'], check=True)
+subprocess.run(['ip', 'addr', 'add', '10.1.2.3/32', 'dev', 'lo'], check=True)
+subprocess.run(['ip', 'addr', 'add', '198.51.100.0/32', 'dev', 'lo'], check=True)
+subprocess.run(['ip', 'addr', 'add', '8.8.4.4/32', 'dev', 'lo'], check=True)
+fetcher = IPFetcher()
+fetcher.set_interface('lo')
+fetcher.ip_services = fetcher.ip_services[:1]
+print(fetcher.get_public_ip())
+""")
+    assert output.splitlines()[-1] == '8.8.4.4'
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ranking_prefers_fast_and_reliable():
+    """失败多、延迟高的服务排在后面"""
+    health = ProviderHealth(clock=FakeClock())
+    services = [{'name': 'slow'}, {'name': 'flaky'}, {'name': 'fast'}]
+    for _ in range(5):
+        health.record(health.key('slow'), True, 0.8)
+        health.record(health.key('fast'), True, 0.05)
+        health.record(health.key('flaky'), False, 0.05)
+        health.record(health.key('flaky'), True, 0.05)
+    ranked = [s['name'] for s in health.rank(services, 4, lambda s: s['name'])]
+    assert ranked == ['fast', 'flaky', 'slow']
+
+
+def test_circuit_breaker_half_open():
+    """连续失败后熔断，冷却结束后半开试探，试探失败冷却加倍，成功则恢复"""
+    clock = FakeClock()
+    health = ProviderHealth(failure_threshold=3, cooldown=60, clock=clock)
+    services = [{'name': 'bad'}, {'name': 'good'}]
+    names = lambda ranked: [s['name'] for s in ranked]
+    key = health.key('bad')
+
+    for _ in range(3):
+        health.record(key, False, 5)
+    assert names(health.rank(services, 4, lambda s: s['name'])) == ['good']
+
+    clock.now += 61
+    assert 'bad' in names(health.rank(services, 4, lambda s: s['name']))
+    assert health.providers[key]['state'] == ProviderHealth.HALF_OPEN
+    health.record(key, False, 5)
+    assert health.providers[key]['cooldown'] == 120
+    clock.now += 61
+    assert names(health.rank(services, 4, lambda s: s['name'])) == ['good']
+
+    clock.now += 60
+    health.rank(services, 4, lambda s: s['name'])
+    health.record(key, True, 0.1)
+    assert health.providers[key]['state'] == ProviderHealth.CLOSED
+
+
+def test_health_persistence(tmp_path):
+    """评分数据在重启后保留"""
+    path = str(tmp_path / 'providers.json')
+    health = ProviderHealth(path)
+    for _ in range(3):
+        health.record(health.key('bad'), False, 5)
+    health.save()
+    restored = ProviderHealth(path)
+    assert restored.providers[restored.key('bad')]['state'] == ProviderHealth.OPEN
+
+
+def test_health_save_is_throttled(tmp_path):
+    """只有评分变化时按间隔写入，熔断状态变化时立即写入，没有变化时不写入"""
+    clock = FakeClock()
+    path = tmp_path / 'providers.json'
+    health = ProviderHealth(str(path), failure_threshold=3, save_interval=300, clock=clock)
+    health.save()
+    assert not path.exists()
+
+    health.record(health.key('good'), True, 0.1)
+    health.save()
+    assert path.exists()
+    path.write_text('{}', encoding='utf-8')
+    health.record(health.key('good'), True, 0.2)
+    health.save()
+    assert path.read_text(encoding='utf-8') == '{}'
+
+    # 熔断立即写入
+    for _ in range(3):
+        health.record(health.key('bad'), False, 5)
+    health.save()
+    assert health.key('bad') in json.loads(path.read_text(encoding='utf-8'))['providers']
+
+    path.write_text('{}', encoding='utf-8')
+    health.record(health.key('good'), True, 0.3)
+    clock.now += 301
+    health.save()
+    assert health.key('good') in json.loads(path.read_text(encoding='utf-8'))['providers']
+
+    path.write_text('{}', encoding='utf-8')
+    health.record(health.key('good'), True, 0.3)
+    health.save(force=True)
+    assert json.loads(path.read_text(encoding='utf-8'))['providers']
+
+
+@pytest.fixture
+def ip_services():
+    """按需创建本地IP回显服务，测试结束后关闭"""
+    created = []
+
+    def make(network, **kwargs):
+        service = FakeIPService(network, **kwargs)
+        created.append(service)
+        return service
+
+    yield make
+    for service in created:
+        service.close()
+
+
+def make_fetcher(mode, services, quorum=2):
+    fetcher = IPFetcher(mode=mode, quorum=quorum, timeout=5)
+    fetcher.ip_services = [s.as_service() for s in services]
+    return fetcher
+
+
+def test_race_returns_fastest(ip_services):
+    """race 模式返回最先到达的结果，不等待慢服务"""
+    network = FakeNetwork()
+    slow = ip_services(network, latency=2.0)
+    fast = ip_services(network)
+    fetcher = make_fetcher('race', [slow, fast])
+    start = time.monotonic()
+    assert fetcher.get_public_ip() == network.ips[4]
+    assert time.monotonic() - start < 1.0
+
+
+def test_race_skips_failed_service(ip_services):
+    """race 模式下先返回的失败结果不影响后到的合法结果"""
+    network = FakeNetwork()
+    fetcher = make_fetcher('race', [ip_services(network, failure_rate=1.0),
+                                    ip_services(network, latency=0.2)])
+    assert fetcher.get_public_ip() == network.ips[4]
+
+
+def test_quorum_rejects_lying_minority(ip_services):
+    """quorum 模式下少数服务返回的错误地址不会被采用"""
+    network = FakeNetwork()
+    liar = ip_services(FakeNetwork(ipv4='198.51.100.66'))
+    honest = [ip_services(network, latency=0.1), ip_services(network, latency=0.1)]
+    fetcher = make_fetcher('quorum', [liar] + honest)
+    assert fetcher.get_public_ip() == network.ips[4]
+
+
+def test_quorum_disagreement_returns_none(ip_services):
+    """各服务结果不一致时返回 None"""
+    fetcher = make_fetcher('quorum', [ip_services(FakeNetwork(ipv4='198.51.100.66')),
+                                      ip_services(FakeNetwork(ipv4='198.51.100.77')),
+                                      ip_services(FakeNetwork())])
+    assert fetcher.get_public_ip() is None
+
+
+def test_quorum_not_reduced_by_open_breakers(ip_services):
+    """诚实的服务熔断后，剩下的单个错误服务不能独自达成一致"""
+    network = FakeNetwork()
+    liar = ip_services(FakeNetwork(ipv4='198.51.100.66'))
+    honest = [ip_services(network), ip_services(network)]
+    fetcher = make_fetcher('quorum', [liar] + honest)
+    for service in honest:
+        key = fetcher.health.key(service.url, 4)
+        for _ in range(fetcher.health.failure_threshold):
+            fetcher.health.record(key, False, 5)
+    assert [s['url'] for s in fetcher.get_ranked_services(4)] == [liar.url]
+    assert fetcher.get_public_ip() == network.ips[4]
+    assert all(service.requests == 1 for service in honest)
+
+
+def test_quorum_capped_at_service_count(ip_services, caplog):
+    """quorum 大于服务总数时按服务总数计算，并在加载配置时警告"""
+    network = FakeNetwork()
+    services = [ip_services(network), ip_services(network)]
+    fetcher = make_fetcher('quorum', services, quorum=3)
+    fetcher.check_quorum({4})
+    assert 'IP_QUORUM=3' in caplog.text
+    assert fetcher.effective_quorum(4) == 2
+    assert fetcher.get_public_ip() == network.ips[4]
+    assert all(service.requests == 1 for service in services)
+
+
+@pytest.mark.parametrize('mode', IPFetcher.MODES)
+def test_all_services_fail(ip_services, mode):
+    """所有服务都失败时各模式均返回 None"""
+    network = FakeNetwork()
+    fetcher = make_fetcher(mode, [ip_services(network, failure_rate=1.0) for _ in range(3)])
+    assert fetcher.get_public_ip() is None
+
+
+def test_http_fetch_is_pinned_to_family(ip_services):
+    """HTTP 查询只通过对应地址族的连接发出，IPv6 查询不会连到 IPv4 地址"""
+    network = FakeNetwork()
+    service = ip_services(network)
+    fetcher = IPFetcher()
+    assert fetcher._query_service(service.as_service(), 4) == network.ips[4]
+    assert fetcher._query_service({'url': service.url, 'parser': lambda r: network.ips[6]}, 6) is None
+    assert service.requests == 1
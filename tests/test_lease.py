@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试主备模式：租约的获取、续期、接管和释放，以及备用节点不执行IP获取和记录修改
+
+使用 benchmarks.fakes 中的本地 DNSPod API 和 IP 回显服务替身，不需要真实凭证。
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.lease import LeaderLease
+
+pytest.importorskip('fcntl')
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_standby_takes_over_expired_lease(tmp_path):
+    """持有者超过 ttl 未续期后，备用节点接管并递增任期"""
+    clock = FakeClock()
+    path = str(tmp_path / 'lease')
+    a = LeaderLease(path, 'a', ttl=30, clock=clock)
+    b = LeaderLease(path, 'b', ttl=30, clock=clock)
+    assert a.attempt()
+    assert not b.attempt()
+    assert b.holder == 'a'
+
+    clock.now += 20
+    assert a.attempt()
+    clock.now += 29
+    assert not b.attempt()
+    clock.now += 2
+    assert b.attempt()
+    assert b.read()['term'] == 2
+    assert not a.attempt()
+    assert not a.is_leader()
+
+
+def test_leader_steps_down_when_renewal_fails(tmp_path):
+    """续期持续失败时，主节点在备用节点可以接管之前主动退出"""
+    lease = LeaderLease(str(tmp_path / 'lease'), 'a', ttl=0.6)
+    assert lease.attempt()
+    lease.path = str(tmp_path / 'missing' / 'lease')
+    assert lease.attempt()
+    time.sleep(0.45)
+    assert not lease.attempt()
+
+
+def test_release_allows_immediate_takeover(tmp_path):
+    """正常退出时释放租约，备用节点下一次检查即可接管"""
+    path = str(tmp_path / 'lease')
+    a = LeaderLease(path, 'a', ttl=30)
+    b = LeaderLease(path, 'b', ttl=30)
+    a.start()
+    assert not b.attempt()
+    a.stop()
+    assert b.attempt()
+
+
+def test_takeover_is_bounded(tmp_path):
+    """主节点停止续期（未释放）后，备用节点在 ttl + ttl/3 内接管"""
+    path = str(tmp_path / 'lease')
+    a = LeaderLease(path, 'a', ttl=0.9)
+    b = LeaderLease(path, 'b', ttl=0.9)
+    a.start()
+    b.start()
+    try:
+        assert a.is_leader() and not b.is_leader()
+        stopped = time.monotonic()
+        a.stop(release=False)
+        while not b.is_leader() and time.monotonic() - stopped < 3:
+            time.sleep(0.02)
+        assert b.is_leader()
+        assert time.monotonic() - stopped <= 0.9 + 0.3 + 0.1
+    finally:
+        b.stop()
+
+
+def test_lease_file_is_locked_across_processes(tmp_path):
+    """其他进程持有文件锁时不会读写租约"""
+    path = str(tmp_path / 'lease')
+    holder = subprocess.Popen([sys.executable, '-c', f"""
+import os, sys, time, fcntl
+fd = os.open({path!r}, os.O_RDWR | os.O_CREAT)
+fcntl.lockf(fd, fcntl.LOCK_EX)
+print('locked', flush=True)
+time.sleep(2)
+"""], stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == 'locked'
+        lease = LeaderLease(path, 'a', ttl=30, lock_timeout=0.2)
+        assert not lease.attempt()
+    finally:
+        holder.kill()
+        holder.wait()
+    assert lease.attempt()
+
+
+def make_node(make_ddns, api, path, lease_file, node_id):
+    record_id = api.add_record('example.com', 'home')
+    return make_ddns(path, f"example.com,home,A,默认,{record_id}", POLL_JITTER=0,
+                     HA_LEASE_FILE=lease_file, HA_LEASE_TTL=30, HA_NODE_ID=node_id)
+
+
+def test_only_leader_queries_and_updates(tmp_path, services, make_ddns):
+    """备用节点不获取IP、不调用 API；接管后完整核对一次全部记录"""
+    network, api, ip_service = services
+    lease_file = tmp_path / 'lease'
+    leader = make_node(make_ddns, api, tmp_path / 'a', lease_file, 'a')
+    standby = make_node(make_ddns, api, tmp_path / 'b', lease_file, 'b')
+    try:
+        leader.run_cycle()
+        assert leader.lease.is_leader()
+        calls, fetches = sum(api.calls.values()), ip_service.requests
+
+        assert standby.run_cycle() == standby.lease.interval
+        assert not standby.lease.is_leader()
+        assert sum(api.calls.values()) == calls
+        assert ip_service.requests == fetches
+
+        leader.lease.stop()
+        standby.lease.attempt()
+        standby.run_cycle()
+        assert standby.lease.is_leader()
+        assert sum(api.calls.values()) > calls
+    finally:
+        for ddns in (leader, standby):
+            if ddns.lease is not None:
+                ddns.lease.stop()
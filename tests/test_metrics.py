@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试指标模块和 /metrics 接口
+"""
+
+import os
+import sys
+import urllib.request
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import metrics
+from core.metrics import Registry, Counter, Gauge, Histogram, MetricsServer
+from core.notification import NotificationManager
+
+
+def test_text_format():
+    """计数器、仪表和直方图按 Prometheus 文本格式输出，直方图桶为累积计数"""
+    registry = Registry()
+    calls = registry.register(Counter('test_calls_total', '调用次数', ('action',)))
+    ip = registry.register(Gauge('test_ip_info', '当前IP', ('ip',)))
+    latency = registry.register(Histogram('test_seconds', '耗时', ('action',), buckets=(0.1, 1)))
+
+    calls.inc(action='ModifyRecord')
+    calls.inc(2, action='ModifyRecord')
+    ip.set(1, ip='203.0.113.7')
+    for value in (0.05, 0.5, 3):
+        latency.observe(value, action='DescribeRecordList')
+
+    text = registry.render()
+    assert '# TYPE test_calls_total counter' in text
+    assert 'test_calls_total{action="ModifyRecord"} 3' in text
+    assert 'test_ip_info{ip="203.0.113.7"} 1' in text
+    assert 'test_seconds_bucket{action="DescribeRecordList",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{action="DescribeRecordList",le="1"} 2' in text
+    assert 'test_seconds_bucket{action="DescribeRecordList",le="+Inf"} 3' in text
+    assert 'test_seconds_count{action="DescribeRecordList"} 3' in text
+    assert 'test_seconds_sum{action="DescribeRecordList"} 3.55' in text
+
+
+def test_public_ip_replaces_old_series():
+    """公网IP变化后只保留新地址的序列"""
+    metrics.set_public_ip(4, '203.0.113.1')
+    metrics.set_public_ip(4, '203.0.113.2')
+    metrics.set_public_ip(6, '2001:db8::1')
+    ips = {dict(labels)['ip'] for _, labels, _ in metrics.PUBLIC_IP.samples()}
+    assert '203.0.113.1' not in ips
+    assert {'203.0.113.2', '2001:db8::1'} <= ips
+
+
+class StaticConfig:
+    """只返回固定配置的配置管理器"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def get_config(self):
+        return self.config
+
+
+def test_suppressed_error_emails_are_counted():
+    """频率限制跳过的错误邮件按 error_type 计数"""
+    manager = NotificationManager(StaticConfig({'smtp_receiver_email': 'ops@example.com',
+                                                'error_email_interval': 3600}))
+    manager.last_error_times['dns_update'] = 1000
+    before = metrics.ERROR_EMAILS_SUPPRESSED.get(error_type='dns_update')
+    assert not manager.send_error_notification('失败', '正文', 1500, error_type='dns_update')
+    assert metrics.ERROR_EMAILS_SUPPRESSED.get(error_type='dns_update') == before + 1
+
+
+def test_metrics_endpoint():
+    """指标接口可被抓取，未知路径返回 404"""
+    registry = Registry()
+    registry.register(Counter('test_cycles_total', '周期次数')).inc()
+    server = MetricsServer('127.0.0.1', 0, registry=registry)
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            assert 'test_cycles_total 1' in response.read().decode('utf-8')
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{server.port}/other", timeout=5)
+            assert False, "未知路径应返回 404"
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        server.stop()
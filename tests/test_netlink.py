@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试网络变化监听模块
+
+消息解析测试可在任意平台运行；真实事件测试需要 Linux、root 权限和 unshare 命令，
+会在独立的网络命名空间中给 lo 添加地址，不影响宿主机网络。
+"""
+
+import os
+import sys
+import shutil
+import subprocess
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.netlink import (
+    NetlinkWatcher, NLMSG_HEADER, IFADDRMSG, RTMSG,
+    RTM_NEWADDR, RTM_DELADDR, RTM_NEWROUTE, RT_SCOPE_HOST, RT_SCOPE_LINK, RT_TABLE_MAIN
+)
+
+
+def build_addr_message(msg_type, scope, index=1, family=2):
+    payload = IFADDRMSG.pack(family, 32, 0, scope, index)
+    return NLMSG_HEADER.pack(NLMSG_HEADER.size + len(payload), msg_type, 0, 0, 0) + payload
+
+
+def build_route_message(dst_len, table=RT_TABLE_MAIN, family=2):
+    payload = RTMSG.pack(family, dst_len, 0, 0, table, 0, 0, 1, 0)
+    return NLMSG_HEADER.pack(NLMSG_HEADER.size + len(payload), RTM_NEWROUTE, 0, 0, 0) + payload
+
+
+def test_address_events():
+    """全局地址的新增和删除会唤醒，link/host 作用域的地址会被忽略"""
+    watcher = NetlinkWatcher()
+    assert watcher.handle_data(build_addr_message(RTM_NEWADDR, 0))
+    assert watcher.handle_data(build_addr_message(RTM_DELADDR, 0))
+    assert not watcher.handle_data(build_addr_message(RTM_NEWADDR, RT_SCOPE_LINK))
+    assert not watcher.handle_data(build_addr_message(RTM_NEWADDR, RT_SCOPE_HOST))
+
+
+def test_route_events():
+    """只有主路由表中的默认路由变化会唤醒"""
+    watcher = NetlinkWatcher()
+    assert watcher.handle_data(build_route_message(0))
+    assert not watcher.handle_data(build_route_message(24))
+    assert not watcher.handle_data(build_route_message(0, table=255))
+
+
+def test_multiple_messages():
+    """一次读取中包含多条消息时逐条解析"""
+    watcher = NetlinkWatcher()
+    data = build_addr_message(RTM_NEWADDR, RT_SCOPE_HOST) + build_route_message(0)
+    assert watcher.handle_data(data)
+
+
+NETNS_SCRIPT = """
+import sys, subprocess
+sys.path.insert(0, {root!r})
+from core.netlink import NetlinkWatcher
+watcher = NetlinkWatcher(interface='lo', settle_time=0)
+watcher.start()
+subprocess.run(['ip', 'link', 'set', 'lo', 'up'], check=True)
+subprocess.run(['ip', 'addr', 'add', '203.0.113.10/32', 'dev', 'lo'], check=True)
+woke = watcher.wait(5)
+watcher.stop()
+print('WOKE' if woke else 'TIMEOUT')
+"""
+
+
+def test_watcher_in_network_namespace():
+    """在独立的网络命名空间中添加地址，监听器应被唤醒"""
+    if not NetlinkWatcher.is_supported() or not shutil.which('unshare') or not shutil.which('ip'):
+        pytest.skip("需要 Linux、unshare 和 ip 命令")
+    if subprocess.run(['unshare', '-n', 'true'], capture_output=True).returncode != 0:
+        pytest.skip("无法创建网络命名空间（需要 root 权限）")
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    result = subprocess.run(
+        ['unshare', '-n', sys.executable, '-c', NETNS_SCRIPT.format(root=root)],
+        capture_output=True, text=True, timeout=30
+    )
+    assert 'WOKE' in result.stdout, result.stderr
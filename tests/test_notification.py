@@ -7,6 +7,7 @@
 
 import os
 import time
+import email
 import logging
 import sys
 
@@ -97,5 +98,108 @@ def test_email_sending():
         print("\n❌ 两种邮件发送均失败，请检查SMTP配置和日志。")
         return False
 
+class FakeSMTP:
+    """记录发送内容的假 SMTP 连接"""
+
+    def __init__(self, log, fail_times=0):
+        self.log = log
+        self.fail_times = fail_times
+
+    def noop(self):
+        return (250, b'OK')
+
+    def sendmail(self, sender, receivers, message):
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise ConnectionRefusedError("模拟发送失败")
+        self.log['sent'].append(message)
+
+    def quit(self):
+        pass
+
+class StaticConfigManager:
+    """返回固定配置的配置管理器"""
+
+    def __init__(self):
+        self.config = {
+            'smtp_host': 'localhost', 'smtp_port': 587, 'smtp_user': 'user',
+            'smtp_password': 'pass', 'smtp_sender_email': 'ddns@example.com',
+            'smtp_receiver_email': 'admin@example.com', 'error_email_interval': 3600,
+        }
+
+    def get_config(self):
+        return self.config
+
+def make_queued_manager(fail_times=0, digest_window=0.2):
+    log = {'sent': [], 'connects': 0}
+    manager = NotificationManager(StaticConfigManager(), async_mode=True,
+                                  digest_window=digest_window, retry_delay=0.01)
+
+    def fake_connect(config):
+        log['connects'] += 1
+        return FakeSMTP(log, fail_times if log['connects'] == 1 else 0)
+
+    manager._connect = fake_connect
+    return manager, log
+
+def test_queue_does_not_block():
+    """后台模式下通知立即返回，突发通知合并为一封汇总邮件"""
+    manager, log = make_queued_manager()
+    start = time.monotonic()
+    for i in range(3):
+        assert manager.notify(f"主题{i}", f"正文{i}")
+    assert time.monotonic() - start < 0.1
+    assert manager.flush(timeout=5)
+    assert len(log['sent']) == 1
+    message = email.message_from_string(log['sent'][0])
+    body = message.get_payload(decode=True).decode('utf-8')
+    assert all(f"正文{i}" in body for i in range(3))
+
+def test_queue_reuses_connection():
+    """连续批次复用同一个已登录的连接"""
+    manager, log = make_queued_manager(digest_window=0)
+    manager.notify("主题1", "正文1")
+    assert manager.flush(timeout=5)
+    manager.notify("主题2", "正文2")
+    assert manager.flush(timeout=5)
+    assert len(log['sent']) == 2
+    assert log['connects'] == 1
+
+def test_queue_retries_after_failure():
+    """发送失败后重新连接并重试"""
+    manager, log = make_queued_manager(fail_times=1, digest_window=0)
+    manager.notify("主题", "正文")
+    assert manager.flush(timeout=5)
+    assert len(log['sent']) == 1
+    assert log['connects'] == 2
+
+def test_stop_with_full_queue_and_failing_sender():
+    """队列已满且发送持续失败时，停止不阻塞调用方，后台线程在期限后丢弃剩余通知退出"""
+    manager = NotificationManager(StaticConfigManager(), async_mode=True, queue_size=2,
+                                  digest_window=0, retry_delay=5)
+    connects = []
+
+    def failing_connect(config):
+        connects.append(time.monotonic())
+        raise ConnectionRefusedError("模拟发送失败")
+
+    manager._connect = failing_connect
+    manager.notify("主题0", "正文0")
+    while not connects:
+        time.sleep(0.01)
+    # 后台线程正在重试第一条，后续通知填满队列
+    for i in range(1, 4):
+        manager.notify(f"主题{i}", f"正文{i}")
+    assert manager.queue.full()
+
+    worker = manager._worker
+    start = time.monotonic()
+    manager.stop(timeout=0.5, wait=False)
+    assert time.monotonic() - start < 0.1
+    worker.join(timeout=5)
+    assert not worker.is_alive()
+    assert time.monotonic() - start < 1.5
+    assert manager.queue.unfinished_tasks == 0
+
 if __name__ == "__main__":
     test_email_sending()
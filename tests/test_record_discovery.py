@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试记录ID自动查找和持久化索引
+
+使用 benchmarks.fakes 中的本地 DNSPod API 和 IP 回显服务替身，不需要真实凭证。
+"""
+
+import os
+import sys
+import json
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def test_discovers_record_ids_once(tmp_path, services, make_ddns):
+    """启动时每个域名查询一次记录列表找到记录ID，之后从状态文件的索引读取"""
+    network, api, ip_service = services
+    home = api.add_record('example.com', 'home')
+    www = api.add_record('example.com', 'www')
+    api.add_record('example.com', 'home', record_type='AAAA', value='2001:db8::1')
+    records = "example.com,home,A,默认;example.com,www,A,默认,auto"
+
+    ddns = make_ddns(tmp_path, records)
+    ddns.run_cycle()
+    ddns.process_verifications()
+    assert [r['record_id'] for r in ddns.config_manager.get_records()] == [str(home), str(www)]
+    assert api.get_value('example.com', home) == network.ips[4]
+    index = json.loads((tmp_path / 'state.json').read_text(encoding='utf-8'))['record_ids']
+    assert index == {'example.com|home|A|默认': str(home), 'example.com|www|A|默认': str(www)}
+
+    # 重启后直接使用索引，不再为查找记录ID查询记录列表
+    api.reset_calls()
+    ddns = make_ddns(tmp_path, records, VERIFICATION_INTERVAL=3600)
+    ddns.run_cycle()
+    assert api.calls == {}
+    assert ddns.config_manager.get_records()[0]['record_id'] == str(home)
+
+
+def test_deleted_record_is_rediscovered(tmp_path, services, make_ddns):
+    """索引中的记录被删除后从同一次记录列表中重新查找，不存在时按配置创建"""
+    network, api, ip_service = services
+    home = api.add_record('example.com', 'home', value=network.ips[4])
+    ddns = make_ddns(tmp_path, "example.com,home,A,默认",
+                     AUTO_CREATE_RECORDS='true', VERIFICATION_INTERVAL=0)
+    ddns.run_cycle()
+    assert ddns.config_manager.get_records()[0]['record_id'] == str(home)
+
+    api.remove_record('example.com', home)
+    api.reset_calls()
+    ddns.run_cycle()
+    record_id = ddns.config_manager.get_records()[0]['record_id']
+    assert record_id not in ('', str(home))
+    assert api.get_value('example.com', record_id) == network.ips[4]
+    assert api.calls == {'DescribeRecordList': 1, 'CreateRecord': 1}
+    assert ddns.state_cache.get_record_id(ddns.config_manager.get_records()[0]) == record_id
+
+
+def test_missing_record_without_auto_create(tmp_path, services, make_ddns):
+    """未启用自动创建时，找不到的记录按失败处理且不调用 CreateRecord"""
+    network, api, ip_service = services
+    api.add_record('example.com', 'www')
+    ddns = make_ddns(tmp_path, "example.com,home,A,默认")
+    assert ddns.initialize_components()
+    assert not ddns.sync_records()
+    assert 'CreateRecord' not in api.calls
+    assert ddns.config_manager.get_records()[0]['record_id'] == ''
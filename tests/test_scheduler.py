@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试轮询调度器
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.scheduler import PollScheduler
+from core.verification import VerificationQueue
+
+
+class FakeClock:
+    """可手动推进的单调时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_scheduler(clock, jitter=0):
+    return PollScheduler(base_interval=60, fast_interval=15, fast_window=300,
+                         max_backoff=240, jitter=jitter, clock=clock)
+
+
+def test_deadline_excludes_cycle_duration():
+    """周期内耗时从间隔中扣除，而不是叠加"""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    start = clock.now
+    clock.now += 25
+    assert scheduler.next_delay(start) == 35
+    clock.now += 100
+    assert scheduler.next_delay(start) == 0
+
+
+def test_fast_window_after_change():
+    """IP变化后在窗口期内使用快速间隔，窗口结束后恢复正常间隔"""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    scheduler.record_success(changed=True)
+    assert scheduler.current_interval() == 15
+    clock.now += 301
+    assert scheduler.current_interval() == 60
+
+
+def test_exponential_backoff():
+    """连续失败时从快速间隔开始指数退避，不超过上限，成功后复位"""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    intervals = []
+    for _ in range(6):
+        scheduler.record_failure()
+        intervals.append(scheduler.current_interval())
+    assert intervals == [15, 30, 60, 120, 240, 240]
+    scheduler.record_success()
+    assert scheduler.current_interval() == 60
+
+
+def test_backoff_cap_not_below_base_interval():
+    """退避上限小于正常间隔时按正常间隔计算，直接构造和 configure 结果一致"""
+    clock = FakeClock()
+    scheduler = PollScheduler(base_interval=60, fast_interval=15, max_backoff=30, jitter=0, clock=clock)
+    assert scheduler.max_backoff == 60
+    for _ in range(5):
+        scheduler.record_failure()
+    assert scheduler.current_interval() == 60
+    scheduler.configure(60, 15, 300, 30, 0)
+    assert scheduler.max_backoff == 60
+
+
+def test_jitter_range():
+    """抖动后的等待时间落在 ±jitter 范围内"""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, jitter=0.1)
+    delays = {scheduler.next_delay(clock.now) for _ in range(200)}
+    assert all(54 <= d <= 66 for d in delays)
+    assert len(delays) > 1
+
+
+def test_verification_queue_due_and_reschedule():
+    """待验证项到期后取出，未通过的记录按间隔重新排期，次数用尽后不再放回"""
+    clock = FakeClock()
+    verifications = VerificationQueue(wait_time=10, max_attempts=2, clock=clock)
+    record = {'domain': 'example.com', 'subdomain': 'www', 'record_type': 'A', 'record_id': '1'}
+    verifications.add('example.com', [(record, '1.1.1.1')], 0)
+
+    assert verifications.is_pending(record)
+    assert verifications.pop_due() == []
+    assert verifications.next_due() == clock.now + 10
+
+    clock.now += 10
+    item = verifications.pop_due()[0]
+    assert verifications.reschedule(item, item['changes'])
+    assert verifications.next_due() == clock.now + 10
+
+    clock.now += 10
+    item = verifications.pop_due()[0]
+    assert not verifications.reschedule(item, item['changes'])
+    assert len(verifications) == 0
+    assert not verifications.is_pending(record)
+
+
+def test_verification_queue_defer():
+    """延后的待验证项不计入尝试次数，间隔为 0 时至少延后 1 秒"""
+    clock = FakeClock()
+    verifications = VerificationQueue(wait_time=0, max_attempts=2, clock=clock)
+    record = {'domain': 'example.com', 'subdomain': 'www', 'record_type': 'A', 'record_id': '1'}
+    verifications.add('example.com', [(record, '1.1.1.1')], 0)
+    item = verifications.pop_due()[0]
+    verifications.defer(item)
+    assert item['attempt'] == 0
+    assert verifications.is_pending(record)
+    assert verifications.next_due() == clock.now + 1
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试本地状态缓存
+
+使用 benchmarks.fakes 中的本地 DNSPod API 和 IP 回显服务替身，不需要真实凭证。
+"""
+
+import os
+import sys
+import json
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.state import StateCache
+
+RECORD = {'domain': 'example.com', 'subdomain': 'home', 'record_type': 'A',
+          'record_line': '默认', 'record_id': '1'}
+
+
+def test_set_and_matches(tmp_path):
+    """写入后同一记录值匹配，其他值和其他记录不匹配"""
+    cache = StateCache(str(tmp_path / 'state.json'))
+    assert not cache.matches(RECORD, '203.0.113.10')
+    cache.set(RECORD, '203.0.113.10', 1000)
+    assert cache.matches(RECORD, '203.0.113.10')
+    assert not cache.matches(RECORD, '203.0.113.11')
+    assert not cache.matches(dict(RECORD, record_id='2'), '203.0.113.10')
+    assert cache.get(RECORD)['verified_at'] == 1000
+
+
+def test_persists_across_instances(tmp_path):
+    """记录值、记录ID索引和完整核对时间在重启后保留"""
+    path = str(tmp_path / 'state.json')
+    cache = StateCache(path)
+    cache.set(RECORD, '203.0.113.10', 1000)
+    cache.set_record_id(RECORD, 1)
+    cache.mark_verified(2000)
+
+    restored = StateCache(path)
+    assert restored.matches(RECORD, '203.0.113.10')
+    assert restored.get_record_id(RECORD) == '1'
+    assert restored.last_verification_time == 2000
+
+
+def test_invalidate(tmp_path):
+    """失效后缓存项从文件中删除，重启后同样不匹配"""
+    path = str(tmp_path / 'state.json')
+    cache = StateCache(path)
+    cache.set(RECORD, '203.0.113.10', 1000)
+    cache.invalidate(RECORD)
+    assert not cache.matches(RECORD, '203.0.113.10')
+    assert not StateCache(path).matches(RECORD, '203.0.113.10')
+    # 不存在的记录失效时不报错
+    cache.invalidate(RECORD)
+
+
+def test_corrupt_file_starts_empty(tmp_path):
+    """状态文件损坏时从空缓存开始"""
+    path = tmp_path / 'state.json'
+    path.write_text('{not json', encoding='utf-8')
+    cache = StateCache(str(path))
+    assert cache.records == {} and cache.last_verification_time == 0
+    cache.set(RECORD, '203.0.113.10', 1000)
+    assert json.loads(path.read_text(encoding='utf-8'))['records']
+
+
+def test_skips_api_until_verification_interval(tmp_path, services, make_ddns):
+    """IP 未变化时不查询API，超过 VERIFICATION_INTERVAL 后完整核对一次"""
+    network, api, ip_service = services
+    record_id = api.add_record('example.com', 'home', value=network.ips[4])
+    ddns = make_ddns(tmp_path, f"example.com,home,A,默认,{record_id}", VERIFICATION_INTERVAL=3600)
+
+    # 首个周期没有核对记录，查询API并写入缓存
+    ddns.run_cycle()
+    assert api.calls == {'DescribeRecordList': 1}
+    assert ddns.state_cache.matches(ddns.config_manager.get_records()[0], network.ips[4])
+
+    api.reset_calls()
+    ddns.run_cycle()
+    assert api.calls == {}
+
+    # 记录在控制台被改动，缓存仍认为一致，直到完整核对时才发现并修正
+    api.zones['example.com'][record_id]['Value'] = '198.51.100.1'
+    ddns.run_cycle()
+    assert api.calls == {}
+
+    ddns.last_verification_time -= 3600
+    ddns.run_cycle()
+    ddns.process_verifications()
+    assert api.calls['DescribeRecordList'] >= 1
+    assert api.get_value('example.com', record_id) == network.ips[4]
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试 STUN 公网IP来源
+
+使用 benchmarks.fakes 中监听在回环地址上的 STUN 服务替身，不访问外部网络。
+"""
+
+import os
+import sys
+import time
+import socket
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fakes import FakeStunServer
+from core.ip_utils import IPFetcher
+from core.stun import StunClient, parse_server, parse_binding_response
+
+
+@pytest.fixture
+def stun_servers():
+    servers = []
+
+    def start(network, **kwargs):
+        server = FakeStunServer(network, **kwargs)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def make_fetcher(*servers):
+    fetcher = IPFetcher()
+    fetcher.set_stun_servers([s.address for s in servers])
+    # 只保留 STUN 来源，HTTP 服务不可达时不影响结果
+    fetcher.ip_services = [s for s in fetcher.ip_services if s.get('source') == 'stun']
+    fetcher.ipv6_services = [s for s in fetcher.ipv6_services if s.get('source') == 'stun']
+    return fetcher
+
+
+def test_parse_server():
+    assert parse_server('stun.example.com') == ('stun.example.com', 3478)
+    assert parse_server('stun.example.com:19302') == ('stun.example.com', 19302)
+    assert parse_server('2001:db8::1') == ('2001:db8::1', 3478)
+    assert parse_server('[2001:db8::1]:3479') == ('2001:db8::1', 3479)
+
+
+def test_response_for_other_transaction_is_ignored(network, stun_servers):
+    """事务ID不匹配的响应不会被采用"""
+    server = stun_servers(network)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(2)
+    request = bytes.fromhex('0001 0000 2112a442') + b'a' * 12
+    sock.sendto(request, ('127.0.0.1', server.port))
+    data, _ = sock.recvfrom(2048)
+    sock.close()
+    assert parse_binding_response(data, b'a' * 12)[0] == network.ips[4]
+    assert parse_binding_response(data, b'b' * 12) is None
+
+
+def test_stun_source_returns_mapped_address(network, stun_servers):
+    """多个服务器返回相同的映射地址和端口，判断为非对称型NAT"""
+    servers = [stun_servers(network) for _ in range(3)]
+    fetcher = make_fetcher(*servers)
+    start = time.monotonic()
+    assert fetcher.get_public_ip() == network.ips[4]
+    assert time.monotonic() - start < 0.5
+    assert fetcher.nat_behavior[4] == 'endpoint_independent'
+    assert all(s.requests == 1 for s in servers)
+
+
+def test_symmetric_nat_detected(network, stun_servers):
+    """映射端口随服务器不同而变化时判断为对称型NAT，地址仍然可用"""
+    fetcher = make_fetcher(stun_servers(network), stun_servers(network, port_offset=7))
+    assert fetcher.get_public_ip() == network.ips[4]
+    assert fetcher.nat_behavior[4] == 'symmetric'
+
+
+def test_inconsistent_addresses_rejected(network, stun_servers):
+    """不同服务器看到的地址不同时不采用任何一个"""
+    fetcher = make_fetcher(stun_servers(network), stun_servers(network, mapped_ip='198.51.100.77'))
+    assert fetcher.get_public_ip() is None
+
+
+def test_lost_request_is_retransmitted(network, stun_servers):
+    """请求丢失后按 RTO 重传"""
+    server = stun_servers(network, drop=1)
+    client = StunClient([server.address], timeout=2, rto=0.1)
+    results = client.query(4)
+    assert results[server.address][0] == network.ips[4]
+    assert server.requests == 2
+
+
+def test_unreachable_server_does_not_wait_for_timeout(network, stun_servers):
+    """有服务器响应后，不可达的服务器不会把查询拖到总超时"""
+    server = stun_servers(network)
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(('127.0.0.1', 0))
+    try:
+        client = StunClient([server.address, f"127.0.0.1:{silent.getsockname()[1]}"], timeout=3)
+        start = time.monotonic()
+        assert list(client.query(4)) == [server.address]
+        assert time.monotonic() - start < 1
+    finally:
+        silent.close()
+
+
+def test_ipv6(network, stun_servers):
+    """IPv6 映射地址按事务ID解码"""
+    if not socket.has_ipv6:
+        pytest.skip("不支持 IPv6")
+    try:
+        server = stun_servers(network, family=6)
+    except OSError:
+        pytest.skip("回环网卡没有 IPv6 地址")
+    fetcher = make_fetcher(server)
+    assert fetcher.get_public_ip(6) == network.ips[6]
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试内置的 TC3-HMAC-SHA256 轻量客户端
+
+签名与腾讯云 SDK 对同一请求生成的签名逐字比较，接口行为使用本地 DNSPod API 替身验证。
+"""
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.config import ConfigManager
+from core.dns_api import DNSUpdater
+from core.tc3_client import LiteDnspodClient, DnspodAPIError, sign_request
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def make_updater(api, client):
+    config_manager = ConfigManager()
+    config_manager.config = {'secret_id': 'AKIDtest', 'secret_key': 'secret', 'dnspod_endpoint': api.endpoint,
+                             'dnspod_client': client}
+    return DNSUpdater(config_manager, retry_delay=0.01)
+
+
+def test_signature_matches_sdk(api):
+    """对 SDK 实际发出的请求重新签名，结果与 SDK 一致"""
+    api.add_record('example.com', 'home')
+    assert make_updater(api, 'sdk').get_zone_records('example.com', record_type='A')
+    headers, body = api.last_request
+    signed = sign_request('AKIDtest', 'secret', headers['Host'], headers['X-TC-Action'], body,
+                          int(headers['X-TC-Timestamp']))
+    assert signed['Authorization'] == headers['Authorization']
+
+
+def test_lite_client_operations(api):
+    """轻量客户端支持查询、修改和重试，结果与 SDK 路径一致"""
+    record_id = api.add_record('example.com', 'home', value='198.51.100.1')
+    record = {'domain': 'example.com', 'subdomain': 'home', 'record_type': 'A',
+              'record_line': '默认', 'record_id': str(record_id)}
+    updater = make_updater(api, 'lite')
+
+    zone = updater.get_zone_records('example.com')
+    assert zone[str(record_id)]['value'] == '198.51.100.1'
+    assert zone[str(record_id)]['name'] == 'home'
+
+    api.inject_errors('RequestLimitExceeded')
+    assert updater.update_dns_record('203.0.113.9', record=record)
+    assert api.get_value('example.com', record_id) == '203.0.113.9'
+    assert api.last_request[0]['X-TC-Action'] == 'ModifyDynamicDNS'
+
+    updater.dynamic_dns = False
+    assert updater.update_dns_record('203.0.113.10', record=record)
+    assert api.last_request[0]['X-TC-Action'] == 'ModifyRecord'
+    assert updater.get_current_dns_record(record)['value'] == '203.0.113.10'
+
+
+def test_lite_client_errors(api):
+    """API 错误码和网络错误转换为 DnspodAPIError"""
+    client = LiteDnspodClient('id', 'key', api.endpoint)
+    with pytest.raises(DnspodAPIError) as excinfo:
+        client.call('DescribeRecordList', {'Domain': 'missing.example.com'})
+    assert excinfo.value.get_code() == 'InvalidParameter.DomainNotExist'
+    assert excinfo.value.request_id
+
+    unreachable = LiteDnspodClient('id', 'key', 'http://127.0.0.1:9', timeout=1)
+    with pytest.raises(DnspodAPIError) as excinfo:
+        unreachable.call('DescribeRecordList', {'Domain': 'example.com'})
+    assert excinfo.value.get_code() == 'ClientNetworkError'
+
+
+def test_lite_client_does_not_import_sdk(api):
+    """选用轻量客户端时进程中不会导入腾讯云 SDK"""
+    api.add_record('example.com', 'home')
+    code = (
+        "import sys\n"
+        "from core.config import ConfigManager\n"
+        "from core.dns_api import DNSUpdater\n"
+        "cm = ConfigManager()\n"
+        f"cm.config = {{'secret_id': 'id', 'secret_key': 'key', 'dnspod_endpoint': {api.endpoint!r}, "
+        "'dnspod_client': 'lite'}\n"
+        "assert DNSUpdater(cm).get_zone_records('example.com')\n"
+        "print(any(name.startswith('tencentcloud') for name in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                            timeout=30)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'False'